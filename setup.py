@@ -16,10 +16,14 @@ setup(
         "pendulum==1.2.0",
         "backoff==1.8.0",
     ],
-    extras_require={"dev": ["ipdb", "pylint"]},
+    extras_require={"dev": ["ipdb", "pylint"], "arrow": ["pyarrow"]},
     entry_points="""
           [console_scripts]
           tap-zuora=tap_zuora:main
+          tap-zuora-multi-tenant=tap_zuora.multi_tenant:main
+          tap-zuora-history=tap_zuora.history:main
+          tap-zuora-merge-state=tap_zuora.shard:main
+          tap-zuora-daemon=tap_zuora.daemon:main
       """,
     packages=["tap_zuora"],
 )
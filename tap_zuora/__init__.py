@@ -1,12 +1,17 @@
 import json
 import sys
 import time
+from typing import Dict, Optional
 
 import singer
 from singer import Catalog
 
+from tap_zuora import history, jobs, live, shard
 from tap_zuora.client import Client
-from tap_zuora.discover import discover_streams
+from tap_zuora.discover import discover_streams, merge_catalog, select_stream_names
+from tap_zuora.replay import ReplayCache
+from tap_zuora.schedule import CATALOG_ORDER, resume_order
+from tap_zuora.sink import ParquetSink
 from tap_zuora.sync import sync_stream
 
 REQUIRED_CONFIG_KEYS = [
@@ -15,6 +20,7 @@ REQUIRED_CONFIG_KEYS = [
     "username",
     "password",
 ]
+REPLAY_FLAG = "--replay"
 
 
 LOGGER = singer.get_logger()
@@ -76,66 +82,162 @@ def validate_state(config: dict, catalog: Catalog, state: dict) -> dict:
     return state
 
 
-def do_discover(client: Client):
-    """starts the Discover process."""
+def check_partner_id(client: Client):
+    # Using the AQuA API requires a Zuora Partner ID
+    if not client.is_rest and not client.partner_id:
+        raise Exception("Config is missing required `partner_id` key when using the AQuA API")
+
+
+def do_discover(client: Client, config: Optional[Dict] = None, catalog: Optional[Dict] = None):
+    """starts the Discover process.
+
+    Only the objects selected by `discover_objects`, `discover_include`
+    and `discover_exclude` are described. When an existing catalog is
+    given the discovered streams are merged into it.
+    """
     LOGGER.info("Starting discover")
-    catalog = {"streams": discover_streams(client)}
+    stream_names = None
+    config = config or {}
+    if any(config.get(key) for key in ["discover_objects", "discover_include", "discover_exclude"]):
+        stream_names = select_stream_names(client, config)
+        LOGGER.info(f"Discovering {len(stream_names)} objects: {stream_names}")
+
+    streams = discover_streams(client, stream_names)
+    catalog = merge_catalog(catalog, streams) if catalog else {"streams": streams}
     json.dump(catalog, sys.stdout, indent=2)
     LOGGER.info("Finished discover")
 
 
-def do_sync(client: Client, catalog: Catalog, state: dict):
-    """Starts the sync process for all the selected streams."""
+def do_sync(
+    client: Optional[Client],
+    catalog: Catalog,
+    state: dict,
+    config: Optional[Dict] = None,
+    replay: Optional[ReplayCache] = None,
+    plans: Optional[Dict] = None,
+):
+    """Starts the sync process for all the selected streams.
+
+    With `replay`, the records are re-emitted from the exports in the
+    replay cache instead, without a client. `plans` keeps the stream
+    plans between the syncs of a long-running process.
+    """
+    config = config or {}
     starting_stream = state.get("current_stream")
     if starting_stream:
         LOGGER.info(f"Resuming sync from {starting_stream}")
     else:
         LOGGER.info("Starting sync")
 
-    for stream in catalog.streams:
-        stream_name = stream.tap_stream_id
-        if not stream.is_selected():
-            LOGGER.info(f"{stream_name}: Skipping - not selected")
-            continue
-
-        if starting_stream:
-            if starting_stream == stream_name:
-                LOGGER.info(f"{stream_name}: Resuming")
+    if not replay:
+        jobs.sweep(client, state, [stream.tap_stream_id for stream in catalog.streams if stream.is_selected()])
+    history_store = history.HistoryStore.from_config(config)
+    run_id = history_store.start_run() if history_store else None
+    sink = ParquetSink.from_config(config)
+    if sink:
+        LOGGER.info(f"Writing records to Parquet files in {sink.directory}, manifest {sink.manifest_path}")
+
+    try:
+        policy = config.get("stream_order", CATALOG_ORDER)
+        streams = resume_order(catalog.streams, state, policy)
+        if shard_count := int(config.get("shard_count", 0)):
+            streams = shard.shard_streams(streams, state, int(config.get("shard_index", 0)), shard_count)
+            if starting_stream and starting_stream not in [stream.tap_stream_id for stream in streams]:
+                LOGGER.info(f"Not resuming from {starting_stream}, it isn't in this shard")
                 starting_stream = None
-            else:
-                LOGGER.info(f"{stream_name}: Skipping - already synced")
+        if policy != CATALOG_ORDER:
+            state["stream_order"] = [stream.tap_stream_id for stream in streams]
+            LOGGER.info(f"Syncing streams in {policy} order")
+        tenant = config.get("tenant", "")
+        live.REGISTRY.queue((stream.tap_stream_id for stream in streams if stream.is_selected()), tenant)
+
+        for stream in streams:
+            jobs.raise_if_stopped()
+            stream_name = stream.tap_stream_id
+            if not stream.is_selected():
+                LOGGER.info(f"{stream_name}: Skipping - not selected")
                 continue
-        else:
-            LOGGER.info(f"{stream_name}: Starting")
 
-        state["current_stream"] = stream_name
-        singer.write_state(state)
-        singer.write_schema(stream_name, stream.schema.to_dict(), stream.key_properties)
-        counter = sync_stream(client, state, stream.to_dict())
+            if starting_stream:
+                if starting_stream == stream_name:
+                    LOGGER.info(f"{stream_name}: Resuming")
+                    starting_stream = None
+                else:
+                    LOGGER.info(f"{stream_name}: Skipping - already synced")
+                    continue
+            else:
+                LOGGER.info(f"{stream_name}: Starting")
+
+            state["current_stream"] = stream_name
+            singer.write_state(state)
+            if not sink:
+                singer.write_schema(stream_name, stream.schema.to_dict(), stream.key_properties)
+            stream_started = time.monotonic()
+            with history.recording(history_store, run_id, stream_name, tenant):
+                counter = sync_stream(client, state, stream.to_dict(), config, sink, replay, plans)
+            duration = round(time.monotonic() - stream_started, 3)
+            singer.write_bookmark(state, stream_name, "last_sync", {"duration": duration, "rows": counter.value})
 
-        LOGGER.info(f"{stream_name}: Completed sync ({counter.value} rows)")
+            LOGGER.info(f"{stream_name}: Completed sync ({counter.value} rows)")
 
-    state["current_stream"] = None
-    singer.write_state(state)
+        state["current_stream"] = None
+        state.pop("stream_order", None)
+        singer.write_state(state)
+        if sink:
+            sink.close()
+    finally:
+        if history_store:
+            history_store.finish_run(run_id)
+            history_store.close()
     LOGGER.info("Finished sync")
 
 
+def do_replay(args):
+    """Re-emits the records following the given state from the replay
+    cache, without any call to Zuora."""
+    if not args.catalog:
+        raise Exception(f"{REPLAY_FLAG} requires a catalog")
+    if not (cache := ReplayCache.from_config(args.config)):
+        raise Exception(f"{REPLAY_FLAG} requires the `replay_cache_dir` config key")
+    LOGGER.info(f"Replaying cached exports from {cache.directory}")
+    state = validate_state(args.config, args.catalog, args.state)
+    try:
+        do_sync(None, args.catalog, state, args.config, replay=cache)
+    finally:
+        cache.close()
+
+
 @singer.utils.handle_top_exception(LOGGER)
 def main():
+    # Not an option of singer.utils.parse_args
+    replay = REPLAY_FLAG in sys.argv
+    if replay:
+        sys.argv.remove(REPLAY_FLAG)
     args = singer.utils.parse_args(REQUIRED_CONFIG_KEYS)
 
-    client = Client.from_config(args.config)
+    if replay:
+        do_replay(args)
+        return
 
-    # Using the AQuA API requires a Zuora Partner ID
-    if not client.is_rest and not client.partner_id:
-        raise Exception("Config is missing required `partner_id` key when using the AQuA API")
+    client = Client.from_config(args.config)
+    check_partner_id(client)
 
     if args.discover:
-        do_discover(client)
+        # A catalog passed along with --discover is merged with the discovered streams
+        catalog = singer.utils.load_json(args.catalog_path) if args.catalog else None
+        do_discover(client, args.config, catalog)
     elif args.catalog:
-        LOGGER.info(f'This connection is currently using {"REST " if client.is_rest else "AQuA "}API')
+        api_name = "Data Query" if client.is_data_query else "REST" if client.is_rest else "AQuA"
+        LOGGER.info(f"This connection is currently using {api_name} API")
         state = validate_state(args.config, args.catalog, args.state)
-        do_sync(client, args.catalog, state)
+        jobs.install_signal_handlers()
+        stop_metrics = live.start(args.config)
+        try:
+            do_sync(client, args.catalog, state, args.config)
+        finally:
+            jobs.cancel_all()
+            if stop_metrics:
+                stop_metrics()
 
 
 if __name__ == "__main__":
@@ -1,57 +1,61 @@
-from typing import Dict, List, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple, Union, runtime_checkable
 
 import pendulum
 import singer
-from singer import metadata
 
 from tap_zuora.client import Client
 from tap_zuora.exceptions import ApiException
-from tap_zuora.utils import make_aqua_payload
+from tap_zuora.plan import DOES_NOT_SUPPORT_DELETED, StreamPlan
+from tap_zuora.utils import ReadStats, decompress_chunks, iter_lines, make_aqua_payload, read_lines
 
 MAX_EXPORT_DAYS = 30
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 SYNTAX_ERROR = "There is a syntax error in one of the queries in the AQuA input"
 NO_DELETED_SUPPORT = (
     "Objects included in the queries do not support the querying of deleted "
     "records. Remove Deleted section in the JSON request and retry the request"
 )
 
-LOGGER = singer.get_logger()
-
-
-def selected_fields(stream: Dict) -> List:
-    mdata = metadata.to_map(stream["metadata"])
-    fields = [
-        f
-        for f, s in stream["schema"]["properties"].items()
-        if (
-            metadata.get(mdata, ("properties", f), "selected")
-            or metadata.get(mdata, ("properties", f), "inclusion") == "automatic"
-        )
-        and metadata.get(mdata, ("properties", f), "inclusion") != "unsupported"
-    ]
-
-    # Remove Deleted from the query if its selected
-    if "Deleted" in fields:
-        fields.remove("Deleted")
-    return fields
-
-
-def joined_fields(fields: List, stream: Dict) -> List:
-    mdata = metadata.to_map(stream["metadata"])
-    joined_fields_list = []
-    for field_name in fields:
-        if joined_obj := metadata.get(mdata, ("properties", field_name), "tap-zuora.joined_object"):
-            joined_fields_list.append(f"{joined_obj}." + field_name.replace(joined_obj, ""))
+# Passes the chunks or lines of a download through, given the file id and
+# the response, e.g. `tap_zuora.progress.Progress.track_file`
+ProgressCallback = Callable[[str, object, Iterable[bytes]], Iterator[bytes]]
 
-        else:
-            joined_fields_list.append(field_name)
-    return joined_fields_list
+LOGGER = singer.get_logger()
 
 
 def format_datetime_zoql(datetime_str: str, date_format: str):
     return pendulum.parse(datetime_str, tz=pendulum.timezone("UTC")).strftime(date_format)
 
 
+def read_file(client: Client, file_id: str, resp, progress: Optional[ProgressCallback] = None):
+    """Yields the lines of a streamed download, reading the raw body into a
+    `download_buffer_size` buffer when it is configured. The chunks, or
+    the lines read from the buffer, are passed through `progress`."""
+    if not client.download_buffer_size:
+        chunks = resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+        if progress:
+            chunks = progress(file_id, resp, chunks)
+        yield from iter_lines(decompress_chunks(chunks))
+        return
+
+    stats = ReadStats()
+    lines = read_lines(resp.raw, client.download_buffer_size, stats)
+    yield from progress(file_id, resp, lines) if progress else lines
+    LOGGER.info(
+        f"Downloaded file {file_id}: {stats.bytes} bytes in {stats.reads} reads "
+        f"({stats.bytes_per_second() / 1024 / 1024:.2f} MiB/s)"
+    )
+    singer.metrics.log(
+        LOGGER,
+        singer.metrics.Point(
+            "gauge",
+            "download_bytes_per_second",
+            round(stats.bytes_per_second(), 1),
+            {"file_id": file_id, "reads": stats.reads, "bytes": stats.bytes},
+        ),
+    )
+
+
 class ExportFailed(Exception):
     pass
 
@@ -61,73 +65,69 @@ class ExportTimedOut(ExportFailed):
         super().__init__(f"Export failed (TimedOut): The job took longer than {timeout} {unit}")
 
 
+@runtime_checkable
+class ExportApi(Protocol):
+    """What `poll_job_until_done`, `sync_file_ids` and `tap_zuora.jobs`
+    need from an export backend. Each backend also has a `create_job`,
+    whose arguments depend on how it selects records."""
+
+    @staticmethod
+    def job_ready(client: Client, job_id: str) -> bool:
+        """Returns whether the job has completed, raising `ExportFailed` if
+        it failed or was cancelled."""
+
+    @staticmethod
+    def cancel_job(client: Client, job_id: str):
+        ...
+
+    @staticmethod
+    def get_file_ids(client: Client, job_id: str) -> List:
+        """Returns the ids of the files of a completed job, in order."""
+
+    @staticmethod
+    def stream_file(client: Client, file_id: str, progress: Optional[ProgressCallback] = None) -> Iterator[bytes]:
+        """Requests a file, raising `ApiException` straight away if it
+        can't be downloaded, and returns its lines, header first. The
+        download is passed through `progress` as it is read."""
+
+
 class Aqua:
     ZOQL_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
     # Specifying incrementalTime requires this format, but ZOQL requires the 'T'
     PARAMETER_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-    # Zuora's documentation describes some objects which are not supported for deleted
-    # See https://knowledgecenter.zuora.com/DC_Developers/T_Aggregate_Query_API/B_Submit_Query/a_Export_Deleted_Data
-    # and https://github.com/singer-io/tap-zuora/pull/8 for more info.
-    DOES_NOT_SUPPORT_DELETED = [
-        "AccountingPeriod",
-        "ContactSnapshot",
-        "DiscountAppliedMetrics",
-        "PaymentGatewayReconciliationEventLog",
-        "PaymentTransactionLog",
-        "PaymentMethodTransactionLog",
-        "PaymentReconciliationJob",
-        "PaymentReconciliationLog",
-        "ProcessedUsage",
-        "RefundTransactionLog",
-        "UpdaterBatch",
-        "UpdaterDetail",
-        "BookingTransaction",
-        "CalloutHistory",
-        "SmartPreventionAudit",
-        "HpmCaptchaValidationResult",
-        "EmailHistory",
-    ]
-
-    @staticmethod
-    def deleted_records_available(stream: Dict) -> Union[str, bool]:
-        if stream["tap_stream_id"] in Aqua.DOES_NOT_SUPPORT_DELETED:
+    DOES_NOT_SUPPORT_DELETED = DOES_NOT_SUPPORT_DELETED
+
+    @staticmethod
+    def deleted_records_available(plan: StreamPlan) -> bool:
+        if plan.tap_stream_id in Aqua.DOES_NOT_SUPPORT_DELETED:
             LOGGER.info(
-                f"Deleted fields are not supported for stream - {stream['tap_stream_id']}."
-                f" Not selecting deleted records."
+                f"Deleted fields are not supported for stream - {plan.tap_stream_id}. Not selecting deleted records."
             )
-            return False
-
-        mdata = metadata.to_map(stream["metadata"])
-        return "Deleted" in stream["schema"]["properties"] and metadata.get(
-            mdata, ("properties", "Deleted"), "selected"
-        )
+        return plan.deleted
 
     @staticmethod
-    def get_query(stream: Dict) -> str:
-        selected_field_names = selected_fields(stream)
-        dotted_field_names = joined_fields(selected_field_names, stream)
-        fields = ", ".join(dotted_field_names)
-        query = f'select {fields} from {stream["tap_stream_id"]}'
-        if replication_key := stream.get("replication_key"):
-            query += f" order by {replication_key} asc"
+    def get_query(plan: StreamPlan) -> str:
+        query = plan.select_query
+        if plan.replication_key:
+            query += f" order by {plan.replication_key} asc"
 
         LOGGER.info(f"Executing query: {query}")
         return query
 
     @staticmethod
-    def get_payload(state: Dict, stream: Dict, partner_id: str) -> Dict:
-        stream_name = stream["tap_stream_id"]
-        version = state["bookmarks"][stream["tap_stream_id"]].get("version")
-        project = f"{stream_name}_{version}"
-        query = Aqua.get_query(stream)
-        deleted = Aqua.deleted_records_available(stream)
-        payload = make_aqua_payload(project, query, partner_id, deleted)
-
-        if stream.get("replication_key"):
+    def get_payload(state: Dict, plan: StreamPlan, partner_id: str, compress: bool = False) -> Dict:
+        version = state["bookmarks"][plan.tap_stream_id].get("version")
+        project = f"{plan.tap_stream_id}_{version}"
+        query = Aqua.get_query(plan)
+        deleted = Aqua.deleted_records_available(plan)
+        compression = "GZIP" if compress else None
+        payload = make_aqua_payload(project, query, partner_id, deleted, compression)
+
+        if plan.replication_key:
             # Incremental time must be in Pacific time
             # https://knowledgecenter.zuora.com/DC_Developers/T_Aggregate_Query_API/B_Submit_Query/e_Post_Query_with_Retrieval_Time#Request_Parameters
-            start_date = state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]]
+            start_date = state["bookmarks"][plan.tap_stream_id][plan.replication_key]
             inc_pen = pendulum.parse(start_date)
             inc_pen = inc_pen.astimezone(pendulum.timezone("US/Pacific"))
             payload["incrementalTime"] = inc_pen.strftime(Aqua.PARAMETER_DATE_FORMAT)
@@ -135,13 +135,13 @@ class Aqua:
         return payload
 
     @staticmethod
-    def create_job(client: Client, state: Dict, stream: Dict) -> str:
+    def create_job(client: Client, state: Dict, plan: StreamPlan) -> str:
         endpoint = "v1/batch-query/"
         # This _always_ submits with an incremental_time which I think
         # means that we're never executing a full export which means we
         # can't establish a baseline to report deletes on.
         # https://stitchdata.atlassian.net/browse/SRCE-322
-        payload = Aqua.get_payload(state, stream, client.partner_id)
+        payload = Aqua.get_payload(state, plan, client.partner_id, client.compress_exports)
         # Log to show whether the aqua request should trigger a full or
         # incremental response based on
         # https://knowledgecenter.zuora.com/DC_Developers/T_Aggregate_Query_API/B_Submit_Query/a_Export_Deleted_Data
@@ -195,9 +195,15 @@ class Aqua:
             return True
         elif data["status"] == "failed":
             raise ExportFailed(data["batches"][0]["message"])
+        elif data["status"] == "cancelled":
+            raise ExportFailed(f"Export job {job_id} was cancelled")
         else:
             return False
 
+    @staticmethod
+    def cancel_job(client: Client, job_id: str):
+        client.aqua_request("DELETE", f"v1/batch-query/jobs/{job_id}")
+
     # Must match call signature of other APIs
     @staticmethod
     def get_file_ids(client: Client, job_id: str) -> List:
@@ -209,9 +215,10 @@ class Aqua:
 
     # Must match call signature of other APIs
     @staticmethod
-    def stream_file(client: Client, file_id: str):
+    def stream_file(client: Client, file_id: str, progress: Optional[ProgressCallback] = None):
         endpoint = f"v1/file/{file_id}"
-        return client.aqua_request("GET", endpoint, stream=True).iter_lines()
+        resp = client.aqua_request("GET", endpoint, stream=True, headers=client.download_headers)
+        return read_file(client, file_id, resp, progress)
 
 
 class Rest:
@@ -225,37 +232,67 @@ class Rest:
         }
 
     @staticmethod
-    def get_query(stream: Dict, start_date: Union[str, None], end_date: Union[str, None]) -> str:
-        selected_field_names = selected_fields(stream)
-        dotted_field_names = joined_fields(selected_field_names, stream)
-        fields = ", ".join(dotted_field_names)
-        query = f'select {fields} from {stream["tap_stream_id"]}'
+    def get_query(
+        plan: StreamPlan,
+        start_date: Union[str, None],
+        end_date: Union[str, None],
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> str:
+        query = plan.select_query
+        predicates = []
 
-        if stream.get("replication_key") and start_date and end_date:
+        if plan.replication_key and start_date and end_date:
             start_date = format_datetime_zoql(start_date, Rest.ZOQL_DATE_FORMAT)
             end_date = format_datetime_zoql(end_date, Rest.ZOQL_DATE_FORMAT)
-            query += f""" where {stream["replication_key"]} >= '{start_date}'"""
-            query += f""" and {stream["replication_key"]} < '{end_date}'"""
+            predicates.append(f"{plan.replication_key} >= '{start_date}'")
+            predicates.append(f"{plan.replication_key} < '{end_date}'")
+
+        if id_range:
+            predicates.extend(Rest.id_predicates(id_range))
+
+        if predicates:
+            query += " where " + " and ".join(predicates)
 
         LOGGER.info(f"Executing query: {query}")
         return query
 
     @staticmethod
-    def get_payload(stream: Dict, start_date: Union[str, None], end_date: Union[str, None]) -> Dict:
-        query = Rest.get_query(stream, start_date, end_date)
+    def id_predicates(id_range: Tuple[Optional[str], Optional[str]]) -> List[str]:
+        """Filters a partition of a FULL_TABLE export, bounds of None are
+        open."""
+        lower, upper = id_range
+        predicates = []
+        if lower:
+            predicates.append(f"Id >= '{lower}'")
+        if upper:
+            predicates.append(f"Id < '{upper}'")
+        return predicates
+
+    @staticmethod
+    def get_payload(
+        plan: StreamPlan,
+        start_date: Union[str, None],
+        end_date: Union[str, None],
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> Dict:
+        query = Rest.get_query(plan, start_date, end_date, id_range)
         return Rest.make_payload(query)
 
+    @staticmethod
+    def submit_query(client: Client, query: str) -> str:
+        endpoint = "v1/object/export"
+        resp = client.rest_request("POST", endpoint, json=Rest.make_payload(query)).json()
+        return resp["Id"]
+
     @staticmethod
     def create_job(
         client: Client,
-        stream: Dict,
+        plan: StreamPlan,
         start_date: Union[str, None] = None,
         end_date: Union[str, None] = None,
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
     ) -> str:
-        endpoint = "v1/object/export"
-        payload = Rest.get_payload(stream, start_date, end_date)
-        resp = client.rest_request("POST", endpoint, json=payload).json()
-        return resp["Id"]
+        return Rest.submit_query(client, Rest.get_query(plan, start_date, end_date, id_range))
 
     # Must match call signature of other APIs
     @staticmethod
@@ -269,6 +306,10 @@ class Rest:
         else:
             return False
 
+    @staticmethod
+    def cancel_job(client: Client, job_id: str):
+        client.rest_request("PUT", f"v1/object/export/{job_id}/cancel")
+
     # Must match call signature of other APIs
     @staticmethod
     def get_file_ids(client: Client, job_id: str) -> List:
@@ -278,9 +319,10 @@ class Rest:
 
     # Must match call signature of other APIs
     @staticmethod
-    def stream_file(client: Client, file_id: str):
+    def stream_file(client: Client, file_id: str, progress: Optional[ProgressCallback] = None):
         endpoint = f"v1/files/{file_id}"
-        return client.rest_request("GET", endpoint, stream=True).iter_lines()
+        resp = client.rest_request("GET", endpoint, stream=True, headers=client.download_headers)
+        return read_file(client, file_id, resp, progress)
 
     @staticmethod
     def stream_status(client: Client, stream_name: str) -> str:
@@ -295,3 +337,96 @@ class Rest:
             return "unavailable"
 
         return "available" if resp["Success"] else "unavailable"
+
+
+class DataQuery:
+    """Data Query jobs, which run SQL over the tenant's objects and write
+    gzipped CSV results to a pre-signed url.
+
+    Columns are aliased to the field names so the header of the results
+    matches the ones of the other backends. `data_query_filters` maps
+    stream names to extra SQL predicates filtering records server-side.
+    """
+
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+    @staticmethod
+    def get_query(plan: StreamPlan, start_date: Union[str, None], end_date: Union[str, None]) -> str:
+        columns = []
+        for field_name, query_field in zip(plan.selected_fields, plan.query_fields):
+            if "." in query_field:
+                LOGGER.info(f"Skipping joined field {query_field}, not supported by Data Query")
+                continue
+            columns.append(f'{field_name.lower()} as "{field_name}"')
+        query = f"select {', '.join(columns)} from {plan.tap_stream_id.lower()}"
+        predicates = []
+
+        if plan.replication_key and start_date and end_date:
+            start_date = format_datetime_zoql(start_date, DataQuery.TIMESTAMP_FORMAT)
+            end_date = format_datetime_zoql(end_date, DataQuery.TIMESTAMP_FORMAT)
+            predicates.append(f"{plan.replication_key.lower()} >= timestamp '{start_date}'")
+            predicates.append(f"{plan.replication_key.lower()} < timestamp '{end_date}'")
+
+        if stream_filter := plan.config.get("data_query_filters", {}).get(plan.tap_stream_id):
+            predicates.append(f"({stream_filter})")
+
+        if predicates:
+            query += " where " + " and ".join(predicates)
+
+        LOGGER.info(f"Executing query: {query}")
+        return query
+
+    @staticmethod
+    def make_payload(query: str) -> Dict:
+        return {
+            "query": query,
+            "outputFormat": "CSV",
+            "compression": "GZIP",
+            "output": {"target": "S3"},
+            "columnSeparator": ",",
+            "readDeleted": False,
+        }
+
+    @staticmethod
+    def create_job(
+        client: Client,
+        plan: StreamPlan,
+        start_date: Union[str, None] = None,
+        end_date: Union[str, None] = None,
+    ) -> str:
+        payload = DataQuery.make_payload(DataQuery.get_query(plan, start_date, end_date))
+        return client.rest_request("POST", "query/jobs", json=payload).json()["data"]["id"]
+
+    @staticmethod
+    def get_job(client: Client, job_id: str) -> Dict:
+        return client.rest_request("GET", f"query/jobs/{job_id}").json()["data"]
+
+    # Must match call signature of other APIs
+    @staticmethod
+    def job_ready(client: Client, job_id: str) -> bool:
+        data = DataQuery.get_job(client, job_id)
+        if data["queryStatus"] == "completed":
+            return True
+        elif data["queryStatus"] == "failed":
+            raise ExportFailed(data.get("errorMessage", f"Data Query job {job_id} failed"))
+        elif data["queryStatus"] == "cancelled":
+            raise ExportFailed(f"Export job {job_id} was cancelled")
+        else:
+            return False
+
+    @staticmethod
+    def cancel_job(client: Client, job_id: str):
+        client.rest_request("DELETE", f"query/jobs/{job_id}")
+
+    # Must match call signature of other APIs
+    @staticmethod
+    def get_file_ids(client: Client, job_id: str) -> List:
+        # The pre-signed url of the results expires, the job id doesn't
+        return [job_id]
+
+    # Must match call signature of other APIs
+    @staticmethod
+    def stream_file(client: Client, file_id: str, progress: Optional[ProgressCallback] = None):
+        data_file = DataQuery.get_job(client, file_id)["dataFile"]
+        resp = client.download_request(data_file, headers=client.download_headers)
+        return read_file(client, file_id, resp, progress)
@@ -1,16 +1,18 @@
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
 import backoff
 import requests
 import singer
 from singer import metrics
 
+from tap_zuora import history, live
 from tap_zuora.exceptions import (
     ApiException,
     BadCredentialsException,
     RateLimitException,
     RetryableException,
 )
+from tap_zuora.transport import DEFAULT_POOL_SIZE, Transport
 from tap_zuora.utils import make_aqua_payload
 
 IS_AQUA = False
@@ -44,6 +46,13 @@ class Client:  # pylint: disable=too-many-instance-attributes
         sandbox: bool = False,
         european: bool = False,
         is_rest: bool = False,
+        compress_exports: bool = False,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        base_url: Optional[str] = None,
+        transport: Optional[Transport] = None,
+        download_buffer_size: Optional[int] = None,
+        is_data_query: bool = False,
+        tenant: str = "",
     ):
         self.username = username
         self.password = password
@@ -51,19 +60,33 @@ class Client:  # pylint: disable=too-many-instance-attributes
         self.european = european
         self.partner_id = partner_id
         self.is_rest = is_rest
-        self._session = requests.Session()
-
-        self.base_url = self.get_url()
+        # Data Query jobs are authenticated like the REST API
+        self.is_data_query = is_data_query
+        self.compress_exports = compress_exports
+        self.download_buffer_size = download_buffer_size
+        # Labels the rate limits of the live metrics
+        self.tenant = tenant
+        self._transport = transport or Transport(pool_size)
+        self._rest_headers = {
+            "apiAccessKeyId": self.username,
+            "apiSecretAccessKey": self.password,
+            "X-Zuora-WSDL-Version": LATEST_WSDL_VERSION,
+            "Content-Type": "application/json",
+        }
 
-        adapter = requests.adapters.HTTPAdapter(max_retries=5)  # Try again in the case the TCP socket closes
-        self._session.mount("https://", adapter)
+        self.base_url = base_url or self.get_url()
 
     @staticmethod
-    def from_config(config: Dict):
+    def from_config(config: Dict, transport: Optional[Transport] = None):
         sandbox = config.get("sandbox", False) == "true"
         european = config.get("european", False) == "true"
         partner_id = config.get("partner_id", None)
-        is_rest = config.get("api_type") == "REST"
+        is_data_query = config.get("api_type") == "DATA_QUERY"
+        is_rest = config.get("api_type") == "REST" or is_data_query
+        compress_exports = config.get("compress_exports", False) == "true"
+        pool_size = int(config.get("pool_size", DEFAULT_POOL_SIZE))
+        base_url = config.get("base_url")
+        download_buffer_size = int(config["download_buffer_size"]) if config.get("download_buffer_size") else None
         return Client(
             config["username"],
             config["password"],
@@ -71,6 +94,13 @@ class Client:  # pylint: disable=too-many-instance-attributes
             sandbox,
             european,
             is_rest,
+            compress_exports,
+            pool_size,
+            base_url,
+            transport,
+            download_buffer_size,
+            is_data_query,
+            config.get("tenant", ""),
         )
 
     def get_url(self) -> str:
@@ -125,13 +155,13 @@ class Client:  # pylint: disable=too-many-instance-attributes
 
     @property
     def rest_headers(self) -> Dict:
-        """Returns headers for HTTP request."""
-        return {
-            "apiAccessKeyId": self.username,
-            "apiSecretAccessKey": self.password,
-            "X-Zuora-WSDL-Version": LATEST_WSDL_VERSION,
-            "Content-Type": "application/json",
-        }
+        """Returns headers for HTTP request, built once per client."""
+        return self._rest_headers
+
+    @property
+    def download_headers(self) -> Dict:
+        """Returns headers for export file downloads."""
+        return {"Accept-Encoding": "gzip" if self.compress_exports else "identity"}
 
     # NB> Backoff as recommended by Zuora here:
     # https://community.zuora.com/t5/Release-Notifications/Upcoming-Change-for-AQuA-and-Data-Source-Export-January-2021/ba-p/35024
@@ -141,6 +171,7 @@ class Client:  # pylint: disable=too-many-instance-attributes
         max_tries=5,
         factor=30,
         jitter=None,
+        on_backoff=lambda details: history.current().retried(),
     )
     def _retryable_request(self, method: str, url: str, stream=False, url_check=False, **kwargs) -> requests.Response:
         """
@@ -150,8 +181,8 @@ class Client:  # pylint: disable=too-many-instance-attributes
             method (str): HTTP Method type
             url (str): API base_url + endpoint
         """
-        req = requests.Request(method, url, **kwargs).prepare()
-        resp = self._session.send(req, stream=stream)
+        resp = self._transport.request(method, url, stream=stream, **kwargs)
+        live.REGISTRY.record_rate_limits(resp.headers, self.tenant)
 
         if resp.status_code == 429:
             raise RateLimitException(resp)
@@ -162,6 +193,10 @@ class Client:  # pylint: disable=too-many-instance-attributes
         self.check_for_error(resp, url_check)
         return resp
 
+    def close(self):
+        """Releases the pooled connections held by the transport."""
+        self._transport.close()
+
     @staticmethod
     def check_for_error(resp, url_check):
         """
@@ -171,12 +206,14 @@ class Client:  # pylint: disable=too-many-instance-attributes
         """
         # If condition skip raising 400 exception when we test for stream availability
         # When some Stream is not available then api returns a 400 error with message noSuchDataSource
-        if (
-            not url_check
-            and resp.status_code == 400
-            and "noSuchDataSource" in resp.json().get("Errors", [{"Message": ""}])[0]["Message"]
-        ):
-            return
+        if not url_check and resp.status_code == 400:
+            try:
+                errors = resp.json().get("Errors", [{"Message": ""}])
+            except (ValueError, AttributeError):
+                # Not a Zuora error, e.g. the XML error of a pre-signed download url
+                errors = [{"Message": ""}]
+            if "noSuchDataSource" in errors[0]["Message"]:
+                return
 
         if not url_check:
             resp.raise_for_status()
@@ -195,7 +232,21 @@ class Client:  # pylint: disable=too-many-instance-attributes
             url = self.base_url + path
             return self._request(method, url, auth=self.aqua_auth, **kwargs)
 
+    def download_request(self, url: str, **kwargs) -> requests.Response:
+        """Streams a pre-signed file url, which must be requested without
+        Zuora credentials."""
+        with metrics.http_request_timer("download"):
+            # The query string holds the signature
+            LOGGER.info(f"GET: {url.split('?')[0]}")
+            resp = self._retryable_request("GET", url, stream=True, **kwargs)
+            if resp.status_code != 200:
+                raise ApiException(resp)
+            return resp
+
     def rest_request(self, method: str, path: str, **kwargs) -> requests.Response:
         with metrics.http_request_timer(path):
             url = self.base_url + path
-            return self._request(method, url, headers=self.rest_headers, **kwargs)
+            headers = self.rest_headers
+            if extra_headers := kwargs.pop("headers", None):
+                headers = {**headers, **extra_headers}
+            return self._request(method, url, headers=headers, **kwargs)
@@ -0,0 +1,231 @@
+"""Parses export files in columnar batches with pyarrow's CSV reader.
+
+Every column is read as strings and converted to the type of its field a
+whole batch at a time. Columns arrow can't cast exactly the way
+`singer.transform` would are converted once per distinct value instead,
+using `singer.transform` itself, so the records are identical to the
+ones of the pure-Python parser. A block arrow rejects is parsed again,
+with the rest of the file, by the Python csv module.
+
+Requires the `arrow` extra (`pip install tap-zuora[arrow]`).
+"""
+import csv
+import io
+import itertools
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from singer import transform
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+QUOTE = ord('"')
+
+
+def available() -> bool:
+    return pa is not None
+
+
+class LineStream(io.RawIOBase):
+    """Exposes the lines of an export file as a binary file, dropping NUL
+    characters like the pure-Python parser does.
+
+    The lines of the records read but not yet consumed by `consume` are
+    kept, so they can be parsed again if arrow fails on them.
+    """
+
+    def __init__(self, lines: Iterable[bytes]):
+        super().__init__()
+        self._lines = iter(lines)
+        self._pending = b""
+        self._records = deque()
+        self._record = []
+        self._in_quotes = False
+
+    def _keep(self, line: bytes):
+        self._record.append(line)
+        if line.count(QUOTE) % 2:
+            self._in_quotes = not self._in_quotes
+        if not self._in_quotes:
+            # Empty lines are skipped by both parsers
+            if self._record != [b""]:
+                self._records.append(self._record)
+            self._record = []
+
+    def consume(self, rows: int):
+        """Forgets the lines of the next `rows` records."""
+        for _ in range(min(rows, len(self._records))):
+            self._records.popleft()
+
+    def unconsumed_lines(self) -> Iterator[bytes]:
+        """Yields the lines of the records that weren't consumed, followed
+        by the lines that weren't read yet."""
+        for record in self._records:
+            yield from record
+        yield from self._record
+        yield from self._lines
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = len(buffer)
+        while len(self._pending) < size:
+            try:
+                line = next(self._lines)
+            except StopIteration:
+                break
+            self._keep(line)
+            self._pending += line.replace(b"\0", b"") + b"\n"
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        buffer[: len(chunk)] = chunk
+        return len(chunk)
+
+
+def field_types(field_schema: Dict) -> Tuple[Optional[str], bool]:
+    """Returns the single non-null type of a field and whether it's
+    nullable, or `(None, False)` if the field has any other shape."""
+    types = field_schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    if not isinstance(types, list) or set(field_schema) - {"type", "format"}:
+        return None, False
+    non_null = [typ for typ in types if typ != "null"]
+    if len(non_null) != 1:
+        return None, False
+    typ = non_null[0]
+    if field_schema.get("format") == "date-time":
+        typ = "date-time"
+    elif "format" in field_schema:
+        return None, False
+    return typ, len(non_null) != len(types)
+
+
+def null_empty(array, nullable: bool):
+    """Turns empty strings into nulls, which is what `singer.transform`
+    does for nullable fields."""
+    if nullable:
+        return pc.if_else(pc.equal(array, ""), pa.scalar(None, pa.string()), array)
+    return array
+
+
+def cast_integer(array, nullable: bool) -> List:
+    return pc.cast(null_empty(pc.replace_substring(array, ",", ""), nullable), pa.int64()).to_pylist()
+
+
+def cast_number(array, nullable: bool) -> List:
+    return pc.cast(null_empty(pc.replace_substring(array, ",", ""), nullable), pa.float64()).to_pylist()
+
+
+def cast_datetime(array, nullable: bool) -> List:
+    array = null_empty(array, nullable)
+    try:
+        timestamps = pc.cast(array, pa.timestamp("us", tz="UTC"))
+    except pa.ArrowInvalid:
+        # Timestamps without an offset are UTC
+        timestamps = pc.cast(array, pa.timestamp("us"))
+    return pc.strftime(timestamps, "%Y-%m-%dT%H:%M:%SZ").to_pylist()
+
+
+CASTS = {"integer": cast_integer, "number": cast_number, "date-time": cast_datetime}
+
+
+def convert_distinct(array, name: str, field_schema: Dict) -> List:
+    """Converts each distinct value of a column once with
+    `singer.transform`."""
+    encoded = array.dictionary_encode()
+    schema = {"type": "object", "properties": {name: field_schema}}
+    values = [transform({name: value}, schema)[name] for value in encoded.dictionary.to_pylist()]
+    return [values[index] for index in encoded.indices.to_pylist()]
+
+
+def column_converter(name: str, field_schema: Dict) -> Callable:
+    typ, nullable = field_types(field_schema)
+    if typ == "string":
+        return lambda array: array.to_pylist()
+
+    if cast := CASTS.get(typ):
+
+        def convert(array) -> List:
+            try:
+                return cast(array, nullable)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                return convert_distinct(array, name, field_schema)
+
+        return convert
+
+    return lambda array: convert_distinct(array, name, field_schema)
+
+
+def read_python(lines: Iterable[bytes], header: List, schema: Dict) -> Iterator[Tuple[List, Optional[Dict]]]:
+    """Parses lines with the Python csv module like the pure-Python parser
+    of `sync.read_records`, ending at the first row that doesn't match the
+    header."""
+    text = (line.decode("utf-8").replace("\0", "") + "\n" for line in lines)
+    for row in csv.reader(text):
+        if not row:
+            continue
+        if len(row) != len(header):
+            yield row, None
+            return
+        yield row, transform(dict(zip(header, row)), schema)
+
+
+def read_records(
+    lines: Iterable[bytes], header: List, schema: Dict, block_size: int = DEFAULT_BLOCK_SIZE
+) -> Iterator[Tuple[Tuple, Optional[Dict]]]:
+    """Yields the converted values of each row of a file with its record,
+    like `sync.read_records`.
+
+    A row that doesn't match the header yields its values with a None
+    record and ends the file. The rows of its block before it are
+    yielded first, parsed by the Python csv module.
+    """
+    properties = schema["properties"]
+    # Columns missing from the schema are dropped by singer.transform too
+    columns = [(index, name) for index, name in enumerate(header) if name in properties]
+    converters = [column_converter(name, properties[name]) for _, name in columns]
+    names = [name for _, name in columns]
+
+    invalid_rows = []
+
+    def invalid_row(row) -> str:
+        invalid_rows.append(row)
+        return "error"
+
+    lines = iter(lines)
+    if (first_line := next(lines, None)) is None:
+        return
+
+    column_names = [str(index) for index in range(len(header))]
+    stream = LineStream(itertools.chain([first_line], lines))
+    try:
+        reader = pa_csv.open_csv(
+            io.BufferedReader(stream, block_size),
+            read_options=pa_csv.ReadOptions(column_names=column_names, block_size=block_size),
+            # Quoted line breaks, as the Python csv module reads them
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=invalid_row),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in column_names},
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        for batch in reader:
+            stream.consume(batch.num_rows)
+            if not columns:
+                yield from (((), {}) for _ in range(batch.num_rows))
+                continue
+            values = [convert(batch.column(index)) for (index, _), convert in zip(columns, converters)]
+            for row in zip(*values):
+                yield row, dict(zip(names, row))
+    except pa.ArrowInvalid:
+        if not invalid_rows:
+            raise
+        yield from read_python(stream.unconsumed_lines(), header, schema)
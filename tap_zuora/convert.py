@@ -0,0 +1,104 @@
+"""Converts parsed export rows to records one column at a time, caching the
+converted value of each distinct cell.
+
+Zuora exports repeat the same picklist values, currency codes, account
+Ids and bill run timestamps over thousands of rows. Each column keeps a
+bounded LRU cache keyed by the raw cell, so a repeated value is only
+converted once and every record shares the same value object. Columns
+whose values rarely repeat stop caching after a sample of lookups.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import singer
+from singer.transform import SchemaMismatch, Transformer
+
+DEFAULT_CACHE_SIZE = 1024
+SAMPLE_LOOKUPS = 1000
+MIN_HIT_RATE = 0.5
+
+LOGGER = singer.get_logger()
+
+
+class ColumnConverter:
+    __slots__ = ("name", "schema", "transformer", "cache", "cache_size", "hits", "misses")
+
+    def __init__(self, name: str, schema: Dict, transformer: Transformer, cache_size: int):
+        self.name = name
+        self.schema = schema
+        self.transformer = transformer
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def transform(self, raw: str):
+        success, value = self.transformer.transform_recur(raw, self.schema, [self.name])
+        if not success:
+            errors, self.transformer.errors = self.transformer.errors, []
+            raise SchemaMismatch(errors)
+        return value
+
+    def convert(self, raw: str):
+        if (cache := self.cache) is None:
+            return self.transform(raw)
+
+        if raw in cache:
+            self.hits += 1
+            cache.move_to_end(raw)
+            return cache[raw]
+
+        self.misses += 1
+        value = cache[raw] = self.transform(raw)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        if self.misses + self.hits == SAMPLE_LOOKUPS and self.hit_rate() < MIN_HIT_RATE:
+            # Mostly distinct values, caching only costs time and memory
+            self.cache = None
+        return value
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RecordConverter:
+    """Drop-in replacement for `singer.transform` of the rows of one export
+    file with a fixed header."""
+
+    def __init__(self, header: List, schema: Dict, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.width = len(header)
+        properties = schema["properties"]
+        transformer = Transformer()
+        # Columns missing from the schema are dropped like singer.transform does
+        self.columns = [
+            (index, ColumnConverter(name, properties[name], transformer, cache_size))
+            for index, name in enumerate(header)
+            if name in properties
+        ]
+
+    def convert(self, parsed_line: List) -> Optional[Dict]:
+        """Converts a parsed line, returning None if it doesn't match the
+        header."""
+        if len(parsed_line) != self.width:
+            return None
+        return {column.name: column.convert(parsed_line[index]) for index, column in self.columns}
+
+    def log_hit_rates(self, stream_name: str):
+        for _, column in self.columns:
+            if column.hits + column.misses:
+                singer.metrics.log(
+                    LOGGER,
+                    singer.metrics.Point(
+                        "gauge",
+                        "conversion_cache_hit_rate",
+                        round(column.hit_rate(), 4),
+                        {
+                            "endpoint": stream_name,
+                            "column": column.name,
+                            "hits": column.hits,
+                            "misses": column.misses,
+                            "cached": column.cache is not None,
+                        },
+                    ),
+                )
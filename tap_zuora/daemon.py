@@ -0,0 +1,110 @@
+"""Keeps syncing the selected streams incrementally in one long-running
+process.
+
+Usage:
+
+    tap-zuora-daemon --config config.json --catalog catalog.json --state state.json
+
+The client (with its resolved data center url and kept-alive
+connections), the catalog and the stream plans are kept between sync
+cycles. A cycle starts every `daemon_interval` seconds and syncs each
+incremental stream from its bookmark, so the windows stay small.
+FULL_TABLE streams are only synced every `daemon_full_table_interval`
+seconds. Messages are written to standard output as they are produced,
+and the state is written at the end of every cycle.
+
+A failed cycle is retried on the next one, resuming from the stream it
+failed on, until `daemon_max_failures` cycles in a row have failed.
+"""
+import math
+import time
+from typing import Dict, List, Optional
+
+import singer
+from singer import Catalog, CatalogEntry
+
+from tap_zuora import REQUIRED_CONFIG_KEYS, check_partner_id, do_sync, jobs, live, validate_state
+from tap_zuora.client import Client
+
+DEFAULT_INTERVAL = 300
+DEFAULT_FULL_TABLE_INTERVAL = 24 * 60 * 60
+DEFAULT_MAX_FAILURES = 3
+
+LOGGER = singer.get_logger()
+
+
+def due_streams(
+    catalog: Catalog, state: Dict, full_table_synced: Dict, full_table_interval: float
+) -> List[CatalogEntry]:
+    """Returns the streams to sync in a cycle: the incremental ones, the
+    FULL_TABLE ones not synced for `full_table_interval` seconds and any
+    stream an interrupted cycle left an export or a resume point for."""
+    now = time.monotonic()
+    due = []
+    for stream in catalog.streams:
+        bookmark = state.get("bookmarks", {}).get(stream.tap_stream_id, {})
+        if (
+            stream.replication_key
+            or now - full_table_synced.get(stream.tap_stream_id, -math.inf) >= full_table_interval
+            or bookmark.get("job")
+            or bookmark.get("file_ids")
+            or any(id_range.get("job") or id_range.get("file_ids") for id_range in bookmark.get("id_ranges", []))
+            or state.get("current_stream") == stream.tap_stream_id
+        ):
+            due.append(stream)
+    return due
+
+
+def run(client: Client, catalog: Catalog, state: Dict, config: Dict, cycles: Optional[int] = None):
+    """Runs sync cycles forever, or `cycles` of them."""
+    interval = float(config.get("daemon_interval", DEFAULT_INTERVAL))
+    full_table_interval = float(config.get("daemon_full_table_interval", DEFAULT_FULL_TABLE_INTERVAL))
+    max_failures = int(config.get("daemon_max_failures", DEFAULT_MAX_FAILURES))
+    plans = {}
+    full_table_synced = {}
+    failures = 0
+    cycle = 0
+
+    while cycles is None or cycle < cycles:
+        cycle += 1
+        started = time.monotonic()
+        streams = due_streams(catalog, state, full_table_synced, full_table_interval)
+        LOGGER.info(f"Starting sync cycle {cycle} of {len(streams)} streams")
+        try:
+            do_sync(client, Catalog(streams), state, config, plans=plans)
+        except Exception as ex:  # pylint: disable=broad-except
+            failures += 1
+            if failures >= max_failures:
+                raise
+            LOGGER.error(f"Sync cycle {cycle} failed ({failures} of {max_failures} in a row): {ex}")
+        else:
+            failures = 0
+            for stream in streams:
+                if not stream.replication_key:
+                    full_table_synced[stream.tap_stream_id] = started
+
+        if cycles is None or cycle < cycles:
+            time.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+@singer.utils.handle_top_exception(LOGGER)
+def main():
+    args = singer.utils.parse_args(REQUIRED_CONFIG_KEYS)
+    if not args.catalog:
+        raise Exception("tap-zuora-daemon requires a catalog")
+
+    client = Client.from_config(args.config)
+    check_partner_id(client)
+    state = validate_state(args.config, args.catalog, args.state)
+    jobs.install_signal_handlers()
+    stop_metrics = live.start(args.config)
+    try:
+        run(client, args.catalog, state, args.config)
+    finally:
+        jobs.cancel_all()
+        if stop_metrics:
+            stop_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from typing import Dict, KeysView, List, Union
+from fnmatch import fnmatchcase
+from typing import Dict, KeysView, List, Optional, Union
 from xml.etree import ElementTree
 
 import singer
@@ -66,10 +67,13 @@ UNSUPPORTED_FIELDS_FOR_REST = {
 
 UNSUPPORTED_RELATED_OBJECTS = {
     "SubscriptionStatusHistory",
-    }
+}
 
 REQUIRED_KEYS = ["Id"] + REPLICATION_KEYS
 
+# Metadata set by users, kept when a stream is rediscovered
+USER_METADATA = ("selected", "tap-zuora.priority")
+
 LOGGER = singer.get_logger()
 
 
@@ -241,12 +245,59 @@ def discover_stream(client: Client, stream_name: str) -> Union[Dict, None]:
     }
 
 
-def discover_streams(client: Client) -> List:
-    """Performs discovery for each stream."""
+def select_stream_names(client: Client, config: Dict) -> List:
+    """Returns the objects to discover: the `discover_objects` list if
+    configured, otherwise every object matching the `discover_include`
+    patterns and none of the `discover_exclude` patterns."""
+    if objects := config.get("discover_objects"):
+        return list(objects)
+
+    include = config.get("discover_include") or ["*"]
+    exclude = config.get("discover_exclude") or []
+    return [
+        stream_name
+        for stream_name in discover_stream_names(client)
+        if any(fnmatchcase(stream_name, pattern) for pattern in include)
+        and not any(fnmatchcase(stream_name, pattern) for pattern in exclude)
+    ]
+
+
+def merge_catalog(catalog: Dict, streams: List) -> Dict:
+    """Merges newly discovered streams into an existing catalog.
+
+    Streams which were not rediscovered are kept untouched, rediscovered
+    streams keep the `selected` flags and `tap-zuora.priority` of their
+    stream and of any field which still exists, and new streams are
+    appended.
+    """
+    discovered = {stream["tap_stream_id"]: stream for stream in streams}
+    merged = []
+    for existing in catalog.get("streams", []):
+        stream = discovered.pop(existing["tap_stream_id"], None)
+        if stream is None:
+            merged.append(existing)
+            continue
+
+        mdata = metadata.to_map(stream["metadata"])
+        for breadcrumb, entry in metadata.to_map(existing.get("metadata", [])).items():
+            for key in USER_METADATA:
+                if key in entry and breadcrumb in mdata:
+                    mdata = metadata.write(mdata, breadcrumb, key, entry[key])
+        merged.append({**stream, "metadata": metadata.to_list(mdata)})
+
+    merged.extend(discovered.values())
+    return {**catalog, "streams": merged}
+
+
+def discover_streams(client: Client, stream_names: Optional[List] = None) -> List:
+    """Performs discovery for each stream, or only for `stream_names` if
+    provided."""
     streams = []
     failed_stream_names = []
-    for stream_name in discover_stream_names(client):
+    if stream_names is None:
+        stream_names = discover_stream_names(client)
 
+    for stream_name in stream_names:
         if stream := discover_stream(client, stream_name):
             streams.append(stream)
         else:
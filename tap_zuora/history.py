@@ -0,0 +1,323 @@
+"""Local store of per-run, per-stream and per-export-job sync statistics.
+
+Enable it with the `history_dir` config key and query it with:
+
+    tap-zuora-history --history-dir ./history [--stream Account] [--streams] [--limit 20]
+"""
+import argparse
+import contextlib
+import contextvars
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional
+
+import singer
+
+from tap_zuora import live
+from tap_zuora.progress import Progress
+
+HISTORY_FILE = "history.db"
+DEFAULT_QUERY_LIMIT = 20
+
+SCHEMA = """
+create table if not exists runs (
+    run_id text primary key,
+    started_at text,
+    finished_at text
+);
+create table if not exists streams (
+    run_id text,
+    stream text,
+    started_at text,
+    finished_at text,
+    rows integer,
+    bytes integer,
+    jobs integer,
+    retries integer
+);
+create table if not exists jobs (
+    run_id text,
+    stream text,
+    job_id text,
+    window_start text,
+    window_end text,
+    submitted_at text,
+    ready_at text,
+    download_started_at text,
+    download_finished_at text,
+    files integer,
+    bytes integer,
+    rows integer,
+    retries integer
+);
+create index if not exists streams_stream on streams (stream, started_at);
+create index if not exists jobs_stream on jobs (stream, submitted_at);
+"""
+
+LOGGER = singer.get_logger()
+
+
+def utcnow() -> str:
+    return singer.utils.strftime(singer.utils.now())
+
+
+class HistoryStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def from_config(config: Dict) -> Optional["HistoryStore"]:
+        if not (history_dir := config.get("history_dir")):
+            return None
+        os.makedirs(history_dir, exist_ok=True)
+        return HistoryStore(os.path.join(history_dir, HISTORY_FILE))
+
+    def _insert(self, table: str, row: Dict):
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._lock, self._conn:
+            self._conn.execute(f"insert into {table} ({columns}) values ({placeholders})", list(row.values()))
+
+    def start_run(self) -> str:
+        run_id = uuid.uuid4().hex
+        self._insert("runs", {"run_id": run_id, "started_at": utcnow()})
+        return run_id
+
+    def finish_run(self, run_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("update runs set finished_at = ? where run_id = ?", (utcnow(), run_id))
+
+    def record_stream(self, row: Dict):
+        self._insert("streams", row)
+
+    def record_job(self, row: Dict):
+        self._insert("jobs", row)
+
+    def query(self, table: str, stream: Optional[str] = None, limit: int = DEFAULT_QUERY_LIMIT) -> List[Dict]:
+        """Returns the latest rows of the `streams` or `jobs` table, newest
+        first."""
+        order_column = {"streams": "started_at", "jobs": "submitted_at"}[table]
+        sql = f"select * from {table}"
+        params = []
+        if stream:
+            sql += " where stream = ?"
+            params.append(stream)
+        sql += f" order by {order_column} desc limit ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def close(self):
+        self._conn.close()
+
+
+class StreamRecorder:
+    """Collects the statistics of one stream sync, writing a `jobs` row per
+    export job and a `streams` row once the stream is finished.
+
+    The concurrent jobs of the Id ranges of a FULL_TABLE stream are
+    recorded with their range as window, until the next job or the end of
+    the stream. Without a store the statistics are only kept in memory.
+    """
+
+    def __init__(self, store: Optional[HistoryStore], run_id: Optional[str], stream_name: str, tenant: str = ""):
+        self.store = store
+        self.run_id = run_id
+        self.stream_name = stream_name
+        self.tenant = tenant
+        self.started_at = utcnow()
+        self.rows = 0
+        self.bytes = 0
+        self.jobs = 0
+        self.retries = 0
+        self.job = None
+        self.partition_jobs = {}
+        # Live progress, see tap_zuora.live
+        self.phase = "exporting"
+        self.started = time.monotonic()
+        self.job_started = None
+        self.totals = None
+        self.progress = Progress(stream_name)
+        # Events also come from the threads exporting Id ranges
+        self._lock = threading.Lock()
+
+    def _new_job(self, job_id: Optional[str] = None, window_start=None, window_end=None) -> Dict:
+        return {
+            "job_id": job_id,
+            "window_start": window_start,
+            "window_end": window_end,
+            "submitted_at": utcnow() if job_id else None,
+            "ready_at": None,
+            "download_started_at": None,
+            "download_finished_at": None,
+            "files": 0,
+            "bytes": 0,
+            "rows": 0,
+            "retries": 0,
+        }
+
+    def job_submitted(self, job_id: str, window_start: Optional[str] = None, window_end: Optional[str] = None):
+        self.flush_job()
+        self.jobs += 1
+        self.job = self._new_job(job_id, window_start, window_end)
+        self.phase = "exporting"
+        self.job_started = time.monotonic()
+
+    def partition_job_submitted(self, job_id: str, lower: Optional[str], upper: Optional[str]):
+        with self._lock:
+            self._record_job(self.job)
+            self.job = None
+            self.jobs += 1
+            self.partition_jobs[job_id] = self._new_job(job_id, lower, upper)
+            self.phase = "exporting"
+            self.job_started = time.monotonic()
+
+    def _job(self, job_id: Optional[str]) -> Optional[Dict]:
+        if job_id in self.partition_jobs:
+            return self.partition_jobs[job_id]
+        if self.job and job_id in (None, self.job["job_id"]):
+            return self.job
+        return None
+
+    def job_ready(self, job_id: Optional[str] = None):
+        with self._lock:
+            if job := self._job(job_id):
+                job["ready_at"] = utcnow()
+
+    def download_started(self, totals: Optional[Dict] = None):
+        """Starts downloading a file, `totals` holds the running `bytes`
+        and `rows` counts of the file."""
+        if not self.job:
+            # Files left in the state by an interrupted sync
+            self.job = self._new_job()
+        self.job["download_started_at"] = self.job["download_started_at"] or utcnow()
+        self.phase = "downloading"
+        self.totals = totals
+
+    def download_finished(self, bytes_read: int, rows: int):
+        self.totals = None
+        self.job["download_finished_at"] = utcnow()
+        self.job["files"] += 1
+        self.job["bytes"] += bytes_read
+        self.job["rows"] += rows
+        self.bytes += bytes_read
+        self.rows += rows
+
+    def live_bytes(self) -> int:
+        return self.bytes + ((self.totals or {}).get("bytes") or 0)
+
+    def live_rows(self) -> int:
+        return self.rows + ((self.totals or {}).get("rows") or 0)
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+            if job := self._job(_POLLED_JOB.get()):
+                job["retries"] += 1
+
+    def _record_job(self, job: Optional[Dict]):
+        if job and self.store:
+            self.store.record_job({"run_id": self.run_id, "stream": self.stream_name, **job})
+
+    def flush_job(self):
+        for job in [self.job, *self.partition_jobs.values()]:
+            self._record_job(job)
+        self.job = None
+        self.partition_jobs = {}
+
+    def finish(self):
+        self.flush_job()
+        self.phase = "done"
+        if self.store:
+            self.store.record_stream(
+                {
+                    "run_id": self.run_id,
+                    "stream": self.stream_name,
+                    "started_at": self.started_at,
+                    "finished_at": utcnow(),
+                    "rows": self.rows,
+                    "bytes": self.bytes,
+                    "jobs": self.jobs,
+                    "retries": self.retries,
+                }
+            )
+
+
+_CURRENT = contextvars.ContextVar("stream_recorder", default=None)
+# The export job waited for in this context, see `polling`
+_POLLED_JOB = contextvars.ContextVar("polled_job", default=None)
+
+
+def current() -> StreamRecorder:
+    """Returns the recorder of the stream being synced in this context.
+
+    Outside of a stream sync the events are recorded by a throwaway
+    recorder. Threads working for a stream must be started with `submit`
+    so they see its recorder.
+    """
+    if (recorder := _CURRENT.get()) is None:
+        recorder = StreamRecorder(None, None, "")
+    return recorder
+
+
+def submit(executor: Executor, func: Callable, *args) -> Future:
+    """Submits `func(*args)` to run in a copy of the calling context, so its
+    events reach the recorder of the stream being synced."""
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+@contextlib.contextmanager
+def polling(job_id: str):
+    """Attributes the retries of the requests made while waiting for an
+    export job to it."""
+    token = _POLLED_JOB.set(job_id)
+    try:
+        yield
+    finally:
+        _POLLED_JOB.reset(token)
+
+
+@contextlib.contextmanager
+def recording(store: Optional[HistoryStore], run_id: Optional[str], stream_name: str, tenant: str = ""):
+    recorder = StreamRecorder(store, run_id, stream_name, tenant)
+    live.REGISTRY.track(recorder)
+    token = _CURRENT.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _CURRENT.reset(token)
+        recorder.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the tap-zuora run history")
+    parser.add_argument("--history-dir", required=True, help="Directory configured as `history_dir`")
+    parser.add_argument("--stream", help="Only show this stream")
+    parser.add_argument("--streams", action="store_true", help="Show per-stream runs instead of export jobs")
+    parser.add_argument("--limit", type=int, default=DEFAULT_QUERY_LIMIT)
+    args = parser.parse_args()
+
+    path = os.path.join(args.history_dir, HISTORY_FILE)
+    if not os.path.exists(path):
+        raise SystemExit(f"No history found at {path}")
+
+    store = HistoryStore(path)
+    for row in store.query("streams" if args.streams else "jobs", args.stream, args.limit):
+        json.dump(row, sys.stdout)
+        sys.stdout.write("\n")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Keeps track of the export jobs submitted by this process so the ones it
+stops waiting for are cancelled instead of holding on to one of the
+tenant's concurrent export slots.
+
+A job is cancelled when waiting for it times out, and at startup when a
+previous run left it in the state of a stream that is no longer synced.
+A job that isn't recorded in the state, and so can't be re-attached to,
+is also cancelled when waiting for it is interrupted, e.g. by a signal
+or a request error. Recorded jobs are left running for the next run.
+
+When the syncs run on worker threads, as in multi-tenant mode, SIGTERM
+only sets `STOP`: every thread gives up waiting for its job at its next
+poll, and unwinds like a failed sync, writing its state.
+"""
+import contextlib
+import signal
+import threading
+from typing import Dict, Iterable
+
+import singer
+
+from tap_zuora import apis
+from tap_zuora.client import Client
+
+LOGGER = singer.get_logger()
+
+_ACTIVE = {}
+_LOCK = threading.Lock()
+# Set once the tap is asked to shut down
+STOP = threading.Event()
+
+
+class ShutdownRequested(SystemExit):
+    """Raised in the main thread when the tap receives a termination
+    signal."""
+
+
+def api_for(client: Client):
+    if client.is_data_query:
+        return apis.DataQuery
+    return apis.Rest if client.is_rest else apis.Aqua
+
+
+def cancel(client: Client, job_id: str):
+    """Cancels an export job, logging rather than raising on failure."""
+    LOGGER.info("Cancelling export job %s", job_id)
+    try:
+        api_for(client).cancel_job(client, job_id)
+    except Exception as ex:  # pylint: disable=broad-except
+        LOGGER.warning("Failed to cancel export job %s: %s", job_id, ex)
+
+
+@contextlib.contextmanager
+def tracked(client: Client, job_id: str, recorded: bool = False):
+    """Cancels the job if waiting for it times out. Unless it is
+    `recorded` in the state, it is also cancelled if waiting for it is
+    interrupted by anything but the job itself failing."""
+    with _LOCK:
+        _ACTIVE[job_id] = (client, recorded)
+    try:
+        yield
+    except apis.ExportTimedOut:
+        cancel(client, job_id)
+        raise
+    except apis.ExportFailed:
+        # Also raised when waiting is stopped on shutdown
+        if STOP.is_set() and not recorded:
+            cancel(client, job_id)
+        raise
+    except BaseException:
+        if not recorded:
+            cancel(client, job_id)
+        raise
+    finally:
+        with _LOCK:
+            _ACTIVE.pop(job_id, None)
+
+
+def cancel_all():
+    """Cancels the unrecorded jobs other threads are still waiting for."""
+    with _LOCK:
+        active = list(_ACTIVE.items())
+        _ACTIVE.clear()
+    for job_id, (client, recorded) in active:
+        if not recorded:
+            cancel(client, job_id)
+
+
+def sweep(client: Client, state: Dict, stream_names: Iterable[str]):
+    """Cancels the jobs recorded in the state for streams other than
+    `stream_names`, including the ones of their Id ranges, which would
+    otherwise never be re-attached to."""
+    stream_names = set(stream_names)
+    for stream_name, bookmarks in state.get("bookmarks", {}).items():
+        if stream_name in stream_names or not isinstance(bookmarks, dict):
+            continue
+        for holder in [bookmarks, *bookmarks.get("id_ranges", [])]:
+            if job := holder.pop("job", None):
+                cancel(client, job["id"])
+
+
+def raise_if_stopped():
+    """Ends a sync between two streams once the tap is asked to shut
+    down."""
+    if STOP.is_set():
+        raise ShutdownRequested(128 + signal.SIGTERM)
+
+
+def _raise_shutdown(signum, frame):  # pylint: disable=unused-argument
+    STOP.set()
+    raise ShutdownRequested(128 + signum)
+
+
+def _stop_threads(signum, frame):  # pylint: disable=unused-argument
+    LOGGER.info("Received signal %s, stopping the syncs at their next poll", signum)
+    STOP.set()
+
+
+def install_signal_handlers(threaded: bool = False):
+    """Turns SIGTERM into an exception, so in-flight jobs that can't be
+    re-attached to are cancelled while the tap unwinds. With `threaded`,
+    it only sets `STOP`, since the exception would leave the worker
+    threads running without their state being written."""
+    signal.signal(signal.SIGTERM, _stop_threads if threaded else _raise_shutdown)
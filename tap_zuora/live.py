@@ -0,0 +1,199 @@
+"""Live per-stream sync progress in the Prometheus exposition format.
+
+Enable it with `metrics_port`, to serve the metrics at
+`http://localhost:<port>/metrics`, and/or `metrics_file`, to rewrite a
+textfile (e.g. for the node_exporter textfile collector) every
+`metrics_interval` seconds. Samples are labelled with the `tenant`
+config key when it is set, as it is by multi-tenant mode.
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+
+import singer
+
+DEFAULT_INTERVAL = 15
+RATE_LIMIT_PREFIXES = ("x-ratelimit-", "ratelimit-")
+
+LOGGER = singer.get_logger()
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def sample(name: str, labels: Dict, value) -> str:
+    label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+    return f"{name}{{{label_text}}} {value}"
+
+
+def stream_labels(tenant: str, stream_name: str) -> Dict:
+    """Labels of a stream's samples, with the tenant when several are
+    synced by one process."""
+    return {"tenant": tenant, "stream": stream_name} if tenant else {"stream": stream_name}
+
+
+class LiveMetrics:
+    """Registry of the streams of the running syncs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recorders = {}
+        self._queued = {}
+        self._rate_limits = {}
+
+    def queue(self, stream_names: Iterable[str], tenant: str = ""):
+        with self._lock:
+            self._queued.update(dict.fromkeys(((tenant, name) for name in stream_names), True))
+
+    def track(self, recorder):
+        """Adds the recorder of a stream being synced, replacing the one of
+        its previous sync."""
+        key = (recorder.tenant, recorder.stream_name)
+        with self._lock:
+            self._queued.pop(key, None)
+            self._recorders = {
+                recorder_id: other
+                for recorder_id, other in self._recorders.items()
+                if not ((other.tenant, other.stream_name) == key and other.phase == "done")
+            }
+            self._recorders[id(recorder)] = recorder
+
+    def record_rate_limits(self, headers, tenant: str = ""):
+        """Keeps the latest rate limit headers of Zuora's responses."""
+        limits = {key.lower(): value for key, value in headers.items() if key.lower().startswith(RATE_LIMIT_PREFIXES)}
+        if limits:
+            with self._lock:
+                self._rate_limits.setdefault(tenant, {}).update(limits)
+
+    def render(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            recorders = list(self._recorders.values())
+            queued = list(self._queued)
+            rate_limits = {tenant: dict(limits) for tenant, limits in self._rate_limits.items()}
+
+        lines = [
+            "# TYPE tap_zuora_stream_phase gauge",
+            *(
+                sample("tap_zuora_stream_phase", {**stream_labels(tenant, name), "phase": "queued"}, 1)
+                for tenant, name in queued
+            ),
+        ]
+        for recorder in recorders:
+            labels = {**stream_labels(recorder.tenant, recorder.stream_name), "phase": recorder.phase}
+            lines.append(sample("tap_zuora_stream_phase", labels, 1))
+
+        # Counters restart from zero with each sync of a stream
+        metrics = {
+            "tap_zuora_job_age_seconds": ("gauge", lambda r: round(now - r.job_started, 3) if r.job_started else None),
+            "tap_zuora_bytes_downloaded_total": ("counter", lambda r: r.live_bytes()),
+            "tap_zuora_rows_total": ("counter", lambda r: r.live_rows()),
+            "tap_zuora_rows_per_second": ("gauge", lambda r: round(r.live_rows() / max(now - r.started, 1e-3), 3)),
+            "tap_zuora_retries_total": ("counter", lambda r: r.retries),
+            "tap_zuora_file_progress_ratio": ("gauge", lambda r: r.progress.file_fraction()),
+            "tap_zuora_file_eta_seconds": ("gauge", lambda r: r.progress.file_eta()),
+            "tap_zuora_window_coverage_ratio": ("gauge", lambda r: r.progress.coverage_fraction()),
+            "tap_zuora_eta_seconds": ("gauge", lambda r: r.progress.stream_eta()),
+        }
+        for name, (metric_type, value) in metrics.items():
+            lines.append(f"# TYPE {name} {metric_type}")
+            for recorder in recorders:
+                if (metric_value := value(recorder)) is not None:
+                    lines.append(sample(name, stream_labels(recorder.tenant, recorder.stream_name), metric_value))
+
+        lines.append("# TYPE tap_zuora_window_info gauge")
+        for recorder in recorders:
+            if recorder.job and (recorder.job["window_start"] or recorder.job["window_end"]):
+                labels = {
+                    **stream_labels(recorder.tenant, recorder.stream_name),
+                    "start": recorder.job["window_start"] or "",
+                    "end": recorder.job["window_end"] or "",
+                }
+                lines.append(sample("tap_zuora_window_info", labels, 1))
+
+        lines.append("# TYPE tap_zuora_rate_limit gauge")
+        for tenant, limits in sorted(rate_limits.items()):
+            for header, value in sorted(limits.items()):
+                labels = {"tenant": tenant, "header": header} if tenant else {"header": header}
+                try:
+                    lines.append(sample("tap_zuora_rate_limit", labels, float(value)))
+                except ValueError:
+                    continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = LiveMetrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        # Scrapes would flood the tap's log
+        pass
+
+
+def write_textfile(path: str):
+    """Replaces the textfile atomically so a collector never reads a
+    partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as output:
+        output.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def start(config: Dict) -> Optional[Callable[[], None]]:
+    """Starts the configured exporters, returning a function stopping
+    them or None if none is configured."""
+    stoppers: List[Callable[[], None]] = []
+
+    if port := config.get("metrics_port"):
+        server = ThreadingHTTPServer(("127.0.0.1", int(port)), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+        LOGGER.info(f"Serving live metrics at http://127.0.0.1:{server.server_port}/metrics")
+
+        def stop_server():
+            server.shutdown()
+            server.server_close()
+
+        stoppers.append(stop_server)
+
+    if path := config.get("metrics_file"):
+        interval = float(config.get("metrics_interval", DEFAULT_INTERVAL))
+        stopped = threading.Event()
+
+        def rewrite():
+            while not stopped.wait(interval):
+                write_textfile(path)
+
+        write_textfile(path)
+        thread = threading.Thread(target=rewrite, daemon=True, name="metrics-textfile")
+        thread.start()
+
+        def stop_textfile():
+            stopped.set()
+            thread.join()
+            write_textfile(path)
+
+        stoppers.append(stop_textfile)
+
+    if not stoppers:
+        return None
+
+    def stop():
+        for stopper in stoppers:
+            stopper()
+
+    return stop
@@ -0,0 +1,169 @@
+"""Runs the tap for many Zuora tenants in a single process.
+
+Usage:
+
+    tap-zuora-multi-tenant --tenants tenants.json
+
+where tenants.json looks like:
+
+    {
+      "max_workers": 4,
+      "tenants": [
+        {
+          "name": "acme",
+          "config": "acme/config.json",
+          "catalog": "acme/catalog.json",
+          "state": "acme/state.json",
+          "output": "acme/output.jsonl"
+        }
+      ]
+    }
+
+Each tenant gets its own Client (and so its own rate limit backoff) and
+syncs its streams sequentially on one worker thread, while all tenants
+share the process, the worker pool and one HTTP connection pool. Singer
+messages of each tenant are appended to its `output` file, and its last
+state is written back to its `state` file when its sync ends, so the
+next run resumes from it. On SIGTERM, the tenants stop waiting for
+their export jobs, leaving them running, and write their state before
+the process exits. `metrics_port`, `metrics_file` and
+`metrics_interval` in the tenants file serve the live metrics of all
+tenants.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import singer
+from singer import Catalog
+
+from tap_zuora import REQUIRED_CONFIG_KEYS, check_partner_id, do_sync, jobs, live, validate_state
+from tap_zuora.client import Client
+from tap_zuora.transport import DEFAULT_POOL_SIZE, Transport
+
+DEFAULT_MAX_WORKERS = 4
+
+LOGGER = singer.get_logger()
+
+
+class ThreadRoutedWriter:
+    """File-like object installed as sys.stdout which sends writes to the
+    output file of the tenant being synced on the calling thread."""
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self._local, "target", None) or self.default
+
+    def route(self, target):
+        self._local.target = target
+
+    def write(self, data: str) -> int:
+        return self.target.write(data)
+
+    def flush(self):
+        self.target.flush()
+
+
+def load_tenants(path: str) -> Dict:
+    tenants = singer.utils.load_json(path)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for tenant in tenants["tenants"]:
+        for key in ["config", "catalog", "state", "output"]:
+            if tenant.get(key):
+                tenant[key] = os.path.join(base_dir, tenant[key])
+        tenant.setdefault("output", os.path.join(base_dir, f'{tenant["name"]}.jsonl'))
+        tenant.setdefault("state", os.path.join(base_dir, f'{tenant["name"]}.state.json'))
+    return tenants
+
+
+def write_state_file(path: str, state: Dict):
+    """Replaces the state file atomically so an interrupted write never
+    leaves a partial state."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as output:
+        json.dump(state, output, indent=2)
+    os.replace(tmp_path, path)
+
+
+def sync_tenant(tenant: Dict, transport: Transport, writer: ThreadRoutedWriter):
+    """Syncs the selected streams of one tenant into its output file.
+
+    The tenant's state is written back to its state file even if the sync
+    fails, so the next run resumes where this one stopped.
+    """
+    config = singer.utils.load_json(tenant["config"])
+    singer.utils.check_config(config, REQUIRED_CONFIG_KEYS)
+    # Labels the tenant's live metrics
+    config.setdefault("tenant", tenant["name"])
+    catalog = Catalog.load(tenant["catalog"])
+    state = {}
+    if tenant.get("state") and os.path.exists(tenant["state"]):
+        state = singer.utils.load_json(tenant["state"])
+
+    # Appended, the messages of a previous run may not have been loaded yet
+    with open(tenant["output"], "a", encoding="utf-8") as output:
+        writer.route(output)
+        try:
+            LOGGER.info(f'{tenant["name"]}: Starting tenant sync')
+            client = Client.from_config(config, transport)
+            check_partner_id(client)
+            state = validate_state(config, catalog, state)
+            do_sync(client, catalog, state, config)
+            LOGGER.info(f'{tenant["name"]}: Finished tenant sync')
+        finally:
+            writer.route(None)
+            if tenant.get("state"):
+                write_state_file(tenant["state"], state)
+
+
+def sync_tenants(tenants: List[Dict], max_workers: int = DEFAULT_MAX_WORKERS) -> List[str]:
+    """Syncs all tenants concurrently, returning the names of the tenants
+    that failed."""
+    transport = Transport(max(DEFAULT_POOL_SIZE, max_workers))
+    writer = ThreadRoutedWriter(sys.stdout)
+    failed = []
+    sys.stdout = writer
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tenant") as executor:
+            futures = {tenant["name"]: executor.submit(sync_tenant, tenant, transport, writer) for tenant in tenants}
+        for name, future in futures.items():
+            if ex := future.exception():
+                LOGGER.error(f"{name}: Tenant sync failed: {ex}")
+                failed.append(name)
+    finally:
+        sys.stdout = writer.default
+        transport.close()
+
+    return failed
+
+
+@singer.utils.handle_top_exception(LOGGER)
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", help="Tenants file", required=True)
+    args = parser.parse_args()
+
+    tenants = load_tenants(args.tenants)
+    jobs.install_signal_handlers(threaded=True)
+    stop_metrics = live.start(tenants)
+    try:
+        failed = sync_tenants(tenants["tenants"], int(tenants.get("max_workers", DEFAULT_MAX_WORKERS)))
+    finally:
+        jobs.cancel_all()
+        if stop_metrics:
+            stop_metrics()
+    jobs.raise_if_stopped()
+    if failed:
+        raise Exception(f"Sync failed for tenants: {failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Parses and transforms export files on a pool of processes.
+
+The lines of a file are split into chunks at record boundaries, each
+chunk is parsed as a whole by a worker process, so quoted values
+spanning lines are read correctly, and the results are yielded in the
+original order of the file.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List
+
+DEFAULT_CHUNK_ROWS = 5000
+QUOTE = ord('"')
+
+
+def split_chunks(lines: Iterable[bytes], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[List[bytes]]:
+    """Groups lines into chunks of about `chunk_rows` lines.
+
+    A chunk is only cut where the quotes seen so far are balanced, so a
+    quoted value spanning several lines is never split across chunks.
+    """
+    chunk = []
+    in_quotes = False
+    for line in lines:
+        chunk.append(line)
+        if line.count(QUOTE) % 2:
+            in_quotes = not in_quotes
+        if len(chunk) >= chunk_rows and not in_quotes:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_ordered(
+    executor: ProcessPoolExecutor, func: Callable, chunks: Iterable[List], max_pending: int, *args
+) -> Iterator:
+    """Runs `func(chunk, *args)` for every chunk on the executor, yielding
+    the items of the results in chunk order.
+
+    At most `max_pending` chunks are in flight, so a slow consumer
+    doesn't make the whole file pile up in memory. The chunks not
+    started yet are cancelled when the consumer stops early.
+    """
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk, *args))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
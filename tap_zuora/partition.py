@@ -0,0 +1,47 @@
+"""Splits a FULL_TABLE export into Id ranges that can be exported
+concurrently.
+
+The boundaries are quantiles of a uniform sample of the object's Ids,
+so each range holds about the same number of records whatever the
+distribution of the Ids.
+"""
+import random
+from typing import Iterable, List, Optional, Tuple
+
+SAMPLE_SIZE = 10000
+MAX_PARTITIONS = 64
+
+
+def sample(values: Iterable[str], size: int = SAMPLE_SIZE, seed: int = 0) -> List[str]:
+    """Returns a uniform sample of at most `size` values (reservoir
+    sampling), holding only the sample in memory."""
+    rng = random.Random(seed)
+    reservoir = []
+    for count, value in enumerate(values):
+        if count < size:
+            reservoir.append(value)
+        elif (index := rng.randrange(count + 1)) < size:
+            reservoir[index] = value
+    return reservoir
+
+
+def id_ranges(ids: List[str], partitions: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Returns `partitions` contiguous `[lower, upper)` Id ranges, or fewer
+    if there aren't enough distinct Ids, covering every Id. The first
+    range has no lower bound and the last no upper bound."""
+    ids = sorted(set(ids))
+    boundaries = sorted({ids[len(ids) * i // partitions] for i in range(1, partitions)} - {ids[0]} if ids else set())
+    bounds = [None, *boundaries, None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def split_range(
+    ids: List[str], id_range: Tuple[Optional[str], Optional[str]], partitions: int
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Returns the `id_ranges` of Ids sampled within `id_range`, with its
+    bounds as the outer ones."""
+    lower, upper = id_range
+    ranges = id_ranges(ids, partitions)
+    ranges[0] = (lower, ranges[0][1])
+    ranges[-1] = (ranges[-1][0], upper)
+    return ranges
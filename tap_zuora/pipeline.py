@@ -0,0 +1,104 @@
+"""Runs the stages of an export file sync on separate threads connected by
+bounded queues.
+
+Each stage consumes batches from the queue of the previous stage and
+produces batches in the same order, so the output order is identical to
+running the stages one after the other. When a queue is full the stage
+feeding it blocks, which propagates backpressure from a slow consumer
+back to the network reader.
+"""
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+DEFAULT_BATCH_SIZE = 500
+QUEUE_TIMEOUT = 0.5
+
+_DONE = object()
+
+
+class StageFailed:
+    """Carries an exception raised in a stage to the consumer."""
+
+    def __init__(self, ex: BaseException):
+        self.ex = ex
+
+
+class Pipeline:
+    def __init__(self, buffer_rows: int, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = min(batch_size, buffer_rows)
+        # Bounds the rows buffered between two stages
+        self.queue_size = max(1, buffer_rows // self.batch_size)
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def _put(self, out_queue: queue.Queue, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                out_queue.put(item, timeout=QUEUE_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, in_queue: queue.Queue):
+        while not self._stopped.is_set():
+            try:
+                return in_queue.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _read(self, source: Iterable, out_queue: queue.Queue):
+        try:
+            batch = []
+            for item in source:
+                batch.append(item)
+                if len(batch) == self.batch_size:
+                    if not self._put(out_queue, batch):
+                        return
+                    batch = []
+            if batch and not self._put(out_queue, batch):
+                return
+            self._put(out_queue, _DONE)
+        except Exception as ex:  # pylint: disable=broad-except
+            self._put(out_queue, StageFailed(ex))
+
+    def _process(self, func: Callable[[List], List], in_queue: queue.Queue, out_queue: queue.Queue):
+        while True:
+            batch = self._get(in_queue)
+            if batch is _DONE or isinstance(batch, StageFailed):
+                self._put(out_queue, batch)
+                return
+            try:
+                result = func(batch)
+            except Exception as ex:  # pylint: disable=broad-except
+                self._put(out_queue, StageFailed(ex))
+                return
+            if not self._put(out_queue, result):
+                return
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def run(self, source: Iterable, stages: List[Callable[[List], List]]) -> Iterator:
+        """Reads `source` on a thread and applies each stage function to
+        batches of its items on its own thread, yielding the output of the
+        last stage in order."""
+        in_queue = queue.Queue(self.queue_size)
+        self._start(self._read, source, in_queue)
+        for func in stages:
+            out_queue = queue.Queue(self.queue_size)
+            self._start(self._process, func, in_queue, out_queue)
+            in_queue = out_queue
+
+        try:
+            while (batch := in_queue.get()) is not _DONE:
+                if isinstance(batch, StageFailed):
+                    raise batch.ex
+                yield from batch
+        finally:
+            # Unblocks the stages if the consumer stopped early
+            self._stopped.set()
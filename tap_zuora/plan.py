@@ -0,0 +1,120 @@
+from typing import Dict, List, Optional
+
+from singer import metadata
+
+# Zuora's documentation describes some objects which are not supported for deleted
+# See https://knowledgecenter.zuora.com/DC_Developers/T_Aggregate_Query_API/B_Submit_Query/a_Export_Deleted_Data
+# and https://github.com/singer-io/tap-zuora/pull/8 for more info.
+DOES_NOT_SUPPORT_DELETED = [
+    "AccountingPeriod",
+    "ContactSnapshot",
+    "DiscountAppliedMetrics",
+    "PaymentGatewayReconciliationEventLog",
+    "PaymentTransactionLog",
+    "PaymentMethodTransactionLog",
+    "PaymentReconciliationJob",
+    "PaymentReconciliationLog",
+    "ProcessedUsage",
+    "RefundTransactionLog",
+    "UpdaterBatch",
+    "UpdaterDetail",
+    "BookingTransaction",
+    "CalloutHistory",
+    "SmartPreventionAudit",
+    "HpmCaptchaValidationResult",
+    "EmailHistory",
+]
+
+
+def selected_fields(stream: Dict, mdata: Optional[Dict] = None) -> List:
+    mdata = mdata or metadata.to_map(stream["metadata"])
+    fields = [
+        f
+        for f, s in stream["schema"]["properties"].items()
+        if (
+            metadata.get(mdata, ("properties", f), "selected")
+            or metadata.get(mdata, ("properties", f), "inclusion") == "automatic"
+        )
+        and metadata.get(mdata, ("properties", f), "inclusion") != "unsupported"
+    ]
+
+    # Remove Deleted from the query if its selected
+    if "Deleted" in fields:
+        fields.remove("Deleted")
+    return fields
+
+
+def joined_fields(fields: List, stream: Dict, mdata: Optional[Dict] = None) -> List:
+    mdata = mdata or metadata.to_map(stream["metadata"])
+    joined_fields_list = []
+    for field_name in fields:
+        if joined_obj := metadata.get(mdata, ("properties", field_name), "tap-zuora.joined_object"):
+            joined_fields_list.append(f"{joined_obj}." + field_name.replace(joined_obj, ""))
+
+        else:
+            joined_fields_list.append(field_name)
+    return joined_fields_list
+
+
+def convert_header(header: str, stream: str) -> str:
+    dotted_field = header.split(".")
+    if stream == dotted_field[0]:
+        return dotted_field[1]
+
+    return header.replace(".", "")
+
+
+class StreamPlan:
+    """Everything needed to export and sync one stream, derived from its
+    catalog entry once at the start of `sync_stream`."""
+
+    __slots__ = (
+        "tap_stream_id",
+        "schema",
+        "replication_key",
+        "selected_fields",
+        "query_fields",
+        "deleted",
+        "select_query",
+        "config",
+        "row_index",
+        "sink",
+        "replay_cache",
+        "parse_pool",
+        "_headers",
+    )
+
+    def __init__(self, stream: Dict, config: Optional[Dict] = None):
+        mdata = metadata.to_map(stream["metadata"])
+        self.tap_stream_id = stream["tap_stream_id"]
+        self.schema = stream["schema"]
+        self.replication_key = stream.get("replication_key")
+        self.selected_fields = selected_fields(stream, mdata)
+        self.query_fields = joined_fields(self.selected_fields, stream, mdata)
+        # Whether the Deleted column is selected and can be exported (AQuA only)
+        self.deleted = (
+            self.tap_stream_id not in DOES_NOT_SUPPORT_DELETED
+            and "Deleted" in self.schema["properties"]
+            and bool(metadata.get(mdata, ("properties", "Deleted"), "selected"))
+        )
+        self.select_query = f'select {", ".join(self.query_fields)} from {self.tap_stream_id}'
+        self.config = config or {}
+        # Set by sync_stream for FULL_TABLE streams when `row_index_dir` is configured
+        self.row_index = None
+        # Set by sync_stream when `parquet_dir` is configured
+        self.sink = None
+        # Set by sync_stream when `replay_cache_dir` is configured, to keep the downloaded files
+        self.replay_cache = None
+        # Started by read_records when `parse_processes` is configured, shut down by sync_stream
+        self.parse_pool = None
+        self._headers = {}
+
+    def convert_headers(self, headers: List) -> List:
+        """Converts the column labels of an export file header to field
+        names."""
+        converted = []
+        for header in headers:
+            if (field_name := self._headers.get(header)) is None:
+                field_name = self._headers[header] = convert_header(header, self.tap_stream_id)
+            converted.append(field_name)
+        return converted
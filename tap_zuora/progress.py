@@ -0,0 +1,103 @@
+"""Estimates how far along a stream sync is and when it will finish.
+
+Two measures are tracked: the bytes of the file being downloaded against
+its `Content-Length`, and the replication key range covered so far
+against the range from the bookmark to the start of the sync. Progress
+and ETA are logged every `PROGRESS_INTERVAL` seconds while files are
+downloaded and exposed by `tap_zuora.live`.
+"""
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+import pendulum
+import singer
+
+PROGRESS_INTERVAL = 60
+
+LOGGER = singer.get_logger()
+
+
+def eta(elapsed: float, fraction: Optional[float]) -> Optional[float]:
+    """Extrapolates the remaining seconds from the time it took to get
+    `fraction` of the way."""
+    if not fraction or fraction <= 0:
+        return None
+    return round(elapsed * (1 - fraction) / fraction, 1)
+
+
+def parse_timestamp(value: str) -> float:
+    return pendulum.parse(value).timestamp()
+
+
+class Progress:
+    def __init__(self, stream_name: str, interval: float = PROGRESS_INTERVAL):
+        self.stream_name = stream_name
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.file_id = None
+        self.file_started = None
+        self.content_length = None
+        self._raw_position = None
+        self.coverage_range = None
+        self._bookmarks = None
+        self._replication_key = None
+
+    def track_file(self, file_id: str, resp, chunks: Iterable[bytes], totals: Optional[Dict] = None) -> Iterator[bytes]:
+        """Passes the chunks of a download through, reporting progress as
+        they are read and keeping the bytes downloaded so far in
+        `totals["bytes"]`."""
+        self.file_id = file_id
+        self.file_started = time.monotonic()
+        content_length = resp.headers.get("Content-Length")
+        self.content_length = int(content_length) if content_length else None
+        # Bytes read off the socket, before any Content-Encoding is decoded
+        self._raw_position = resp.raw.tell
+        for chunk in chunks:
+            yield chunk
+            if totals is not None:
+                totals["bytes"] = self._raw_position()
+            self.maybe_report()
+        self.content_length = self._raw_position = None
+
+    def track_coverage(self, start: str, end: str, bookmarks: Dict, replication_key: str):
+        """Measures the covered range of the replication key by the
+        bookmark advancing from `start` to `end`."""
+        self.coverage_range = (parse_timestamp(start), parse_timestamp(end))
+        self._bookmarks = bookmarks
+        self._replication_key = replication_key
+
+    def file_fraction(self) -> Optional[float]:
+        if not self.content_length or not self._raw_position:
+            return None
+        return min(self._raw_position() / self.content_length, 1.0)
+
+    def coverage_fraction(self) -> Optional[float]:
+        if not self.coverage_range or not (bookmark := self._bookmarks.get(self._replication_key)):
+            return None
+        start, end = self.coverage_range
+        if end <= start:
+            return 1.0
+        return min(max((parse_timestamp(bookmark) - start) / (end - start), 0.0), 1.0)
+
+    def file_eta(self) -> Optional[float]:
+        if self.file_started is None:
+            return None
+        return eta(time.monotonic() - self.file_started, self.file_fraction())
+
+    def stream_eta(self) -> Optional[float]:
+        return eta(time.monotonic() - self.started, self.coverage_fraction())
+
+    def maybe_report(self):
+        if (now := time.monotonic()) - self.last_report < self.interval:
+            return
+        self.last_report = now
+        self.report()
+
+    def report(self):
+        message = f"{self.stream_name}: Progress"
+        if (fraction := self.file_fraction()) is not None:
+            message += f", file {self.file_id} {fraction:.1%} of {self.content_length} bytes (ETA {self.file_eta()}s)"
+        if (coverage := self.coverage_fraction()) is not None:
+            message += f", {self._replication_key} range {coverage:.1%} covered (ETA {self.stream_eta()}s)"
+        LOGGER.info(message)
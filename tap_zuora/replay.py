@@ -0,0 +1,210 @@
+"""Local cache of downloaded export files, to re-emit the records of a
+sync without exporting them from Zuora again.
+
+Enable it with the `replay_cache_dir` config key. Every export is
+recorded under its stream, query and window, and the lines of its files
+are kept gzipped as they are downloaded. The least recently used
+exports are evicted once the files take more than `replay_cache_mb`
+megabytes.
+
+After a failed load, run the tap with `--replay` and the state the
+target last committed: each stream's records are re-emitted from the
+cached export whose window contains its bookmark, and the ones that
+follow, without any call to Zuora.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional
+
+import pendulum
+import singer
+
+INDEX_FILE = "index.db"
+DEFAULT_CACHE_MB = 4096
+
+SCHEMA = """
+create table if not exists exports (
+    key text primary key,
+    stream text not null,
+    query text not null,
+    window_start text,
+    window_end text,
+    file_ids text not null,
+    used real not null
+);
+create table if not exists files (
+    file_id text primary key,
+    export_key text not null,
+    bytes integer not null
+);
+create index if not exists exports_start on exports (stream, query, window_start);
+"""
+
+LOGGER = singer.get_logger()
+
+
+class CachedExport:
+    __slots__ = ("key", "file_ids", "window_end")
+
+    def __init__(self, key: str, file_ids: List, window_end: Optional[str]):
+        self.key = key
+        self.file_ids = file_ids
+        self.window_end = window_end
+
+
+class ReplayCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # Files are recorded from the reader thread of the pipeline
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False)
+        self._conn.execute("pragma journal_mode = wal")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def from_config(config) -> Optional["ReplayCache"]:
+        if not (directory := config.get("replay_cache_dir")):
+            return None
+        return ReplayCache(directory, int(config.get("replay_cache_mb", DEFAULT_CACHE_MB)) * 1024 * 1024)
+
+    @staticmethod
+    def export_key(stream_name: str, query: str, window_start: Optional[str], window_end: Optional[str]) -> str:
+        return hashlib.sha1(json.dumps([stream_name, query, window_start, window_end]).encode("utf-8")).hexdigest()
+
+    def file_path(self, export_key: str, file_id: str) -> str:
+        return os.path.join(self.directory, export_key, f"{file_id}.gz")
+
+    def add_export(
+        self, stream_name: str, query: str, window_start: Optional[str], window_end: Optional[str], file_ids: List
+    ):
+        """Records the files of a finished export job, replacing a previous
+        export of the same window."""
+        key = self.export_key(stream_name, query, window_start, window_end)
+        with self._lock:
+            self._remove(key)
+            self._conn.execute(
+                "insert into exports (key, stream, query, window_start, window_end, file_ids, used)"
+                " values (?, ?, ?, ?, ?, ?, ?)",
+                (key, stream_name, query, window_start, window_end, json.dumps(file_ids), time.time()),
+            )
+            self._conn.commit()
+
+    def record_file(self, file_id: str, lines: Iterable[bytes]) -> Iterator[bytes]:
+        """Passes the lines of a download through, keeping them once the
+        whole file has been read if it belongs to a recorded export."""
+        with self._lock:
+            row = self._conn.execute(
+                "select key, file_ids from exports where file_ids like ? order by used desc", (f'%"{file_id}"%',)
+            ).fetchone()
+        if row is None or file_id not in json.loads(row[1]):
+            yield from lines
+            return
+
+        path = self.file_path(row[0], file_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        complete = False
+        try:
+            with gzip.open(f"{path}.tmp", "wb", compresslevel=1) as output:
+                for line in lines:
+                    output.write(line + b"\n")
+                    yield line
+            complete = True
+        finally:
+            if complete:
+                os.replace(f"{path}.tmp", path)
+                with self._lock:
+                    self._conn.execute(
+                        "insert or replace into files (file_id, export_key, bytes) values (?, ?, ?)",
+                        (file_id, row[0], os.path.getsize(path)),
+                    )
+                    self._evict()
+            elif os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+
+    def find(self, stream_name: str, query: str, bookmark: Optional[str]) -> Optional[CachedExport]:
+        """Returns the export of the stream whose window contains
+        `bookmark` and whose files are all cached.
+
+        A window contains the bookmarks from its start up to, but not
+        including, its end; an export without a window end (AQuA) contains
+        every bookmark from its start. Of several, the one starting the
+        latest is returned, then the most recently used.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "select key, file_ids, window_start, window_end from exports where stream = ? and query = ?"
+                " order by used desc",
+                (stream_name, query),
+            ).fetchall()
+        if bookmark is None:
+            matches = [row for row in rows if row[2] is None]
+        else:
+            position = pendulum.parse(bookmark)
+            matches = [
+                row
+                for row in rows
+                if row[2] is not None
+                and pendulum.parse(row[2]) <= position
+                and (row[3] is None or position < pendulum.parse(row[3]))
+            ]
+            matches.sort(key=lambda row: pendulum.parse(row[2]), reverse=True)
+        with self._lock:
+            for key, file_ids, _, window_end in matches:
+                file_ids = json.loads(file_ids)
+                (cached,) = self._conn.execute("select count(*) from files where export_key = ?", (key,)).fetchone()
+                if cached == len(file_ids):
+                    self._conn.execute("update exports set used = ? where key = ?", (time.time(), key))
+                    self._conn.commit()
+                    return CachedExport(key, file_ids, window_end)
+        return None
+
+    # Must match call signature of the APIs
+    def stream_file(self, client, file_id: str, progress=None) -> Iterator[bytes]:  # pylint: disable=unused-argument
+        with self._lock:
+            row = self._conn.execute("select export_key from files where file_id = ?", (file_id,)).fetchone()
+        if row is None:
+            raise Exception(f"File ID {file_id} isn't in the replay cache")
+        with gzip.open(self.file_path(row[0], file_id), "rb") as cached:
+            for line in cached:
+                yield line.rstrip(b"\n")
+
+    def evict(self):
+        """Removes the least recently used exports until the cached files
+        fit in `max_bytes`."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        (total,) = self._conn.execute("select coalesce(sum(bytes), 0) from files").fetchone()
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "select exports.key, sum(files.bytes) from exports join files on files.export_key = exports.key"
+                " group by exports.key order by exports.used limit 1"
+            ).fetchone()
+            if row is None:
+                break
+            LOGGER.info(f"Evicting export {row[0]} ({row[1]} bytes) from the replay cache")
+            self._remove(row[0])
+            total -= row[1]
+        self._conn.commit()
+
+    def _remove(self, key: str):
+        for (file_id,) in self._conn.execute("select file_id from files where export_key = ?", (key,)).fetchall():
+            if os.path.exists(path := self.file_path(key, file_id)):
+                os.remove(path)
+        if os.path.isdir(export_dir := os.path.join(self.directory, key)) and not os.listdir(export_dir):
+            os.rmdir(export_dir)
+        self._conn.execute("delete from files where export_key = ?", (key,))
+        self._conn.execute("delete from exports where key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,85 @@
+"""On-disk index of the content hash of every row of a FULL_TABLE stream.
+
+Enable it with the `row_index_dir` config key. Each stream gets its own
+SQLite file mapping `Id` to a 64-bit hash of the record and the export
+run that last saw it, so only new and changed rows need to be emitted
+and the rows missing from a full export can be reported as deleted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+SCHEMA = """
+create table if not exists rows (
+    id text primary key,
+    hash integer not null,
+    run integer not null
+) without rowid;
+"""
+# Ids looked up per query, below SQLite's default limit of 999 variables
+QUERY_IDS = 500
+
+
+def row_hash(record: Dict) -> int:
+    content = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(content, digest_size=8).digest(), "big", signed=True)
+
+
+class RowHashIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        # Changes are committed once per export file
+        self._conn.execute("pragma journal_mode = wal")
+        self._conn.execute("pragma synchronous = normal")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def from_config(config: Dict, stream_name: str) -> Optional["RowHashIndex"]:
+        if not (index_dir := config.get("row_index_dir")):
+            return None
+        os.makedirs(index_dir, exist_ok=True)
+        return RowHashIndex(os.path.join(index_dir, f"{stream_name}.db"))
+
+    def changed_ids(self, rows: List[Tuple[str, int]], run: int) -> Set[str]:
+        """Records that `run` saw a batch of `(id, hash)` rows, returning the
+        Ids of the rows that are new or whose content changed since they
+        were last seen."""
+        known = {}
+        for start in range(0, len(rows), QUERY_IDS):
+            record_ids = list({record_id for record_id, _ in rows[start : start + QUERY_IDS]})
+            placeholders = ", ".join("?" for _ in record_ids)
+            known.update(self._conn.execute(f"select id, hash from rows where id in ({placeholders})", record_ids))
+
+        changed, seen = set(), {}
+        for record_id, digest in rows:
+            if known.get(record_id) != digest:
+                changed.add(record_id)
+            seen[record_id] = digest
+        self._conn.executemany(
+            "insert or replace into rows (id, hash, run) values (?, ?, ?)",
+            [(record_id, digest, run) for record_id, digest in seen.items() if record_id in changed],
+        )
+        self._conn.executemany(
+            "update rows set run = ? where id = ?",
+            [(run, record_id) for record_id in seen if record_id not in changed],
+        )
+        return changed
+
+    def commit(self):
+        self._conn.commit()
+
+    def missing_ids(self, run: int) -> Iterator[str]:
+        """Yields the Ids that weren't seen by `run`."""
+        for (record_id,) in self._conn.execute("select id from rows where run != ?", (run,)):
+            yield record_id
+
+    def forget_missing(self, run: int):
+        self._conn.execute("delete from rows where run != ?", (run,))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,79 @@
+import math
+from typing import Dict, List
+
+import singer
+from singer import CatalogEntry, metadata
+
+CATALOG_ORDER = "catalog"
+SHORTEST_FIRST = "shortest_first"
+LONGEST_FIRST = "longest_first"
+PRIORITY = "priority"
+POLICIES = [CATALOG_ORDER, SHORTEST_FIRST, LONGEST_FIRST, PRIORITY]
+
+LOGGER = singer.get_logger()
+
+
+def last_syncs(state: Dict) -> Dict:
+    return {
+        stream_name: bookmark["last_sync"]
+        for stream_name, bookmark in state.get("bookmarks", {}).items()
+        if bookmark.get("last_sync")
+    }
+
+
+def expected_costs(state: Dict) -> Dict:
+    """Returns the expected duration in seconds of syncing each stream from
+    its last recorded run.
+
+    Runs recorded without a duration are estimated from their row count
+    at the average rate of the other streams.
+    """
+    runs = last_syncs(state)
+    timed = [run for run in runs.values() if run.get("duration") is not None and run.get("rows")]
+    seconds_per_row = sum(run["duration"] for run in timed) / sum(run["rows"] for run in timed) if timed else None
+
+    costs = {}
+    for stream_name, run in runs.items():
+        if run.get("duration") is not None:
+            costs[stream_name] = run["duration"]
+        elif run.get("rows") is not None and seconds_per_row is not None:
+            costs[stream_name] = run["rows"] * seconds_per_row
+    return costs
+
+
+def stream_priority(stream: CatalogEntry) -> float:
+    mdata = metadata.to_map(stream.metadata)
+    return float(metadata.get(mdata, (), "tap-zuora.priority") or 0)
+
+
+def order_streams(streams: List[CatalogEntry], state: Dict, policy: str) -> List[CatalogEntry]:
+    """Orders the catalog streams according to the scheduling policy.
+
+    Sorting is stable, so ties keep their catalog order. Streams without
+    an expected cost count as the most expensive, since their first sync
+    is usually a full historical export.
+    """
+    if policy == CATALOG_ORDER:
+        return list(streams)
+    costs = expected_costs(state)
+    if policy == SHORTEST_FIRST:
+        return sorted(streams, key=lambda s: costs.get(s.tap_stream_id, math.inf))
+    if policy == LONGEST_FIRST:
+        return sorted(streams, key=lambda s: -costs.get(s.tap_stream_id, math.inf))
+    if policy == PRIORITY:
+        return sorted(streams, key=lambda s: -stream_priority(s))
+
+    raise Exception(f"Unknown stream_order `{policy}`, expected one of {POLICIES}")
+
+
+def resume_order(streams: List[CatalogEntry], state: Dict, policy: str) -> List[CatalogEntry]:
+    """Returns the order to sync streams in, reusing the order saved in the
+    state by an interrupted sync so `current_stream` resumes correctly."""
+    saved_order = state.get("stream_order")
+    if not (state.get("current_stream") and saved_order):
+        return order_streams(streams, state, policy)
+
+    LOGGER.info("Reusing stream order of the interrupted sync")
+    positions = {name: index for index, name in enumerate(saved_order)}
+    ordered = order_streams(streams, state, policy)
+    return sorted(ordered, key=lambda s: positions.get(s.tap_stream_id, len(positions)))
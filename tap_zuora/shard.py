@@ -0,0 +1,110 @@
+"""Splits the selected streams of a sync across several nodes.
+
+Enable it with the `shard_count` and `shard_index` config keys. Every
+node is given the same catalog and state and takes its share of the
+selected streams, balanced by the expected duration of each stream
+(see `tap_zuora.schedule.expected_costs`). Each node writes its own
+state, recording the streams of its shard, and the states of all shards
+are combined into the state of the next run with:
+
+    tap-zuora-merge-state shard-0.json shard-1.json ... > state.json
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+import singer
+from singer import CatalogEntry
+
+from tap_zuora.schedule import expected_costs
+
+LOGGER = singer.get_logger()
+
+
+def assign_shards(stream_names: List[str], costs: Dict, shard_count: int) -> List[List[str]]:
+    """Assigns the most expensive remaining stream to the least loaded
+    shard until all are assigned.
+
+    Streams without an expected cost count as the most expensive known
+    one. Ties are broken by name and shard index, so every node computes
+    the same assignment.
+    """
+    default_cost = max((costs[name] for name in stream_names if name in costs), default=1.0)
+    loads = [0.0] * shard_count
+    shards = [[] for _ in range(shard_count)]
+    for stream_name in sorted(stream_names, key=lambda name: (-costs.get(name, default_cost), name)):
+        index = min(range(shard_count), key=lambda i: (loads[i], i))
+        shards[index].append(stream_name)
+        loads[index] += costs.get(stream_name, default_cost)
+    return shards
+
+
+def shard_streams(streams: List[CatalogEntry], state: Dict, shard_index: int, shard_count: int) -> List[CatalogEntry]:
+    """Returns the selected streams of this node's shard, in their given
+    order, and records them in the state.
+
+    A state this shard wrote itself, e.g. when resuming an interrupted
+    sync, keeps its recorded streams, since the durations it recorded
+    since would change the assignment. It is only recomputed from a
+    merged state.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise Exception(f"Config key `shard_index` must be between 0 and {shard_count - 1}, got {shard_index}")
+    selected = [stream.tap_stream_id for stream in streams if stream.is_selected()]
+    recorded = state.get("shard") or {}
+    if recorded.get("index") == shard_index and recorded.get("count") == shard_count:
+        owned = set(recorded["streams"])
+    else:
+        owned = set(assign_shards(selected, expected_costs(state), shard_count)[shard_index])
+    streams = [stream for stream in streams if stream.tap_stream_id in owned]
+    state["shard"] = {"index": shard_index, "count": shard_count, "streams": [s.tap_stream_id for s in streams]}
+    LOGGER.info(f"Shard {shard_index + 1} of {shard_count} syncs {len(streams)} of {len(selected)} selected streams")
+    return streams
+
+
+def merge_states(states: List[Dict]) -> Dict:
+    """Combines the final states of all the shards of a run.
+
+    Each stream's bookmark (including its version, pending `file_ids` and
+    export job) comes from the shard that synced it, the bookmarks of
+    streams no shard synced from the first state that has them. The
+    `current_stream` and `stream_order` of interrupted shards are
+    dropped: the next run reshards the streams, so resuming from one of
+    them would skip the streams ordered before it. Interrupted streams
+    resume from their bookmarks instead.
+    """
+    if not states:
+        raise Exception("No shard states to merge")
+    if missing := [position for position, state in enumerate(states) if "shard" not in state]:
+        raise Exception(f"States {missing} weren't written by a sharded sync")
+    states = sorted(states, key=lambda state: state["shard"]["index"])
+    shard_count = states[0]["shard"]["count"]
+    indexes = [state["shard"]["index"] for state in states]
+    if any(state["shard"]["count"] != shard_count for state in states) or indexes != list(range(shard_count)):
+        raise Exception(f"Expected one state of each of {shard_count} shards, got shards {indexes}")
+
+    bookmarks = {}
+    for state in states:
+        for stream_name, bookmark in state.get("bookmarks", {}).items():
+            bookmarks.setdefault(stream_name, bookmark)
+    for state in states:
+        for stream_name in state["shard"]["streams"]:
+            if stream_name in state.get("bookmarks", {}):
+                bookmarks[stream_name] = state["bookmarks"][stream_name]
+
+    return {"bookmarks": bookmarks, "current_stream": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the states of the shards of a tap-zuora sync")
+    parser.add_argument("states", nargs="+", help="State file written by each shard")
+    args = parser.parse_args()
+
+    merged = merge_states([singer.utils.load_json(path) for path in args.states])
+    json.dump(merged, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Writes the synced streams straight to Parquet files instead of emitting
+Singer records.
+
+Enable it with the `parquet_dir` config key. The records of each export
+file are written to `<parquet_dir>/<stream>/run=<run id>/part-<n>.parquet`
+with a column per property of the catalog schema, in row groups holding
+about `parquet_row_group_mb` megabytes of column data. A Parquet file is
+written under a temporary name and renamed once complete, and the
+bookmarks of its rows are only written after that, so an interrupted
+sync resumes from the last complete file.
+`<parquet_dir>/_manifests/run=<run id>.json` lists the complete files of
+the run for the uploader and gets a `finished` time once the sync ends.
+
+Requires the `arrow` extra (`pip install tap-zuora[arrow]`).
+"""
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import singer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_ROW_GROUP_MB = 64
+BATCH_ROWS = 10000
+MANIFEST_DIR = "_manifests"
+ARROW_TYPES = {"integer": "int64", "number": "float64", "boolean": "bool_", "string": "string"}
+
+LOGGER = singer.get_logger()
+
+
+def arrow_type(field_schema: Dict):
+    """Returns the Parquet column type of a field, falling back to JSON
+    text for anything but a single scalar type."""
+    types = field_schema.get("type", [])
+    if isinstance(types, str):
+        types = [types]
+    non_null = [typ for typ in types if typ != "null"]
+    if len(non_null) != 1 or non_null[0] not in ARROW_TYPES:
+        return pa.string()
+    if non_null[0] == "string" and field_schema.get("format") == "date-time":
+        return pa.timestamp("us", tz="UTC")
+    return getattr(pa, ARROW_TYPES[non_null[0]])()
+
+
+def parquet_schema(schema: Dict):
+    return pa.schema([pa.field(name, arrow_type(field)) for name, field in schema["properties"].items()])
+
+
+def column_array(field, values: List):
+    if pa.types.is_timestamp(field.type):
+        # singer.transform formats date-times as ISO 8601 strings, which arrow parses
+        return pa.array(values, pa.string()).cast(field.type)
+    if pa.types.is_string(field.type):
+        values = [value if value is None or isinstance(value, str) else json.dumps(value) for value in values]
+    return pa.array(values, field.type)
+
+
+class StreamWriter:
+    """Buffers the records of one stream into row groups of a Parquet file
+    per export file."""
+
+    def __init__(self, sink: "ParquetSink", stream_name: str, schema: Dict):
+        self.sink = sink
+        self.stream_name = stream_name
+        self.schema = parquet_schema(schema)
+        self._rows = []
+        self._batches = []
+        self._batched_bytes = 0
+        self._writer = None
+        self._path = None
+        self._written_rows = 0
+
+    def write(self, record: Dict):
+        self._rows.append(record)
+        if len(self._rows) >= BATCH_ROWS:
+            self._flush_rows()
+
+    def _flush_rows(self):
+        if not self._rows:
+            return
+        columns = [column_array(field, [row.get(field.name) for row in self._rows]) for field in self.schema]
+        batch = pa.RecordBatch.from_arrays(columns, schema=self.schema)
+        self._rows = []
+        self._batches.append(batch)
+        self._batched_bytes += batch.nbytes
+        if self._batched_bytes >= self.sink.row_group_bytes:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        if not self._batches:
+            return
+        if self._writer is None:
+            self._path = self.sink.next_path(self.stream_name)
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            self._writer = pq.ParquetWriter(f"{self._path}.tmp", self.schema)
+        table = pa.Table.from_batches(self._batches, schema=self.schema)
+        self._writer.write_table(table, row_group_size=table.num_rows)
+        self._written_rows += table.num_rows
+        self._batches = []
+        self._batched_bytes = 0
+
+    def finish_file(self) -> Optional[str]:
+        """Completes the Parquet file of the records written so far and adds
+        it to the manifest, returning its path or None if there were no
+        records."""
+        self._flush_rows()
+        self._write_row_group()
+        if self._writer is None:
+            return None
+        self._writer.close()
+        os.replace(f"{self._path}.tmp", self._path)
+        self.sink.add_file(self.stream_name, self._path, self._written_rows)
+        path = self._path
+        self._writer = self._path = None
+        self._written_rows = 0
+        return path
+
+    def abort(self):
+        """Discards the records of an incomplete file."""
+        self._rows = []
+        self._batches = []
+        self._batched_bytes = 0
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(f"{self._path}.tmp")
+            self._writer = self._path = None
+            self._written_rows = 0
+
+
+class ParquetSink:
+    def __init__(self, directory: str, row_group_bytes: int = DEFAULT_ROW_GROUP_MB * 1024 * 1024):
+        if pa is None:
+            raise Exception("Config key `parquet_dir` requires pyarrow (`pip install tap-zuora[arrow]`)")
+        self.directory = directory
+        self.row_group_bytes = row_group_bytes
+        self.run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        self.manifest = {
+            "run_id": self.run_id,
+            "started": singer.utils.strftime(singer.utils.now()),
+            "finished": None,
+            "files": [],
+        }
+        self._file_counts = {}
+        self.write_manifest()
+
+    @staticmethod
+    def from_config(config: Dict) -> Optional["ParquetSink"]:
+        if not (directory := config.get("parquet_dir")):
+            return None
+        row_group_mb = int(config.get("parquet_row_group_mb", DEFAULT_ROW_GROUP_MB))
+        return ParquetSink(directory, row_group_mb * 1024 * 1024)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_DIR, f"run={self.run_id}.json")
+
+    def open_stream(self, stream_name: str, schema: Dict) -> StreamWriter:
+        return StreamWriter(self, stream_name, schema)
+
+    def next_path(self, stream_name: str) -> str:
+        count = self._file_counts[stream_name] = self._file_counts.get(stream_name, 0) + 1
+        return os.path.join(self.directory, stream_name, f"run={self.run_id}", f"part-{count:05d}.parquet")
+
+    def add_file(self, stream_name: str, path: str, rows: int):
+        self.manifest["files"].append(
+            {
+                "stream": stream_name,
+                "path": os.path.relpath(path, self.directory),
+                "rows": rows,
+                "bytes": os.path.getsize(path),
+            }
+        )
+        self.write_manifest()
+        LOGGER.info(f"{stream_name}: Wrote {rows} rows to {path}")
+
+    def write_manifest(self):
+        """Replaces the manifest atomically so the uploader never reads a
+        partial one."""
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as output:
+            json.dump(self.manifest, output, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def close(self):
+        self.manifest["finished"] = singer.utils.strftime(singer.utils.now())
+        self.write_manifest()
@@ -1,71 +1,313 @@
 import csv
+import functools
+import hashlib
 import io
+import json
+import statistics
+import threading
 import time
-from typing import Dict, List, Type, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import pendulum
 import singer
 from singer import transform
 
-from tap_zuora import apis
+from tap_zuora import apis, columnar, history, jobs
 from tap_zuora.client import Client
+from tap_zuora.convert import RecordConverter
 from tap_zuora.exceptions import ApiException, FileIdNotFoundException
+from tap_zuora.parallel import map_ordered, split_chunks
+from tap_zuora.partition import MAX_PARTITIONS, sample, split_range
+from tap_zuora.pipeline import Pipeline
+from tap_zuora.plan import StreamPlan
+from tap_zuora.replay import ReplayCache
+from tap_zuora.row_index import RowHashIndex, row_hash
+from tap_zuora.sink import ParquetSink
 
 PARTNER_ID = "salesforce"
 DEFAULT_POLL_INTERVAL = 60
 DEFAULT_JOB_TIMEOUT = 12 * 60 * 60  # 12 hrs in seconds
 MAX_EXPORT_DAYS = 30
+MAX_BOUNDARY_IDS = 10000
+ROW_INDEX_BATCH = 1000
+# Id ranges are sampled again once the slowest one takes this many times as long as the median one
+DRIFT_RATIO = 2
 
 LOGGER = singer.get_logger()
 
 
+def write_record(plan: StreamPlan, record: Dict, time_extracted=None):
+    """Emits a record, or writes it to the Parquet sink of the stream."""
+    if plan.sink:
+        plan.sink.write(record)
+    else:
+        singer.write_record(plan.tap_stream_id, record, time_extracted=time_extracted)
+
+
 def parse_csv_line(line):
     reader = csv.reader(io.StringIO(line.decode("utf-8").replace("\0", "")))
     return next(reader)
 
 
-def convert_header(header: str, stream: str) -> str:
-    dotted_field = header.split(".")
-    if stream == dotted_field[0]:
-        return dotted_field[1]
+def parse_header_line(line, plan: StreamPlan) -> List:
+    return plan.convert_headers(parse_csv_line(line))
+
+
+def to_record(parsed_line: List, header: List, schema: Dict) -> Optional[Dict]:
+    """Transforms a parsed line, returning None if it doesn't match the
+    header so the caller can fail the file."""
+    if len(header) != len(parsed_line):
+        return None
+    return transform(dict(zip(header, parsed_line)), schema)
+
 
-    return header.replace(".", "")
+def parse_lines(lines: List[bytes]) -> List[List]:
+    return [parse_csv_line(line) for line in lines if line]
 
 
-def parse_header_line(line, stream: str) -> List:
-    return [convert_header(h, stream) for h in parse_csv_line(line)]
+def parse_chunk(lines: List[bytes]) -> List[List]:
+    """Parses a chunk of lines cut at record boundaries with a single
+    reader, so a quoted value spanning several lines is one value."""
+    reader = csv.reader(io.StringIO(b"\n".join(lines).decode("utf-8").replace("\0", "")))
+    return [parsed_line for parsed_line in reader if parsed_line]
 
 
-def poll_job_until_done(job_id: str, client: Client, api: Union[Type[apis.Rest], Type[apis.Aqua]]) -> List:
+def transform_chunk(lines: List[bytes], header: List, schema: Dict) -> List[Tuple[List, Optional[Dict]]]:
+    return [(parsed_line, to_record(parsed_line, header, schema)) for parsed_line in parse_chunk(lines)]
+
+
+def read_records(lines: Iterable[bytes], header: List, plan: StreamPlan) -> Iterator[Tuple[List, Optional[Dict]]]:
+    """Yields each parsed line of a file with its record.
+
+    With `csv_engine` set to `arrow`, the file is parsed in columnar
+    batches by pyarrow, falling back to the pure-Python parser when it
+    isn't installed. With `parse_processes` configured, chunks of the
+    file are parsed and transformed on that many worker processes. With
+    `pipeline_buffer_rows` configured, reading, parsing and transforming
+    run as separate stages on their own threads, buffering at most that
+    many rows between two stages. With `conversion_cache_size`
+    configured, the converted values of repeated cells are cached per
+    column.
+    """
+    schema = plan.schema
+    if plan.config.get("csv_engine") == "arrow":
+        if columnar.available():
+            yield from columnar.read_records(lines, header, schema)
+            return
+        LOGGER.warning("pyarrow is not installed, parsing %s with the Python csv engine", plan.tap_stream_id)
+
+    if processes := int(plan.config.get("parse_processes", 0)):
+        if plan.parse_pool is None:
+            if plan.config.get("pipeline_buffer_rows"):
+                LOGGER.warning("Ignoring pipeline_buffer_rows for %s, parse_processes is set", plan.tap_stream_id)
+            plan.parse_pool = ProcessPoolExecutor(processes)
+        yield from map_ordered(plan.parse_pool, transform_chunk, split_chunks(lines), 2 * processes, header, schema)
+        return
+
+    if cache_size := int(plan.config.get("conversion_cache_size", 0)):
+        converter = RecordConverter(header, schema, cache_size)
+        convert = converter.convert
+    else:
+        converter = None
+        convert = functools.partial(to_record, header=header, schema=schema)
+
+    if buffer_rows := int(plan.config.get("pipeline_buffer_rows", 0)):
+
+        def transform_lines(parsed_lines: List[List]) -> List[Tuple[List, Optional[Dict]]]:
+            return [(parsed_line, convert(parsed_line)) for parsed_line in parsed_lines]
+
+        yield from Pipeline(buffer_rows).run(lines, [parse_lines, transform_lines])
+    else:
+        for line in lines:
+            if not line:
+                continue
+            parsed_line = parse_csv_line(line)
+            yield parsed_line, convert(parsed_line)
+
+    if converter:
+        converter.log_hit_rates(plan.tap_stream_id)
+
+
+def poll_job_until_done(
+    job_id: str, client: Client, api: apis.ExportApi, recorded: bool = False, stopped: Optional[threading.Event] = None
+) -> List:
+    """Waits for an export job, returning its file ids. A job `recorded` in
+    the state is left running if the wait is interrupted, to be
+    re-attached to by the next sync. Waiting ends with `ExportFailed` once
+    `stopped`, or `jobs.STOP` on shutdown, is set."""
     timeout_time = pendulum.utcnow().add(seconds=DEFAULT_JOB_TIMEOUT)
-    while pendulum.utcnow() < timeout_time:
-        if api.job_ready(client, job_id):
-            return api.get_file_ids(client, job_id)
+    with jobs.tracked(client, job_id, recorded), history.polling(job_id):
+        while pendulum.utcnow() < timeout_time:
+            if api.job_ready(client, job_id):
+                history.current().job_ready(job_id)
+                return api.get_file_ids(client, job_id)
+
+            if (stopped or jobs.STOP).wait(DEFAULT_POLL_INTERVAL) or jobs.STOP.is_set():
+                raise apis.ExportFailed(f"Stopped waiting for export job {job_id}")
+
+        raise apis.ExportTimedOut(DEFAULT_JOB_TIMEOUT // 60, "minutes")
+
+
+def job_fingerprint(plan: StreamPlan, *window) -> str:
+    """Identifies the export an export job was submitted for."""
+    return hashlib.sha1(json.dumps([plan.select_query, *window]).encode("utf-8")).hexdigest()
+
+
+def reattachable(client: Client, job: Dict, api, fingerprint: str) -> bool:
+    """Returns whether an export job recorded in the state by an
+    interrupted sync was submitted for the same export and is still
+    running or completed. Jobs for another export and expired ones are
+    cancelled."""
+    if job["fingerprint"] != fingerprint:
+        LOGGER.info("Export job %s was submitted for a different export, not re-attaching", job["id"])
+        jobs.cancel(client, job["id"])
+        return False
+    if pendulum.parse(job["submitted_at"]).add(seconds=DEFAULT_JOB_TIMEOUT) < pendulum.utcnow():
+        LOGGER.info("Export job %s was submitted at %s and has expired", job["id"], job["submitted_at"])
+        jobs.cancel(client, job["id"])
+        return False
+    try:
+        api.job_ready(client, job["id"])
+    except (apis.ExportFailed, ApiException) as ex:
+        LOGGER.info("Export job %s can't be re-attached to: %s", job["id"], ex)
+        return False
+
+    LOGGER.info("Re-attaching to export job %s submitted at %s", job["id"], job["submitted_at"])
+    return True
 
-        time.sleep(DEFAULT_POLL_INTERVAL)
 
-    raise apis.ExportTimedOut(DEFAULT_JOB_TIMEOUT // 60, "minutes")
+def resume_job(client: Client, state: Dict, plan: StreamPlan, api, fingerprint: str) -> Optional[str]:
+    """Returns the id of the export job recorded in the state by an
+    interrupted sync if it can be re-attached to."""
+    if not (job := state["bookmarks"][plan.tap_stream_id].pop("job", None)):
+        return None
+    if not reattachable(client, job, api, fingerprint):
+        return None
+    state["bookmarks"][plan.tap_stream_id]["job"] = job
+    return job["id"]
+
+
+def submit_job(
+    client: Client,
+    state: Dict,
+    plan: StreamPlan,
+    api,
+    fingerprint: str,
+    create: Callable[[], str],
+    window_end: Optional[str] = None,
+) -> str:
+    """Returns the id of an export job for `fingerprint`, re-attaching to
+    the one of an interrupted sync when possible and otherwise submitting
+    one with `create`.
+
+    A submitted job is recorded in the state straight away, so a sync
+    interrupted while waiting for it can pick it up again. The end of its
+    query window is recorded too, see `recorded_window_end`.
+    """
+    if job_id := resume_job(client, state, plan, api, fingerprint):
+        return job_id
+
+    job = new_job(create(), fingerprint)
+    if window_end:
+        job["window_end"] = window_end
+    state["bookmarks"][plan.tap_stream_id]["job"] = job
+    singer.write_state(state)
+    return job["id"]
+
+
+def new_job(job_id: str, fingerprint: str) -> Dict:
+    """Returns the record of a submitted export job kept in the state."""
+    return {"id": job_id, "fingerprint": fingerprint, "submitted_at": singer.utils.strftime(singer.utils.now())}
+
+
+def recorded_window_end(state: Dict, plan: StreamPlan, start_date: str, sync_started) -> Optional[str]:
+    """Returns the end of the query window of the job recorded in the state
+    if it was submitted for the window starting at `start_date`.
+
+    The last window of a sync ends when the sync started, so a restarted
+    sync has to end it at the same time to re-attach to its job.
+    """
+    job = state["bookmarks"][plan.tap_stream_id].get("job") or {}
+    if not (window_end := job.get("window_end")):
+        return None
+    if job["fingerprint"] != job_fingerprint(plan, start_date, window_end):
+        return None
+    if not pendulum.parse(start_date) < pendulum.parse(window_end) <= sync_started:
+        return None
+    return window_end
+
+
+def save_file_ids(state: Dict, plan: StreamPlan, file_ids: List, window_end: Optional[str] = None):
+    """Swaps the finished export job for its files in the state.
+
+    The export is recorded in the replay cache, starting at the current
+    bookmark and, for REST windows, ending at `window_end`.
+    """
+    if plan.replay_cache:
+        window_start = state["bookmarks"][plan.tap_stream_id].get(plan.replication_key)
+        plan.replay_cache.add_export(plan.tap_stream_id, plan.select_query, window_start, window_end, file_ids)
+    state["bookmarks"][plan.tap_stream_id]["file_ids"] = file_ids
+    state["bookmarks"][plan.tap_stream_id].pop("job", None)
+    singer.write_state(state)
 
 
-def clear_file_ids(state: Dict, stream: Dict) -> Dict:
-    state["bookmarks"][stream["tap_stream_id"]].pop("file_ids", None)
+def clear_file_ids(state: Dict, plan: StreamPlan) -> Dict:
+    state["bookmarks"][plan.tap_stream_id].pop("file_ids", None)
     singer.write_state(state)
     return state
 
 
-def clear_stateful_session(state: Dict, stream: Dict) -> Dict:
-    state["bookmarks"][stream["tap_stream_id"]]["version"] = int(time.time())
+def clear_stateful_session(state: Dict, plan: StreamPlan) -> Dict:
+    state["bookmarks"][plan.tap_stream_id]["version"] = int(time.time())
     singer.write_state(state)
     return state
 
 
+def load_boundary(state: Dict, plan: StreamPlan, bookmark: str) -> Set:
+    """Returns the Ids already emitted with a replication key equal to the
+    bookmark, so records re-exported by the `>=` filter can be dropped.
+
+    The boundary is taken out of the state while files are being synced
+    so it isn't serialized with every per-record state message.
+    """
+    boundary = state["bookmarks"][plan.tap_stream_id].pop("boundary", None) or {}
+    if boundary.get("value") != bookmark:
+        return set()
+    return set(boundary.get("ids", []))
+
+
+def save_boundary(state: Dict, plan: StreamPlan, bookmark: str, boundary_ids: Set):
+    state["bookmarks"][plan.tap_stream_id]["boundary"] = {"value": bookmark, "ids": sorted(boundary_ids)}
+
+
+def write_changed(plan: StreamPlan, records: List[Dict], run: int, extraction_time, counter, totals: Dict):
+    """Emits the records of a batch that are new or changed since the
+    previous export, according to the row index, and empties the batch."""
+    changed = plan.row_index.changed_ids(
+        [(record["Id"], row_hash(record)) for record in records if record.get("Id") is not None], run
+    )
+    for record in records:
+        if record.get("Id") is None or record["Id"] in changed:
+            write_record(plan, record, extraction_time)
+            counter.increment()
+            totals["rows"] += 1
+    records.clear()
+
+
 def sync_file_ids(
-    file_ids: List, client: Client, state: Dict, stream: Dict, api, counter
-):  # pylint: disable=too-many-branches
-    if stream.get("replication_key"):
-        start_date = state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]]
+    file_ids: List, client: Client, state: Dict, plan: StreamPlan, api, counter
+):  # pylint: disable=too-many-branches,too-many-statements
+    stream_name, replication_key = plan.tap_stream_id, plan.replication_key
+    bookmarks = state["bookmarks"][stream_name]
+    if replication_key:
+        start_date = bookmarks[replication_key]
+        boundary_value, boundary_ids = start_date, load_boundary(state, plan, start_date)
     else:
         start_date = None
+    if row_index := plan.row_index:
+        # Identifies the full export being synced, kept in state so a resumed export has the same one
+        run = bookmarks.setdefault("row_index_run", int(time.time()))
 
     while file_ids:
         file_id = file_ids.pop(0)
@@ -73,13 +315,17 @@ def sync_file_ids(
         # anywhere in this batch file. Needs to reset after processing
         # each file.
         saw_deleted = False
+        totals = {"bytes": 0, "rows": 0}
+        pending = []
+        recorder = history.current()
+        recorder.download_started(totals)
         try:
-            lines = api.stream_file(client, file_id)
+            lines = api.stream_file(client, file_id, functools.partial(recorder.progress.track_file, totals=totals))
         except ApiException as ex:
             # If the file has been deleted, write state with "file_ids" removed and re-raise.
             # Don't advance the bookmark until all files in the window have been synced.
             if ex.resp.status_code == 404:
-                clear_file_ids(state, stream)
+                clear_file_ids(state, plan)
                 raise FileIdNotFoundException(
                     f"File ID {file_id} has been deleted, making the sync window invalid. "
                     f"Removing partially exported files from state and will resume from "
@@ -87,109 +333,167 @@ def sync_file_ids(
                 ) from ex
 
             raise
-        header = parse_header_line(next(lines), stream["tap_stream_id"])
+        if plan.replay_cache:
+            lines = plan.replay_cache.record_file(file_id, lines)
+        header = parse_header_line(next(lines), plan)
         extraction_time = singer.utils.now()
-        for line in lines:
-            if not line:
-                continue
-
-            parsed_line = parse_csv_line(line)
-            if len(header) != len(parsed_line):
-                state = clear_file_ids(state, stream)
-                state = clear_stateful_session(state, stream)
+        # With a sink, the bookmark of the file's rows is only kept once the file is complete
+        file_bookmark = bookmarks.get(replication_key) if replication_key else None
+        for parsed_line, record in read_records(lines, header, plan):
+            if record is None:
+                state = clear_file_ids(state, plan)
+                state = clear_stateful_session(state, plan)
                 raise Exception(
                     f"Detected that File ID {file_id} is non-rectangular. Found row with {len(parsed_line)} "
                     f"entries, expected {len(header)} entries from header line. "
                     f"Will resume from bookmark with new AQuA session on next extraction."
                 )
 
-            row = dict(zip(header, parsed_line))
-            record = transform(row, stream["schema"])
             # safe get because not all records will have 'Deleted'
             if record.get("Deleted", False):
                 # We should emit that we saw a deleted record
                 saw_deleted = True
-            if stream.get("replication_key"):
-                bookmark = record.get(stream["replication_key"])
+            if replication_key:
+                bookmark = record.get(replication_key)
                 if not bookmark or bookmark < start_date:
                     # There's a chance we get back a bad record here, and we don't want to null the bookmark
                     continue
 
-                singer.write_record(stream["tap_stream_id"], record, time_extracted=extraction_time)
-                state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]] = bookmark
-                singer.write_state(state)
+                record_id = record.get("Id")
+                if bookmark == boundary_value and record_id is not None and record_id in boundary_ids:
+                    # Exact repeat of a record emitted at the bookmark by a previous sync
+                    continue
+
+                if bookmark != boundary_value:
+                    boundary_value, boundary_ids = bookmark, set()
+                if record_id is not None and len(boundary_ids) < MAX_BOUNDARY_IDS:
+                    boundary_ids.add(record_id)
+
+                write_record(plan, record, extraction_time)
+                if plan.sink:
+                    file_bookmark = bookmark
+                else:
+                    bookmarks[replication_key] = bookmark
+                    singer.write_state(state)
             else:
-                singer.write_record(stream["tap_stream_id"], record, time_extracted=extraction_time)
+                if row_index:
+                    # Rows are looked up in the index a batch at a time
+                    pending.append(record)
+                    if len(pending) >= ROW_INDEX_BATCH:
+                        write_changed(plan, pending, run, extraction_time, counter, totals)
+                    continue
+                write_record(plan, record, extraction_time)
 
             counter.increment()
+            totals["rows"] += 1
 
+        if row_index:
+            write_changed(plan, pending, run, extraction_time, counter, totals)
+        recorder.download_finished(totals["bytes"], totals["rows"])
         if saw_deleted:
             # https://stitchdata.atlassian.net/browse/SRCE-322
             LOGGER.info("Saw a deleted record in %s", file_id)
 
-        state["bookmarks"][stream["tap_stream_id"]]["file_ids"] = file_ids
+        if plan.sink:
+            plan.sink.finish_file()
+            if replication_key:
+                bookmarks[replication_key] = file_bookmark
+        if replication_key:
+            save_boundary(state, plan, boundary_value, boundary_ids)
+        if row_index:
+            row_index.commit()
+        bookmarks["file_ids"] = file_ids
         singer.write_state(state)
+        if replication_key:
+            bookmarks.pop("boundary", None)
+
+    if replication_key:
+        save_boundary(state, plan, boundary_value, boundary_ids)
+    bookmarks["file_ids"] = None
+    singer.write_state(state)
+    return counter
+
 
-    state["bookmarks"][stream["tap_stream_id"]]["file_ids"] = None
+def finish_row_index(state: Dict, plan: StreamPlan, counter, full_export: bool):
+    """Ends the row index run of a synced export.
+
+    After a full export the Ids it didn't contain are removed from the
+    index, and emitted as deleted records if `emit_deletions` is set.
+    """
+    if not plan.row_index or (run := state["bookmarks"][plan.tap_stream_id].pop("row_index_run", None)) is None:
+        return counter
+    if full_export:
+        if plan.config.get("emit_deletions") == "true":
+            for record_id in plan.row_index.missing_ids(run):
+                write_record(plan, {"Id": record_id, "Deleted": True})
+                counter.increment()
+            if plan.sink:
+                plan.sink.finish_file()
+        plan.row_index.forget_missing(run)
     singer.write_state(state)
     return counter
 
 
-def handle_aqua_timeout(ex: apis.ExportTimedOut, stream: Dict, state: Dict):
-    if not stream.get("replication_key"):
+def handle_aqua_timeout(ex: apis.ExportTimedOut, plan: StreamPlan, state: Dict):
+    if not plan.replication_key:
         return
     LOGGER.info("Export timed out, reducing query window and writing state.")
-    window_bookmark = state["bookmarks"][stream["tap_stream_id"]].get("current_window_end")
+    window_bookmark = state["bookmarks"][plan.tap_stream_id].get("current_window_end")
     previous_window_end = pendulum.parse(window_bookmark) if window_bookmark else pendulum.utcnow()
-    window_start = pendulum.parse(state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]])
+    window_start = pendulum.parse(state["bookmarks"][plan.tap_stream_id][plan.replication_key])
     if previous_window_end == window_start:
         raise apis.ExportFailed(
             f"Export too large for smallest possible query window. Cannot subdivide any further."
-            f' ({stream["replication_key"]}: {window_start})'
+            f" ({plan.replication_key}: {window_start})"
         ) from ex
 
     half_day_range = (previous_window_end - window_start) // 2
     current_window_end = previous_window_end - half_day_range
-    state["bookmarks"][stream["tap_stream_id"]]["current_window_end"] = current_window_end.strftime(
-        "%Y-%m-%dT%H:%M:%SZ"
-    )
+    state["bookmarks"][plan.tap_stream_id]["current_window_end"] = current_window_end.strftime("%Y-%m-%dT%H:%M:%SZ")
     singer.write_state(state)
 
 
-def sync_aqua_stream(client: Client, state: Dict, stream: Dict, counter):
+def sync_aqua_stream(client: Client, state: Dict, plan: StreamPlan, counter):
     """Performs sync for AQUA mode."""
     try:
-        file_ids = state["bookmarks"][stream["tap_stream_id"]].get("file_ids")
+        file_ids = state["bookmarks"][plan.tap_stream_id].get("file_ids")
         if not file_ids:
-            job_id = apis.Aqua.create_job(client, state, stream)
-            file_ids = poll_job_until_done(job_id, client, apis.Aqua)
-            state["bookmarks"][stream["tap_stream_id"]]["file_ids"] = file_ids
-            singer.write_state(state)
-
-        if window_end := state["bookmarks"][stream["tap_stream_id"]].pop("current_window_end", None):
+            bookmark = state["bookmarks"][plan.tap_stream_id].get(plan.replication_key)
+            fingerprint = job_fingerprint(plan, state["bookmarks"][plan.tap_stream_id].get("version"), bookmark)
+            job_id = submit_job(
+                client, state, plan, apis.Aqua, fingerprint, lambda: apis.Aqua.create_job(client, state, plan)
+            )
+            history.current().job_submitted(job_id, bookmark)
+            file_ids = poll_job_until_done(job_id, client, apis.Aqua, recorded=True)
+            save_file_ids(state, plan, file_ids)
+
+        if window_end := state["bookmarks"][plan.tap_stream_id].pop("current_window_end", None):
             # Save the window_end as the latest bookmark in case the window was empty
-            state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]] = window_end
-        return sync_file_ids(file_ids, client, state, stream, apis.Aqua, counter)
+            state["bookmarks"][plan.tap_stream_id][plan.replication_key] = window_end
+        counter = sync_file_ids(file_ids, client, state, plan, apis.Aqua, counter)
+        # Stateful AQuA exports of FULL_TABLE streams can be incremental, so they can't reveal deletions
+        return finish_row_index(state, plan, counter, full_export=False)
     except apis.ExportTimedOut as ex:
-        handle_aqua_timeout(ex, stream, state)
+        state["bookmarks"][plan.tap_stream_id].pop("job", None)
+        handle_aqua_timeout(ex, plan, state)
         timed_out = True
 
     if timed_out:
         LOGGER.info("Retrying timed out sync job...")
-        return sync_aqua_stream(client, state, stream, counter)
+        return sync_aqua_stream(client, state, plan, counter)
 
 
-def handle_rest_timeout(ex, stream: Dict, state: Dict, current_window: int, start_pen: str) -> int:
-    if stream.get("replication_key"):
+def handle_rest_timeout(ex, plan: StreamPlan, state: Dict, current_window: int, start_pen: str) -> int:
+    if plan.replication_key:
         LOGGER.info("Export timed out, reducing query window and writing state.")
         new_window = current_window // 2
         if new_window == 0:
             raise apis.ExportFailed(
                 f"Export too large for smallest possible query window. Cannot subdivide any further."
-                f' ({stream["replication_key"]}: {start_pen})'
+                f" ({plan.replication_key}: {start_pen})"
             ) from ex
 
-        state["bookmarks"][stream["tap_stream_id"]]["window_length"] = new_window
+        state["bookmarks"][plan.tap_stream_id]["window_length"] = new_window
         singer.write_state(state)
         return new_window
     # NB: Pylint caught this, since no return existed. Returning `None` to not change
@@ -201,11 +505,12 @@ def handle_rest_timeout(ex, stream: Dict, state: Dict, current_window: int, star
 def iterate_rest_query_window(
     client: Client,
     state: Dict,
-    stream: Dict,
+    plan: StreamPlan,
     counter,
     start_pen,
     sync_started,
     window_length: int,
+    api=apis.Rest,
 ):
     try:
         timed_out = False
@@ -216,58 +521,286 @@ def iterate_rest_query_window(
 
             start_date = start_pen.strftime("%Y-%m-%d %H:%M:%S")
             end_date = end_pen.strftime("%Y-%m-%d %H:%M:%S")
-            job_id = apis.Rest.create_job(client, stream, start_date, end_date)
-            file_ids = poll_job_until_done(job_id, client, apis.Rest)
-            LOGGER.info(f"file_ids for stream {stream['tap_stream_id']} are {file_ids}")
-            counter = sync_file_ids(file_ids, client, state, stream, apis.Rest, counter)
+            if window_end := recorded_window_end(state, plan, start_date, sync_started):
+                LOGGER.info(f"Ending the window at {window_end}, like the export job of the interrupted sync")
+                end_date, end_pen = window_end, pendulum.parse(window_end)
+            job_id = submit_job(
+                client,
+                state,
+                plan,
+                api,
+                job_fingerprint(plan, start_date, end_date),
+                lambda: api.create_job(client, plan, start_date, end_date),
+                end_date,
+            )
+            history.current().job_submitted(job_id, start_date, end_date)
+            file_ids = poll_job_until_done(job_id, client, api, recorded=True)
+            LOGGER.info(f"file_ids for stream {plan.tap_stream_id} are {file_ids}")
+            save_file_ids(state, plan, file_ids, end_date)
+            counter = sync_file_ids(file_ids, client, state, plan, api, counter)
             start_pen = end_pen
             window_length = MAX_EXPORT_DAYS * 86400
-            state["bookmarks"][stream["tap_stream_id"]].pop("window_length", None)
-            state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]] = end_date
+            state["bookmarks"][plan.tap_stream_id].pop("window_length", None)
+            # Window ends are exclusive, nothing at end_date has been emitted yet
+            state["bookmarks"][plan.tap_stream_id].pop("boundary", None)
+            state["bookmarks"][plan.tap_stream_id][plan.replication_key] = end_date
             singer.write_state(state)
     except apis.ExportTimedOut as ex:
-        window_length = handle_rest_timeout(ex, stream, state, window_length, start_pen)
+        state["bookmarks"][plan.tap_stream_id].pop("job", None)
+        window_length = handle_rest_timeout(ex, plan, state, window_length, start_pen)
         timed_out = True
 
     if timed_out:
         LOGGER.info("Retrying timed out sync job...")
-        return iterate_rest_query_window(client, state, stream, counter, start_pen, sync_started, window_length)
+        return iterate_rest_query_window(client, state, plan, counter, start_pen, sync_started, window_length, api)
     return counter
 
 
-def sync_rest_stream(client: Client, state: Dict, stream: Dict, counter):
-    if file_ids := state["bookmarks"][stream["tap_stream_id"]].get("file_ids"):
-        counter = sync_file_ids(file_ids, client, state, stream, apis.Rest, counter)
+def sample_ids(client: Client, state: Dict, plan: StreamPlan, id_range=(None, None)) -> List[str]:
+    """Exports only the Ids of a stream, or of an Id range of it, returning
+    a uniform sample of them."""
+    query = f"select Id from {plan.tap_stream_id}"
+    if predicates := apis.Rest.id_predicates(id_range):
+        query += " where " + " and ".join(predicates)
+    fingerprint = job_fingerprint(plan, "Id sample", *id_range)
+    job_id = submit_job(client, state, plan, apis.Rest, fingerprint, lambda: apis.Rest.submit_query(client, query))
+    history.current().job_submitted(job_id)
+    file_ids = poll_job_until_done(job_id, client, apis.Rest, recorded=True)
+    state["bookmarks"][plan.tap_stream_id].pop("job", None)
+
+    def ids() -> Iterator[str]:
+        for file_id in file_ids:
+            lines = apis.Rest.stream_file(client, file_id)
+            next(lines, None)
+            for line in lines:
+                if line:
+                    yield parse_csv_line(line)[0]
+
+    return sample(ids())
+
+
+def cancel_unfinished(client: Client, futures: Dict):
+    """Cancels the jobs of the Id ranges still exporting, keeping the files
+    of the ones that finished."""
+    for future, id_range in futures.items():
+        if not (job := id_range.pop("job", None)):
+            continue
+        if not future.done():
+            jobs.cancel(client, job["id"])
+        elif future.exception() is None:
+            id_range["file_ids"] = future.result()
+
+
+def export_partitions(client: Client, state: Dict, plan: StreamPlan, ranges: List[Dict]) -> Optional[Dict]:
+    """Exports the Id ranges without files concurrently, keeping the job
+    and then the files of each range in the state.
+
+    The jobs of an interrupted sync are re-attached to. Once a range
+    fails, the jobs of the unfinished ones are cancelled, and the range
+    is returned if it timed out or its error raised.
+    """
+    pending = [id_range for id_range in ranges if id_range.get("file_ids") is None]
+    for id_range in pending:
+        bounds = (id_range["lower"], id_range["upper"])
+        fingerprint = job_fingerprint(plan, *bounds)
+        if not ((job := id_range.pop("job", None)) and reattachable(client, job, apis.Rest, fingerprint)):
+            job = new_job(apis.Rest.create_job(client, plan, id_range=bounds), fingerprint)
+        id_range["job"] = job
+        history.current().partition_job_submitted(job["id"], *bounds)
+        singer.write_state(state)
+
+    stopped = threading.Event()
+    executor = ThreadPoolExecutor(max(len(pending), 1), thread_name_prefix="partition")
+    futures = {
+        history.submit(executor, poll_job_until_done, id_range["job"]["id"], client, apis.Rest, True, stopped): id_range
+        for id_range in pending
+    }
+    try:
+        for future in as_completed(futures):
+            id_range = futures[future]
+            try:
+                id_range["file_ids"] = future.result()
+            except apis.ExportTimedOut:
+                cancel_unfinished(client, futures)
+                return id_range
+            except Exception:
+                # On shutdown the jobs are kept to be re-attached to
+                if not jobs.STOP.is_set():
+                    cancel_unfinished(client, futures)
+                raise
+            submitted_at = pendulum.parse(id_range.pop("job")["submitted_at"])
+            id_range["seconds"] = round((pendulum.utcnow() - submitted_at).total_seconds())
+            singer.write_state(state)
+    finally:
+        # Threads still waiting give up at their next poll
+        stopped.set()
+        executor.shutdown(wait=False)
+        singer.write_state(state)
+    return None
+
+
+def sync_partitioned_full_table(client: Client, state: Dict, plan: StreamPlan, counter, partitions: int):
+    """Exports a FULL_TABLE stream in concurrent Id ranges.
+
+    The ranges are kept in the bookmark for the next syncs, and only
+    sampled again when `partitions` grows or they have drifted apart,
+    see `DRIFT_RATIO`. A range whose export times out is split in two,
+    and only the ranges without files are exported again.
+    """
+    bookmarks = state["bookmarks"][plan.tap_stream_id]
+    if not bookmarks.get("id_ranges") or bookmarks.get("partitions", 0) < partitions:
+        partitions = max(partitions, bookmarks.get("partitions", 0))
+        bounds = split_range(sample_ids(client, state, plan), (None, None), partitions)
+        bookmarks["id_ranges"] = [{"lower": lower, "upper": upper} for lower, upper in bounds]
+        bookmarks["partitions"] = partitions
+        singer.write_state(state)
+    ranges = bookmarks["id_ranges"]
+
+    LOGGER.info(f"Exporting {plan.tap_stream_id} in {len(ranges)} Id ranges")
+    while timed_out := export_partitions(client, state, plan, ranges):
+        bounds = (timed_out["lower"], timed_out["upper"])
+        split = split_range(sample_ids(client, state, plan, bounds), bounds, 2) if len(ranges) < MAX_PARTITIONS else []
+        if len(split) < 2:
+            raise apis.ExportFailed(f"Export of Id range {bounds} timed out and cannot be subdivided any further.")
+        LOGGER.info(f"Export of Id range {bounds} timed out, splitting it in two and writing state.")
+        position = ranges.index(timed_out)
+        ranges[position : position + 1] = [{"lower": lower, "upper": upper} for lower, upper in split]
+        bookmarks["partitions"] = len(ranges)
+        singer.write_state(state)
+
+    file_ids = [file_id for id_range in ranges for file_id in id_range.pop("file_ids")]
+    seconds = [id_range.pop("seconds", 0) for id_range in ranges]
+    if len(seconds) > 1 and max(seconds) > DRIFT_RATIO * max(statistics.median_low(seconds), 1):
+        LOGGER.info(f"Id ranges of {plan.tap_stream_id} have drifted apart, sampling new ones on the next sync")
+        bookmarks.pop("id_ranges")
+    save_file_ids(state, plan, file_ids)
+    return sync_file_ids(file_ids, client, state, plan, apis.Rest, counter)
+
 
-    if stream.get("replication_key"):
-        bookmark_window_length = state["bookmarks"][stream["tap_stream_id"]].pop("window_length", None)
+def sync_rest_stream(client: Client, state: Dict, plan: StreamPlan, counter, api=apis.Rest):
+    """Performs sync for REST mode, or with `api` another backend taking
+    the same `create_job` arguments such as `apis.DataQuery`."""
+    if file_ids := state["bookmarks"][plan.tap_stream_id].get("file_ids"):
+        counter = sync_file_ids(file_ids, client, state, plan, api, counter)
+
+    if plan.replication_key:
+        bookmark_window_length = state["bookmarks"][plan.tap_stream_id].pop("window_length", None)
         window_length_in_seconds = bookmark_window_length or MAX_EXPORT_DAYS * 86400
         sync_started = pendulum.utcnow()
-        start_date = state["bookmarks"][stream["tap_stream_id"]][stream["replication_key"]]
+        start_date = state["bookmarks"][plan.tap_stream_id][plan.replication_key]
         start_pen = pendulum.parse(start_date)
         counter = iterate_rest_query_window(
             client,
             state,
-            stream,
+            plan,
             counter,
             start_pen,
             sync_started,
             window_length_in_seconds,
+            api,
         )
+    elif api is apis.Rest and (partitions := int(plan.config.get("full_table_partitions", 0))):
+        counter = sync_partitioned_full_table(client, state, plan, counter, partitions)
+        counter = finish_row_index(state, plan, counter, full_export=True)
     else:
-        job_id = apis.Rest.create_job(client, stream)
-        file_ids = poll_job_until_done(job_id, client, apis.Rest)
-        counter = sync_file_ids(file_ids, client, state, stream, apis.Rest, counter)
+        job_id = submit_job(client, state, plan, api, job_fingerprint(plan), lambda: api.create_job(client, plan))
+        history.current().job_submitted(job_id)
+        file_ids = poll_job_until_done(job_id, client, api, recorded=True)
+        save_file_ids(state, plan, file_ids)
+        counter = sync_file_ids(file_ids, client, state, plan, api, counter)
+        counter = finish_row_index(state, plan, counter, full_export=True)
+
+    return counter
+
 
+def replay_stream(cache: ReplayCache, state: Dict, plan: StreamPlan, counter):
+    """Re-emits the records of the cached exports following the stream's
+    bookmark, updating the state the same way the sync that downloaded
+    them did.
+
+    The bookmark can be anywhere in the first export's window: its
+    records before the bookmark, or at it and already emitted, are
+    skipped like in a resumed sync.
+    """
+    bookmarks = state["bookmarks"][plan.tap_stream_id]
+    bookmarks.pop("job", None)
+    if file_ids := bookmarks.get("file_ids"):
+        counter = sync_file_ids(file_ids, None, state, plan, cache, counter)
+
+    window_start = bookmarks.get(plan.replication_key)
+    if not (export := cache.find(plan.tap_stream_id, plan.select_query, window_start)):
+        if file_ids:
+            return counter
+        raise Exception(f"No cached export of {plan.tap_stream_id} containing {window_start} to replay")
+
+    while export:
+        LOGGER.info(f"Replaying cached export {export.key} of {plan.tap_stream_id} from {window_start}")
+        save_file_ids(state, plan, export.file_ids)
+        counter = sync_file_ids(export.file_ids, None, state, plan, cache, counter)
+        if not export.window_end:
+            break
+        # Ends a REST window like iterate_rest_query_window
+        bookmarks.pop("boundary", None)
+        bookmarks[plan.replication_key] = window_start = export.window_end
+        singer.write_state(state)
+        export = cache.find(plan.tap_stream_id, plan.select_query, window_start)
     return counter
 
 
-def sync_stream(client: Client, state: Dict, stream: Dict):
-    """Starts the process for syncing the data for a given stream."""
-    with singer.metrics.record_counter(stream["tap_stream_id"]) as counter:
-        if client.is_rest:
-            counter = sync_rest_stream(client, state, stream, counter)
-        else:
-            counter = sync_aqua_stream(client, state, stream, counter)
+def sync_stream(
+    client: Optional[Client],
+    state: Dict,
+    stream: Dict,
+    config: Optional[Dict] = None,
+    sink: Optional[ParquetSink] = None,
+    replay: Optional[ReplayCache] = None,
+    plans: Optional[Dict[str, StreamPlan]] = None,
+):
+    """Starts the process for syncing the data for a given stream.
+
+    With a `sink`, the records are written to its Parquet files instead
+    of being emitted. With `replay`, they are re-emitted from the replay
+    cache without a client. With `plans`, the plan of the stream is kept
+    there and reused by later syncs.
+    """
+    plan = plans.get(stream["tap_stream_id"]) if plans is not None else None
+    if plan is None:
+        plan = StreamPlan(stream, config)
+        if plans is not None:
+            plans[plan.tap_stream_id] = plan
+    plan.sink = sink.open_stream(plan.tap_stream_id, plan.schema) if sink else None
+    plan.replay_cache = ReplayCache.from_config(plan.config) if replay is None else None
+    # A replay re-emits rows the index has already seen
+    plan.row_index = (
+        RowHashIndex.from_config(plan.config, plan.tap_stream_id)
+        if replay is None and not plan.replication_key
+        else None
+    )
+    if plan.replication_key:
+        bookmarks = state["bookmarks"][plan.tap_stream_id]
+        history.current().progress.track_coverage(
+            bookmarks[plan.replication_key], singer.utils.strftime(singer.utils.now()), bookmarks, plan.replication_key
+        )
+    try:
+        with singer.metrics.record_counter(plan.tap_stream_id) as counter:
+            if replay:
+                counter = replay_stream(replay, state, plan, counter)
+            elif client.is_data_query:
+                counter = sync_rest_stream(client, state, plan, counter, apis.DataQuery)
+            elif client.is_rest:
+                counter = sync_rest_stream(client, state, plan, counter)
+            else:
+                counter = sync_aqua_stream(client, state, plan, counter)
+    finally:
+        if plan.row_index:
+            plan.row_index.close()
+        if plan.replay_cache:
+            plan.replay_cache.close()
+        if plan.parse_pool:
+            plan.parse_pool.shutdown(wait=True)
+            plan.parse_pool = None
+        if plan.sink:
+            # Discards the rows of a file the sync failed part way through
+            plan.sink.abort()
 
     return counter
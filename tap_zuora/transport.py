@@ -0,0 +1,53 @@
+import threading
+from typing import List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+MAX_CONNECT_RETRIES = 5  # Try again in the case the TCP socket closes
+
+
+class Transport:
+    """Pooled HTTP transport that is safe to share between threads.
+
+    requests.Session objects are not guaranteed to be thread-safe, so
+    each thread lazily gets its own session. All of those sessions are
+    mounted on one HTTPAdapter, so the underlying urllib3 connection
+    pool (and its kept-alive TLS connections) is shared by every thread.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = MAX_CONNECT_RETRIES):
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=max_retries,
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions: List[requests.Session] = []
+
+    @property
+    def session(self) -> requests.Session:
+        """Returns the session owned by the calling thread."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def request(self, method: str, url: str, stream: bool = False, **kwargs) -> requests.Response:
+        """Sends the request through the calling thread's session so session
+        level defaults (keep-alive, Accept-Encoding, pooling) apply."""
+        return self.session.request(method, url, stream=stream, **kwargs)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._adapter.close()
@@ -1,7 +1,21 @@
-from typing import Dict, Optional
+import itertools
+import re
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, Optional
 
+GZIP_MAGIC = b"\x1f\x8b"
+LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+CR = ord("\r")
 
-def make_aqua_payload(project: str, query: str, partner_id: str, deleted: Optional[bool] = False) -> Dict:
+
+def make_aqua_payload(
+    project: str,
+    query: str,
+    partner_id: str,
+    deleted: Optional[bool] = False,
+    compression: Optional[str] = None,
+) -> Dict:
     # NB - 4/5/19 - Were told by zuora support to use the same value
     # for both project and name to imply an incremental export
     rtn = {
@@ -25,4 +39,157 @@ def make_aqua_payload(project: str, query: str, partner_id: str, deleted: Option
     if deleted:
         rtn["queries"][0]["deleted"] = {"column": "Deleted", "format": "Boolean"}
 
+    if compression:
+        rtn["compression"] = compression
+
     return rtn
+
+
+def decompress_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Yields the chunks of a downloaded file, inflating them incrementally
+    if the file is gzip compressed.
+
+    Transfer-level `Content-Encoding: gzip` is already decoded by
+    requests, this handles export files which are themselves gzipped.
+    """
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= len(GZIP_MAGIC):
+            break
+
+    if not head.startswith(GZIP_MAGIC):
+        if head:
+            yield head
+        yield from chunks
+        return
+
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    pending = head
+    while True:
+        data = decompressor.decompress(pending)
+        if data:
+            yield data
+        if decompressor.eof and decompressor.unused_data:
+            # Concatenated gzip members, start over on the next one
+            pending = decompressor.unused_data
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            continue
+        pending = next(chunks, None)
+        if pending is None:
+            break
+
+    if tail := decompressor.flush():
+        yield tail
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Splits a stream of byte chunks into lines, the same way
+    `requests.Response.iter_lines` does."""
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+
+        lines = chunk.splitlines()
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+
+        yield from lines
+
+    if pending is not None:
+        yield pending
+
+
+class ReadStats:
+    """Counts the reads of a download and the bytes they returned."""
+
+    __slots__ = ("reads", "bytes", "started")
+
+    def __init__(self):
+        self.reads = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    def bytes_per_second(self) -> float:
+        return self.bytes / max(time.monotonic() - self.started, 1e-6)
+
+
+def readinto_chunks(raw, view: memoryview, stats: ReadStats) -> Iterator[memoryview]:
+    """Yields views of `view` filled by successive reads. Each one is only
+    valid until the next is requested."""
+    while size := raw.readinto(view):
+        stats.reads += 1
+        stats.bytes += size
+        yield view[:size]
+
+
+def hold_trailing_cr(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Moves a chunk's trailing \\r to the next chunk, so a \\r\\n split
+    across chunks isn't read as two line breaks."""
+    carry = b""
+    for chunk in chunks:
+        chunk = carry + chunk
+        carry = b""
+        if chunk.endswith(b"\r"):
+            chunk, carry = chunk[:-1], b"\r"
+        if chunk:
+            yield chunk
+    if carry:
+        yield carry
+
+
+def read_lines(raw, buffer_size: int, stats: Optional[ReadStats] = None) -> Iterator[bytes]:
+    """Splits a response body into lines like `bytes.splitlines`, reading
+    it with `readinto` into a single reusable buffer.
+
+    Lines are sliced straight out of the buffer, so the only copy of the
+    data is the bytes of each line. A line longer than the buffer grows
+    it. `raw` is read undecoded, gzip bodies (whether gzipped files or
+    `Content-Encoding: gzip`) are recognized by their magic bytes.
+    """
+    stats = stats or ReadStats()
+    buffer = bytearray(max(buffer_size, len(GZIP_MAGIC)))
+    view = memoryview(buffer)
+    end, eof = 0, False
+    while end < len(GZIP_MAGIC):
+        if not (size := raw.readinto(view[end:])):
+            eof = True
+            break
+        stats.reads += 1
+        stats.bytes += size
+        end += size
+
+    if end >= len(GZIP_MAGIC) and bytes(view[: len(GZIP_MAGIC)]) == GZIP_MAGIC:
+        chunks = itertools.chain([bytes(view[:end])], readinto_chunks(raw, view, stats))
+        yield from iter_lines(hold_trailing_cr(decompress_chunks(chunks)))
+        return
+
+    start = 0
+    while True:
+        for match in LINE_BREAK.finditer(buffer, start, end):
+            if match.end() == end and buffer[end - 1] == CR and not eof:
+                # Might be the first half of a \r\n split across reads
+                break
+            yield bytes(view[start : match.start()])
+            start = match.end()
+
+        if eof:
+            if start < end:
+                yield bytes(view[start:end])
+            return
+
+        remainder = end - start
+        if remainder == len(buffer):
+            buffer = buffer + bytearray(len(buffer))
+            view = memoryview(buffer)
+        else:
+            view[:remainder] = view[start:end]
+        size = raw.readinto(view[remainder:])
+        if size:
+            stats.reads += 1
+            stats.bytes += size
+        start, end, eof = 0, remainder + size, not size
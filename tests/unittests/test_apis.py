@@ -1,12 +1,17 @@
 import json
 import pathlib
 import unittest
+from unittest import mock
 
-from tap_zuora.apis import Aqua, Rest
+from tap_zuora.apis import Aqua, DataQuery, ExportApi, ExportFailed, Rest
+from tap_zuora.plan import StreamPlan
+
+from utils import LocalExportApi, get_response
 
 p = pathlib.Path(__file__).with_name("sample_stream_metadata.json")
 with p.open("r") as f:
     STREAM_METADATA = json.load(f)
+STREAM_PLAN = StreamPlan(STREAM_METADATA)
 
 
 class TestAquaApis(unittest.TestCase):
@@ -14,7 +19,7 @@ class TestAquaApis(unittest.TestCase):
         """Test to ensure we get correct SQL query based on stream metadata for
         AQuA calls."""
         self.assertEqual(
-            Aqua.get_query(STREAM_METADATA),
+            Aqua.get_query(STREAM_PLAN),
             "select Field1, UpdatedDate, Id from Stream1 order by UpdatedDate asc",
         )
 
@@ -41,7 +46,7 @@ class TestAquaApis(unittest.TestCase):
             "incrementalTime": "2022-09-30 17:00:00",
         }
         self.assertEqual(
-            Aqua.get_payload(state_file, STREAM_METADATA, "partner_id"),
+            Aqua.get_payload(state_file, STREAM_PLAN, "partner_id"),
             expected_payload,
         )
 
@@ -51,7 +56,7 @@ class TestRestApis(unittest.TestCase):
         """Test to ensure we get correct SQL query based on stream metadata for
         REST calls."""
         self.assertEqual(
-            Rest.get_query(STREAM_METADATA, "2022-10-01", "2022-10-17"),
+            Rest.get_query(STREAM_PLAN, "2022-10-01", "2022-10-17"),
             "select Field1, UpdatedDate, Id from Stream1 where "
             "UpdatedDate >= '2022-10-01T00:00:00Z' and UpdatedDate < '2022-10-17T00:00:00Z'",
         )
@@ -66,6 +71,99 @@ class TestRestApis(unittest.TestCase):
         }
 
         self.assertEqual(
-            Rest.get_payload(STREAM_METADATA, "2022-10-01", "2022-10-17"),
+            Rest.get_payload(STREAM_PLAN, "2022-10-01", "2022-10-17"),
             expected_payload,
         )
+
+    def test_stream_file_progress(self):
+        """Test that the downloaded chunks are passed through the given progress callback."""
+        client = mock.Mock(download_buffer_size=None)
+        resp = client.rest_request.return_value
+        resp.iter_content.return_value = iter([b"Id\n1", b"\n2\n"])
+        tracked = []
+
+        def progress(file_id, progress_resp, chunks):
+            for chunk in chunks:
+                tracked.append((file_id, progress_resp, chunk))
+                yield chunk
+
+        self.assertEqual(list(Rest.stream_file(client, "file-1", progress)), [b"Id", b"1", b"2"])
+        self.assertEqual(tracked, [("file-1", resp, b"Id\n1"), ("file-1", resp, b"\n2\n")])
+
+
+class TestDataQueryApis(unittest.TestCase):
+    def test_get_query(self):
+        """Test that columns are aliased to field names and windows filter on timestamps."""
+        self.assertEqual(
+            DataQuery.get_query(STREAM_PLAN, "2022-10-01", "2022-10-17"),
+            'select field1 as "Field1", updateddate as "UpdatedDate", id as "Id" from stream1 where '
+            "updateddate >= timestamp '2022-10-01 00:00:00' and updateddate < timestamp '2022-10-17 00:00:00'",
+        )
+
+    def test_server_side_filter(self):
+        plan = StreamPlan(STREAM_METADATA, {"data_query_filters": {"Stream1": "field1 <> 'x' or field1 is null"}})
+        self.assertEqual(
+            DataQuery.get_query(plan, None, None),
+            'select field1 as "Field1", updateddate as "UpdatedDate", id as "Id" from stream1'
+            " where (field1 <> 'x' or field1 is null)",
+        )
+
+    def test_create_job(self):
+        """Test that a job is submitted with the query of the window and returns its id."""
+        client = mock.Mock()
+        client.rest_request.return_value = get_response(200, {"data": {"id": "job-1"}})
+        self.assertEqual(DataQuery.create_job(client, STREAM_PLAN, "2022-10-01", "2022-10-17"), "job-1")
+        client.rest_request.assert_called_once_with(
+            "POST",
+            "query/jobs",
+            json={
+                "query": DataQuery.get_query(STREAM_PLAN, "2022-10-01", "2022-10-17"),
+                "outputFormat": "CSV",
+                "compression": "GZIP",
+                "output": {"target": "S3"},
+                "columnSeparator": ",",
+                "readDeleted": False,
+            },
+        )
+
+    def test_job_ready(self):
+        client = mock.Mock()
+        for status, ready in [("accepted", False), ("in_progress", False), ("completed", True)]:
+            client.rest_request.return_value = get_response(200, {"data": {"queryStatus": status}})
+            self.assertEqual(DataQuery.job_ready(client, "job-1"), ready)
+        client.rest_request.return_value = get_response(200, {"data": {"queryStatus": "failed", "errorMessage": "x"}})
+        with self.assertRaises(ExportFailed):
+            DataQuery.job_ready(client, "job-1")
+
+    @mock.patch("tap_zuora.apis.read_file", return_value=iter([b"Id", b"1"]))
+    def test_stream_file(self, mock_read_file):
+        """Test that results are downloaded from the pre-signed url of the job without credentials."""
+        client = mock.Mock()
+        client.rest_request.return_value = get_response(200, {"data": {"dataFile": "https://s3/results.csv.gz?sig"}})
+        self.assertEqual(list(DataQuery.stream_file(client, "job-1")), [b"Id", b"1"])
+        client.rest_request.assert_called_once_with("GET", "query/jobs/job-1")
+        client.download_request.assert_called_once_with(
+            "https://s3/results.csv.gz?sig", headers=client.download_headers
+        )
+
+    def test_backends_follow_protocol(self):
+        for api in [Aqua, Rest, DataQuery, LocalExportApi(lambda query: [])]:
+            self.assertIsInstance(api, ExportApi)
+
+
+class TestStreamPlan(unittest.TestCase):
+    def test_plan_fields(self):
+        """Test that the plan holds the selected columns and query of the
+        stream."""
+        self.assertEqual(STREAM_PLAN.selected_fields, ["Field1", "UpdatedDate", "Id"])
+        self.assertEqual(STREAM_PLAN.select_query, "select Field1, UpdatedDate, Id from Stream1")
+        self.assertEqual(STREAM_PLAN.replication_key, "UpdatedDate")
+        self.assertFalse(STREAM_PLAN.deleted)
+
+    def test_convert_headers(self):
+        """Test that export headers of the stream and its joined objects are
+        converted to field names."""
+        self.assertEqual(
+            STREAM_PLAN.convert_headers(["Stream1.Id", "Account.Id", "Stream1.UpdatedDate"]),
+            ["Id", "AccountId", "UpdatedDate"],
+        )
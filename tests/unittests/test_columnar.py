@@ -0,0 +1,88 @@
+import unittest
+
+from singer.transform import SchemaMismatch
+
+from tap_zuora import columnar, sync
+from tap_zuora.plan import StreamPlan
+
+STREAM = {
+    "tap_stream_id": "Invoice",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "Id": {"type": ["string", "null"]},
+            "Amount": {"type": ["number", "null"]},
+            "Quantity": {"type": ["integer", "null"]},
+            "Posted": {"type": ["boolean", "null"]},
+            "UpdatedDate": {"type": ["string", "null"], "format": "date-time"},
+            "Deleted": {"type": "boolean"},
+        },
+    },
+    "metadata": [],
+}
+
+HEADER = ["Id", "Amount", "Quantity", "Posted", "UpdatedDate", "Unknown", "Deleted"]
+
+LINES = [
+    b"1,12.5,3,true,2022-10-01T10:00:00.000-08:00,x,false",
+    b'2,"1,200.25","1,000",false,2022-10-02,y,true',
+    b"3,,,,,,",
+    b"4,1e3,-7,False,2022-10-02T00:00:00,z\0,false",
+    b"",
+    b'"5, with comma",0.1,0,TRUE,2022-10-03T12:30:45.123456Z,,false',
+]
+
+
+def read(config, lines=LINES):
+    return list(sync.read_records(iter(lines), HEADER, StreamPlan(STREAM, config)))
+
+
+@unittest.skipUnless(columnar.available(), "pyarrow is not installed")
+class TestColumnarEngine(unittest.TestCase):
+    def test_same_records_as_python_engine(self):
+        """Test that the arrow engine converts every type like singer.transform."""
+        expected = [record for _, record in read({})]
+        self.assertEqual([record for _, record in read({"csv_engine": "arrow"})], expected)
+
+    def test_same_records_across_batches(self):
+        """Test that columns arrow can't cast are converted per distinct value."""
+        lines = [
+            # Mixes timestamps with and without an offset and integers with spaces
+            b"%d,%d,%s,true,2022-10-01 00:00:%02d%s,,false"
+            % (i, i, b" 5" if i % 7 else b"5", i % 60, b"Z" if i % 2 else b"")
+            for i in range(200)
+        ]
+        expected = [record for _, record in read({}, lines)]
+        records = [record for _, record in columnar.read_records(iter(lines), HEADER, STREAM["schema"], block_size=512)]
+        self.assertEqual(records, expected)
+
+    def test_schema_mismatch(self):
+        """Test that values singer.transform rejects fail the same way."""
+        with self.assertRaises(SchemaMismatch):
+            read({"csv_engine": "arrow"}, [b"1,1,x,,,,false"])
+
+    def test_non_rectangular_row(self):
+        """Test that a row not matching the header yields a None record."""
+        rows = read({"csv_engine": "arrow"}, [LINES[0], b"1,2"])
+        self.assertIsNone(rows[-1][1])
+        self.assertEqual(len(rows[-1][0]), 2)
+
+    def test_rows_before_non_rectangular_row(self):
+        """Test that the rows of a block before a row not matching the header are yielded like the Python engine."""
+        lines = [b"%d,1,1,true,2022-10-01,,false" % i for i in range(300)]
+        lines[250] = b"250,1,1"
+        expected = read({}, lines)
+        rows = list(columnar.read_records(iter(lines), HEADER, STREAM["schema"], block_size=4096))
+        self.assertEqual(len(rows), 251)
+        self.assertEqual([record for _, record in rows], [record for _, record in expected[:251]])
+        self.assertEqual(rows[-1][0], ["250", "1", "1"])
+
+    def test_quoted_line_breaks(self):
+        """Test that a quoted value spanning lines is one value, like with `parse_processes`."""
+        lines = [b'"multi', b'line",1,1,true,2022-10-01,,false', LINES[0]]
+        records = [record for _, record in read({"csv_engine": "arrow"}, lines)]
+        self.assertEqual(records, [record for _, record in sync.transform_chunk(lines, HEADER, STREAM["schema"])])
+        self.assertEqual(records[0]["Id"], "multi\nline")
+
+    def test_empty_file(self):
+        self.assertEqual(read({"csv_engine": "arrow"}, []), [])
@@ -0,0 +1,88 @@
+import unittest
+from unittest import mock
+
+from singer import transform
+from singer.transform import SchemaMismatch
+
+from tap_zuora import convert, sync
+from tap_zuora.convert import RecordConverter
+from tap_zuora.plan import StreamPlan
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Id": {"type": ["string", "null"]},
+        "Currency": {"type": ["string", "null"]},
+        "Amount": {"type": ["number", "null"]},
+        "Quantity": {"type": ["integer", "null"]},
+        "Posted": {"type": ["boolean", "null"]},
+        "UpdatedDate": {"type": ["string", "null"], "format": "date-time"},
+    },
+}
+
+HEADER = ["Id", "Currency", "Amount", "Quantity", "Posted", "UpdatedDate", "Unknown"]
+
+
+def make_rows(count):
+    return [
+        [
+            str(i),
+            ["USD", "EUR"][i % 2],
+            "1,000.5",
+            str(i % 3) if i % 5 else "",
+            "False",
+            "2022-10-01T00:00:00-08:00",
+            "x",
+        ]
+        for i in range(count)
+    ]
+
+
+class TestRecordConverter(unittest.TestCase):
+    def test_same_records_as_transform(self):
+        """Test that cached conversion matches singer.transform."""
+        converter = RecordConverter(HEADER, SCHEMA)
+        for row in make_rows(50):
+            self.assertEqual(converter.convert(row), transform(dict(zip(HEADER, row)), SCHEMA))
+
+    def test_repeated_values_shared(self):
+        """Test that a repeated cell is converted once and its value reused."""
+        converter = RecordConverter(HEADER, SCHEMA)
+        first, second = [converter.convert(row) for row in make_rows(4)[::2]]
+        self.assertIs(first["Currency"], second["Currency"])
+        columns = {column.name: column for _, column in converter.columns}
+        self.assertEqual((columns["UpdatedDate"].hits, columns["UpdatedDate"].misses), (1, 1))
+
+    @mock.patch("tap_zuora.convert.SAMPLE_LOOKUPS", 10)
+    def test_distinct_column_stops_caching(self):
+        converter = RecordConverter(HEADER, SCHEMA)
+        for row in make_rows(20):
+            converter.convert(row)
+        columns = {column.name: column for _, column in converter.columns}
+        self.assertIsNone(columns["Id"].cache)
+        self.assertIsNotNone(columns["Currency"].cache)
+
+    def test_cache_bounded(self):
+        converter = RecordConverter(HEADER, SCHEMA, cache_size=2)
+        for row in make_rows(10):
+            converter.convert(row)
+        self.assertTrue(all(len(column.cache) <= 2 for _, column in converter.columns if column.cache is not None))
+
+    def test_schema_mismatch(self):
+        converter = RecordConverter(HEADER, SCHEMA)
+        with self.assertRaises(SchemaMismatch):
+            converter.convert(["1", "USD", "a lot", "", "", "", ""])
+
+    def test_non_rectangular_row(self):
+        self.assertIsNone(RecordConverter(HEADER, SCHEMA).convert(["1"]))
+
+    @mock.patch.object(convert.LOGGER, "info")
+    def test_read_records_logs_hit_rates(self, mock_info):
+        plan = StreamPlan(
+            {"tap_stream_id": "Invoice", "schema": SCHEMA, "metadata": []}, {"conversion_cache_size": "16"}
+        )
+        lines = [b"1,USD,1,1,true,,", b"2,USD,2,1,true,,"]
+        records = [record for _, record in sync.read_records(iter(lines), HEADER, plan)]
+        self.assertEqual(records, [transform(dict(zip(HEADER, sync.parse_csv_line(line))), SCHEMA) for line in lines])
+        metrics = [call[0][1] for call in mock_info.call_args_list if call[0][0] == "METRIC: %s"]
+        self.assertIn('"column": "Currency"', "".join(metrics))
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+from singer.catalog import Catalog
+
+from tap_zuora import daemon
+
+from utils import make_catalog_entry
+
+
+CATALOG = Catalog([make_catalog_entry("Invoice", "UpdatedDate"), make_catalog_entry("Product")])
+
+
+def synced_streams(mock_do_sync):
+    return [[stream.tap_stream_id for stream in call[0][1].streams] for call in mock_do_sync.call_args_list]
+
+
+@mock.patch("time.sleep")
+@mock.patch("tap_zuora.daemon.do_sync")
+class TestDaemon(unittest.TestCase):
+    config = {"daemon_interval": "60", "daemon_full_table_interval": "3600"}
+
+    def test_full_table_streams_synced_less_often(self, mock_do_sync, mock_sleep):
+        """Test that incremental streams are synced every cycle and FULL_TABLE ones once per interval."""
+        daemon.run(None, CATALOG, {"bookmarks": {}}, self.config, cycles=3)
+        self.assertEqual(synced_streams(mock_do_sync), [["Invoice", "Product"], ["Invoice"], ["Invoice"]])
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_plans_kept_between_cycles(self, mock_do_sync, mock_sleep):
+        daemon.run(None, CATALOG, {"bookmarks": {}}, self.config, cycles=2)
+        plans = [call[1]["plans"] for call in mock_do_sync.call_args_list]
+        self.assertIs(plans[0], plans[1])
+
+    def test_interrupted_stream_resumed(self, mock_do_sync, mock_sleep):
+        """Test that a FULL_TABLE stream with files left to sync is synced on the next cycle."""
+        state = {"bookmarks": {}}
+
+        def do_sync(client, catalog, state, config, plans):
+            if len(synced_streams(mock_do_sync)) == 1:
+                state["bookmarks"]["Product"] = {"file_ids": ["f1"]}
+                state["current_stream"] = "Product"
+                raise Exception("Target went away")
+            state["bookmarks"]["Product"] = {}
+            state["current_stream"] = None
+
+        mock_do_sync.side_effect = do_sync
+        daemon.run(None, CATALOG, state, self.config, cycles=3)
+        self.assertEqual(synced_streams(mock_do_sync), [["Invoice", "Product"], ["Invoice", "Product"], ["Invoice"]])
+
+    def test_gives_up_after_max_failures(self, mock_do_sync, mock_sleep):
+        mock_do_sync.side_effect = Exception("Zuora is down")
+        with self.assertRaises(Exception):
+            daemon.run(None, CATALOG, {"bookmarks": {}}, {**self.config, "daemon_max_failures": "2"})
+        self.assertEqual(mock_do_sync.call_count, 2)
@@ -3,6 +3,7 @@ import unittest
 from unittest import mock
 
 import requests
+from singer import metadata
 from utils import get_response
 
 from tap_zuora import discover
@@ -129,3 +130,64 @@ class TestDiscoveryMethods(unittest.TestCase):
         }
 
         self.assertEqual(discover.discover_stream(client_object, "Stream1"), expected_response)
+
+
+class TestTargetedDiscovery(unittest.TestCase):
+    @mock.patch("tap_zuora.discover.discover_stream_names")
+    def test_select_stream_names(self, mock_stream_names):
+        """Test that objects are filtered with the include and exclude
+        patterns."""
+        mock_stream_names.return_value = ["Account", "Invoice", "InvoiceItem", "JournalEntryDetailInvoiceItem"]
+        config = {"discover_include": ["Invoice*", "Account"], "discover_exclude": ["*Detail*"]}
+        self.assertEqual(discover.select_stream_names(None, config), ["Account", "Invoice", "InvoiceItem"])
+
+    @mock.patch("tap_zuora.discover.discover_stream_names")
+    def test_select_explicit_objects(self, mock_stream_names):
+        """Test that an explicit object list skips listing every object."""
+        self.assertEqual(discover.select_stream_names(None, {"discover_objects": ["Usage"]}), ["Usage"])
+        mock_stream_names.assert_not_called()
+
+    def test_merge_catalog(self):
+        """Test that existing streams and selections are preserved when
+        merging newly discovered streams."""
+
+        def make_stream(name, fields, selected=None):
+            mdata = [{"breadcrumb": [], "metadata": {"inclusion": "available"}}]
+            mdata += [{"breadcrumb": ["properties", f], "metadata": {"inclusion": "available"}} for f in fields]
+            for entry in mdata:
+                if selected and tuple(entry["breadcrumb"]) in selected:
+                    entry["metadata"]["selected"] = True
+            return {"tap_stream_id": name, "metadata": mdata}
+
+        catalog = {
+            "streams": [
+                make_stream("Account", ["Name"], selected={()}),
+                make_stream("Invoice", ["Amount", "Removed"], selected={(), ("properties", "Removed")}),
+            ]
+        }
+        discovered = [make_stream("Invoice", ["Amount", "Balance"]), make_stream("Usage", ["Quantity"])]
+        merged = discover.merge_catalog(catalog, discovered)
+
+        self.assertEqual([s["tap_stream_id"] for s in merged["streams"]], ["Account", "Invoice", "Usage"])
+        self.assertIs(merged["streams"][0], catalog["streams"][0])
+        invoice = metadata.to_map(merged["streams"][1]["metadata"])
+        self.assertTrue(invoice[()]["selected"])
+        self.assertNotIn(("properties", "Removed"), invoice)
+        self.assertIn(("properties", "Balance"), invoice)
+        self.assertNotIn("selected", metadata.to_map(merged["streams"][2]["metadata"])[()])
+
+    def test_merge_catalog_keeps_priority(self):
+        """Test that the priority of a rediscovered stream is kept."""
+        existing = {
+            "tap_stream_id": "Invoice",
+            "metadata": [{"breadcrumb": [], "metadata": {"inclusion": "available"}}],
+        }
+        existing["metadata"][0]["metadata"].update({"selected": True, "tap-zuora.priority": 10})
+        discovered = {
+            "tap_stream_id": "Invoice",
+            "metadata": [{"breadcrumb": [], "metadata": {"inclusion": "available"}}],
+        }
+
+        merged = discover.merge_catalog({"streams": [existing]}, [discovered])
+        invoice = metadata.to_map(merged["streams"][0]["metadata"])
+        self.assertEqual(invoice[()], {"inclusion": "available", "selected": True, "tap-zuora.priority": 10})
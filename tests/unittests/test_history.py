@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from singer.catalog import Catalog
+from utils import get_response, make_catalog_entry
+
+from tap_zuora import do_sync, history
+from tap_zuora.client import Client
+from tap_zuora.exceptions import RetryableException
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = history.HistoryStore.from_config({"history_dir": self.tmp_dir.name})
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_no_history_dir(self):
+        self.assertIsNone(history.HistoryStore.from_config({}))
+
+    def test_records_jobs_and_streams(self):
+        """Test that each export job and the stream summary are written to the
+        store."""
+        run_id = self.store.start_run()
+        with history.recording(self.store, run_id, "Account"):
+            recorder = history.current()
+            recorder.job_submitted("job-1", "2022-10-01 00:00:00", "2022-10-31 00:00:00")
+            recorder.job_ready()
+            recorder.download_started()
+            recorder.download_finished(1024, 10)
+            recorder.job_submitted("job-2", "2022-10-31 00:00:00", "2022-11-05 00:00:00")
+            recorder.retried()
+            recorder.job_ready()
+            recorder.download_started()
+            recorder.download_finished(512, 5)
+        self.store.finish_run(run_id)
+
+        jobs = sorted(self.store.query("jobs", "Account"), key=lambda job: job["job_id"])
+        self.assertEqual([job["job_id"] for job in jobs], ["job-1", "job-2"])
+        self.assertEqual([(job["bytes"], job["rows"], job["retries"]) for job in jobs], [(1024, 10, 0), (512, 5, 1)])
+        self.assertEqual(jobs[1]["window_end"], "2022-11-05 00:00:00")
+
+        [stream] = self.store.query("streams", "Account")
+        self.assertEqual((stream["rows"], stream["bytes"], stream["jobs"], stream["retries"]), (15, 1536, 2, 1))
+        self.assertEqual(self.store.query("jobs", "Invoice"), [])
+
+    @mock.patch("time.sleep")
+    @mock.patch("requests.Session.send")
+    def test_request_retries_recorded(self, mock_send, mock_sleep):
+        """Test that retried HTTP requests are counted for the current
+        stream."""
+        mock_send.return_value = get_response(200)
+        client = Client.from_config({"username": "", "password": "", "api_type": "REST"})
+        mock_send.return_value = get_response(503)
+        with history.recording(None, None, "Account") as recorder:
+            with self.assertRaises(RetryableException):
+                client.rest_request("GET", "v1/object/export/job-1")
+        self.assertEqual(recorder.retries, 4)
+
+    def test_events_from_submitted_threads(self):
+        """Test that threads started with `submit` record into the stream's recorder."""
+        with history.recording(None, None, "Account") as recorder:
+            recorder.job_submitted("job-1")
+            with ThreadPoolExecutor(2) as executor:
+                futures = [history.submit(executor, lambda: history.current().retried()) for _ in range(4)]
+                # Only the job being recorded is marked ready
+                futures.append(history.submit(executor, lambda: history.current().job_ready("job-2")))
+            for future in futures:
+                future.result()
+            self.assertIsNone(recorder.job["ready_at"])
+        self.assertEqual(recorder.retries, 4)
+
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_zuora.sync_stream", side_effect=Exception("Zuora is down"))
+    def test_failed_sync_finishes_run(self, mock_sync_stream, mock_write_state, mock_write_schema):
+        catalog = Catalog([make_catalog_entry("Account")])
+        with self.assertRaises(Exception):
+            do_sync(mock.Mock(), catalog, {"bookmarks": {"Account": {}}}, {"history_dir": self.tmp_dir.name})
+
+        with sqlite3.connect(os.path.join(self.tmp_dir.name, history.HISTORY_FILE)) as conn:
+            [(finished_at,)] = conn.execute("select finished_at from runs").fetchall()
+        self.assertIsNotNone(finished_at)
+
+    def test_main_writes_json_lines(self):
+        run_id = self.store.start_run()
+        with history.recording(self.store, run_id, "Account"):
+            history.current().job_submitted("job-1", "2022-10-01 00:00:00", "2022-10-31 00:00:00")
+            history.current().job_ready()
+
+        argv = ["tap-zuora-history", "--history-dir", self.tmp_dir.name]
+        with mock.patch("sys.argv", argv), mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            history.main()
+        [row] = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(row["job_id"], "job-1")
@@ -2,6 +2,7 @@ import unittest
 from unittest import mock
 
 import requests
+
 from utils import get_response
 
 import tap_zuora
@@ -32,39 +33,42 @@ class MockConfigRest:
 
 
 @mock.patch("requests.Session.send")
-@mock.patch("requests.Request")
 @mock.patch("time.sleep")
 class TestHttpExceptionErrors(unittest.TestCase):
-    def test_http_429_error(self, mock_time, mock_http_request, mock_http_send):
+    def test_http_429_error(self, mock_time, mock_http_send):
         """Test if API request gets retried for 5 times after encountering
         ratelimit exception."""
         client_object = Client.from_config(MockConfigAqua.config)
-        mock_http_request.return_value = requests.Request()
         mock_http_send.return_value = get_response(429)
         # Set the call_count values to zero since .from_config method calls it for base_url
-        mock_http_request.call_count = 0
         mock_http_send.call_count = 0
         with self.assertRaises(RateLimitException):
-            client_object._request("GET", "")
+            client_object._request("GET", client_object.base_url)
         # Assert the number of retries to 5
         self.assertEqual(mock_http_send.call_count, 5)
-        self.assertEqual(mock_http_request.call_count, 5)
 
-    def test_http_5xx_error(self, mock_time, mock_http_request, mock_http_send):
+    def test_http_400_not_json(self, mock_time, mock_http_send):
+        """Test that a 400 error with a body other than JSON, like the XML
+        errors of pre-signed download urls, is raised as an HTTP error."""
+        client_object = Client.from_config(MockConfigRest.config)
+        response = get_response(400, raise_error=True)
+        response.json = mock.Mock(side_effect=ValueError("Expecting value"))
+        mock_http_send.return_value = response
+        with self.assertRaises(requests.HTTPError):
+            client_object.download_request("https://s3/results.csv.gz?sig")
+
+    def test_http_5xx_error(self, mock_time, mock_http_send):
         """Test if API request gets retried for 5 times after encountering 500,
         502, 503, 504 exceptions."""
         client_object = Client.from_config(MockConfigAqua.config)
-        mock_http_request.return_value = requests.Request()
         for error_code in [500, 502, 503, 504]:
             mock_http_send.return_value = get_response(error_code)
             # Set the call_count values to zero since .from_config method calls it for base_url
-            mock_http_request.call_count = 0
             mock_http_send.call_count = 0
             with self.assertRaises(RetryableException):
-                client_object._request("GET", "")
+                client_object._request("GET", client_object.base_url)
             # Assert the number of retries to 5
             self.assertEqual(mock_http_send.call_count, 5)
-            self.assertEqual(mock_http_request.call_count, 5)
 
 
 @mock.patch("singer.utils.parse_args")
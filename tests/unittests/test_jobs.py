@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+
+from tap_zuora import apis, jobs, sync
+from tap_zuora.exceptions import ApiException
+
+from utils import get_response
+
+
+@mock.patch("tap_zuora.apis.Aqua.cancel_job")
+class TestJobTracking(unittest.TestCase):
+    client = mock.Mock(is_rest=False, is_data_query=False)
+
+    @mock.patch("tap_zuora.sync.DEFAULT_JOB_TIMEOUT", 0)
+    def test_timed_out_job_cancelled(self, mock_cancel_job):
+        """Test that a job is cancelled when waiting for it times out."""
+        with self.assertRaises(apis.ExportTimedOut):
+            sync.poll_job_until_done("job-1", self.client, apis.Aqua)
+        mock_cancel_job.assert_called_once_with(self.client, "job-1")
+
+    @mock.patch("tap_zuora.apis.Aqua.job_ready", side_effect=apis.ExportFailed("failed"))
+    def test_failed_job_not_cancelled(self, mock_job_ready, mock_cancel_job):
+        with self.assertRaises(apis.ExportFailed):
+            sync.poll_job_until_done("job-1", self.client, apis.Aqua)
+        mock_cancel_job.assert_not_called()
+
+    @mock.patch("tap_zuora.apis.Aqua.job_ready", side_effect=jobs.ShutdownRequested(143))
+    def test_shutdown_cancels_job(self, mock_job_ready, mock_cancel_job):
+        """Test that a job is cancelled when the tap is shut down while waiting."""
+        with self.assertRaises(SystemExit):
+            sync.poll_job_until_done("job-1", self.client, apis.Aqua)
+        mock_cancel_job.assert_called_once_with(self.client, "job-1")
+
+    def test_recorded_job_left_running(self, mock_cancel_job):
+        """Test that a job recorded in the state is only cancelled when waiting for it times out."""
+        for interruption in [jobs.ShutdownRequested(143), KeyboardInterrupt(), ApiException(get_response(502))]:
+            with mock.patch("tap_zuora.apis.Aqua.job_ready", side_effect=interruption), self.assertRaises(
+                type(interruption)
+            ):
+                sync.poll_job_until_done("job-1", self.client, apis.Aqua, recorded=True)
+        mock_cancel_job.assert_not_called()
+
+        with mock.patch("tap_zuora.sync.DEFAULT_JOB_TIMEOUT", 0), self.assertRaises(apis.ExportTimedOut):
+            sync.poll_job_until_done("job-1", self.client, apis.Aqua, recorded=True)
+        mock_cancel_job.assert_called_once_with(self.client, "job-1")
+
+    @mock.patch("tap_zuora.apis.Aqua.job_ready", return_value=False)
+    def test_stop_ends_wait(self, mock_job_ready, mock_cancel_job):
+        """Test that setting STOP ends the wait, cancelling only the jobs not recorded in the state."""
+        jobs.STOP.set()
+        self.addCleanup(jobs.STOP.clear)
+        with self.assertRaises(apis.ExportFailed):
+            sync.poll_job_until_done("job-1", self.client, apis.Aqua, recorded=True)
+        mock_cancel_job.assert_not_called()
+        with self.assertRaises(apis.ExportFailed):
+            sync.poll_job_until_done("job-2", self.client, apis.Aqua)
+        mock_cancel_job.assert_called_once_with(self.client, "job-2")
+        with self.assertRaises(jobs.ShutdownRequested):
+            jobs.raise_if_stopped()
+
+    def test_cancel_all(self, mock_cancel_job):
+        with jobs.tracked(self.client, "job-1"), jobs.tracked(self.client, "job-2", recorded=True):
+            jobs.cancel_all()
+        mock_cancel_job.assert_called_once_with(self.client, "job-1")
+
+    def test_cancel_failure_logged(self, mock_cancel_job):
+        mock_cancel_job.side_effect = Exception("gone")
+        jobs.cancel(self.client, "job-1")
+
+    def test_sweep(self, mock_cancel_job):
+        """Test that jobs left behind for streams no longer synced are cancelled."""
+        state = {
+            "bookmarks": {
+                "Account": {"job": {"id": "job-1"}},
+                "Invoice": {"job": {"id": "job-2"}},
+                "Product": {"id_ranges": [{"lower": None, "upper": None, "job": {"id": "job-3"}}]},
+            }
+        }
+        jobs.sweep(self.client, state, ["Invoice"])
+        self.assertEqual(
+            mock_cancel_job.call_args_list, [mock.call(self.client, "job-1"), mock.call(self.client, "job-3")]
+        )
+        self.assertEqual(
+            state["bookmarks"],
+            {
+                "Account": {},
+                "Invoice": {"job": {"id": "job-2"}},
+                "Product": {"id_ranges": [{"lower": None, "upper": None}]},
+            },
+        )
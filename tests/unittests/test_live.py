@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tap_zuora import history, live
+
+
+class TestLiveMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = live.LiveMetrics()
+
+    def test_stream_progress(self):
+        """Test that the phase and running counts of each stream are exposed."""
+        self.registry.queue(["Account", "Invoice"])
+        recorder = history.StreamRecorder(None, None, "Account")
+        self.registry.track(recorder)
+        recorder.job_submitted("job-1", "2022-10-01", "2022-10-31")
+        recorder.download_started({"bytes": 2048, "rows": 10})
+        recorder.retried()
+
+        text = self.registry.render()
+        self.assertIn('tap_zuora_stream_phase{stream="Account",phase="downloading"} 1', text)
+        self.assertIn('tap_zuora_stream_phase{stream="Invoice",phase="queued"} 1', text)
+        self.assertIn('tap_zuora_bytes_downloaded_total{stream="Account"} 2048', text)
+        self.assertIn('tap_zuora_rows_total{stream="Account"} 10', text)
+        self.assertIn('tap_zuora_retries_total{stream="Account"} 1', text)
+        self.assertIn('tap_zuora_window_info{stream="Account",start="2022-10-01",end="2022-10-31"} 1', text)
+
+        recorder.download_finished(4096, 20)
+        recorder.finish()
+        text = self.registry.render()
+        self.assertIn('tap_zuora_stream_phase{stream="Account",phase="done"} 1', text)
+        self.assertIn('tap_zuora_rows_total{stream="Account"} 20', text)
+
+    def test_counters_typed(self):
+        text = self.registry.render()
+        for name in ["tap_zuora_bytes_downloaded_total", "tap_zuora_rows_total", "tap_zuora_retries_total"]:
+            self.assertIn(f"# TYPE {name} counter", text)
+        self.assertIn("# TYPE tap_zuora_rows_per_second gauge", text)
+
+    def test_tenants_labelled(self):
+        """Test that the same stream synced for two tenants gives one series per tenant."""
+        self.registry.queue(["Account"], "acme")
+        for tenant in ["acme", "globex"]:
+            recorder = history.StreamRecorder(None, None, "Account", tenant)
+            self.registry.track(recorder)
+            recorder.download_started({"bytes": 0, "rows": 5})
+        self.registry.record_rate_limits({"X-RateLimit-Remaining-minute": "42"}, "acme")
+
+        text = self.registry.render()
+        self.assertNotIn('phase="queued"', text)
+        self.assertIn('tap_zuora_rows_total{tenant="acme",stream="Account"} 5', text)
+        self.assertIn('tap_zuora_rows_total{tenant="globex",stream="Account"} 5', text)
+        self.assertIn('tap_zuora_rate_limit{tenant="acme",header="x-ratelimit-remaining-minute"} 42.0', text)
+
+    def test_next_sync_replaces_done_stream(self):
+        first = history.StreamRecorder(None, None, "Account")
+        self.registry.track(first)
+        first.finish()
+        self.registry.track(history.StreamRecorder(None, None, "Account"))
+        self.assertEqual(self.registry.render().count("tap_zuora_stream_phase{"), 1)
+
+    def test_rate_limits(self):
+        self.registry.record_rate_limits({"X-RateLimit-Remaining-minute": "42", "Content-Type": "application/json"})
+        self.assertIn('tap_zuora_rate_limit{header="x-ratelimit-remaining-minute"} 42.0', self.registry.render())
+
+    def test_textfile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "tap_zuora.prom")
+            with mock.patch.object(live, "REGISTRY", self.registry):
+                stop = live.start({"metrics_file": path, "metrics_interval": "60"})
+                self.registry.queue(["Account"])
+                stop()
+            with open(path, encoding="utf-8") as textfile:
+                self.assertIn('phase="queued"', textfile.read())
+            self.assertFalse(os.path.exists(path + ".tmp"))
+
+    def test_not_configured(self):
+        self.assertIsNone(live.start({}))
@@ -0,0 +1,35 @@
+import unittest
+from unittest import mock
+
+import pendulum
+
+from tap_zuora import sync
+from tap_zuora.plan import StreamPlan
+
+from utils import USAGE_STREAM, LocalExportApi, make_state
+
+HEADER = b"Usage.Id,Usage.UpdatedDate"
+
+
+@mock.patch("tap_zuora.sync.DEFAULT_POLL_INTERVAL", 0)
+@mock.patch("singer.write_state")
+@mock.patch("singer.write_record")
+class TestLocalBackend(unittest.TestCase):
+    def test_incremental_windows(self, mock_write_record, mock_write_state):
+        """Test that a backend taking REST's job arguments is synced window by window."""
+        files = {
+            ("Usage", "2022-09-01 00:00:00", "2022-10-01 00:00:00"): [[HEADER, b"1,2022-09-15T00:00:00Z"]],
+            ("Usage", "2022-10-01 00:00:00", "2022-10-10 00:00:00"): [
+                [HEADER, b"2,2022-10-02T00:00:00Z"],
+                [HEADER, b"3,2022-10-03T00:00:00Z"],
+            ],
+        }
+        api = LocalExportApi(lambda query: files[query], polls=2)
+        state = make_state("2022-09-01T00:00:00Z")
+        with mock.patch("pendulum.utcnow", return_value=pendulum.datetime(2022, 10, 10)):
+            sync.sync_rest_stream(None, state, StreamPlan(USAGE_STREAM), mock.Mock(), api)
+
+        self.assertEqual(api.queries, list(files))
+        self.assertEqual([call[0][1]["Id"] for call in mock_write_record.call_args_list], ["1", "2", "3"])
+        self.assertEqual(state["bookmarks"]["Usage"]["UpdatedDate"], "2022-10-10 00:00:00")
+        self.assertNotIn("job", state["bookmarks"]["Usage"])
@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import singer
+
+from tap_zuora import jobs, multi_tenant, sync
+
+
+class TestMultiTenant(unittest.TestCase):
+    @mock.patch("tap_zuora.multi_tenant.sync_tenant")
+    def test_messages_routed_per_tenant(self, mock_sync_tenant):
+        """Test that Singer messages written while syncing a tenant end up in
+        that tenant's output only."""
+        outputs = {"acme": io.StringIO(), "globex": io.StringIO()}
+
+        def fake_sync_tenant(tenant, transport, writer):
+            writer.route(outputs[tenant["name"]])
+            try:
+                for i in range(50):
+                    singer.write_record("Account", {"Id": f'{tenant["name"]}-{i}'})
+            finally:
+                writer.route(None)
+
+        mock_sync_tenant.side_effect = fake_sync_tenant
+        stdout = sys.stdout
+        failed = multi_tenant.sync_tenants([{"name": "acme"}, {"name": "globex"}], max_workers=2)
+
+        self.assertEqual(failed, [])
+        self.assertIs(sys.stdout, stdout)
+        for name, output in outputs.items():
+            lines = output.getvalue().splitlines()
+            self.assertEqual(len(lines), 50)
+            self.assertTrue(all(f'"{name}-' in line for line in lines))
+
+    @mock.patch("tap_zuora.multi_tenant.sync_tenant")
+    def test_failed_tenants_reported(self, mock_sync_tenant):
+        """Test that one failing tenant does not stop the others."""
+
+        def fake_sync_tenant(tenant, transport, writer):
+            if tenant["name"] == "acme":
+                raise Exception("Bad credentials")
+
+        mock_sync_tenant.side_effect = fake_sync_tenant
+        failed = multi_tenant.sync_tenants([{"name": "acme"}, {"name": "globex"}])
+        self.assertEqual(failed, ["acme"])
+        self.assertEqual(mock_sync_tenant.call_count, 2)
+
+
+class TestTenantState(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tenants_path = tenants_path = os.path.join(self.directory.name, "tenants.json")
+        with open(tenants_path, "w", encoding="utf-8") as tenants_file:
+            json.dump({"tenants": [{"name": "acme", "config": "config.json", "catalog": "catalog.json"}]}, tenants_file)
+        with open(os.path.join(self.directory.name, "config.json"), "w", encoding="utf-8") as config_file:
+            json.dump(
+                {"start_date": "2022-09-01T00:00:00Z", "api_type": "REST", "username": "", "password": ""}, config_file
+            )
+        with open(os.path.join(self.directory.name, "catalog.json"), "w", encoding="utf-8") as catalog_file:
+            json.dump({"streams": []}, catalog_file)
+        (self.tenant,) = multi_tenant.load_tenants(tenants_path)["tenants"]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @mock.patch("tap_zuora.multi_tenant.Client.from_config")
+    @mock.patch("tap_zuora.multi_tenant.do_sync")
+    def test_state_written_back(self, mock_do_sync, mock_from_config):
+        """Test that a tenant resumes from the state its previous sync ended with, even a failed one."""
+
+        def fail_sync(client, catalog, state, config):
+            state["bookmarks"]["Account"] = {"version": 1}
+            state["current_stream"] = "Account"
+            raise Exception("Interrupted")
+
+        writer = multi_tenant.ThreadRoutedWriter(io.StringIO())
+        mock_do_sync.side_effect = fail_sync
+        with self.assertRaises(Exception):
+            multi_tenant.sync_tenant(self.tenant, None, writer)
+
+        mock_do_sync.side_effect = None
+        multi_tenant.sync_tenant(self.tenant, None, writer)
+        self.assertEqual(
+            mock_do_sync.call_args[0][2], {"bookmarks": {"Account": {"version": 1}}, "current_stream": "Account"}
+        )
+        self.assertEqual(singer.utils.load_json(self.tenant["state"])["current_stream"], "Account")
+
+    @mock.patch("tap_zuora.sync.DEFAULT_POLL_INTERVAL", 5)
+    @mock.patch("tap_zuora.jobs.cancel")
+    @mock.patch("tap_zuora.multi_tenant.Client.from_config")
+    @mock.patch("tap_zuora.multi_tenant.do_sync")
+    def test_sigterm_writes_state(self, mock_do_sync, mock_from_config, mock_cancel):
+        """Test that on SIGTERM the tenants stop waiting for their jobs, leaving
+        them running, and write their state before the process exits."""
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+        self.addCleanup(jobs.STOP.clear)
+        polling = threading.Event()
+        api = mock.Mock()
+        api.job_ready.side_effect = lambda client, job_id: polling.set()
+
+        def sync_until_stopped(client, catalog, state, config):
+            state["bookmarks"]["Account"] = {"job": {"id": "job-1"}}
+            sync.poll_job_until_done("job-1", client, api, recorded=True)
+
+        def terminate():
+            polling.wait(5)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        mock_do_sync.side_effect = sync_until_stopped
+        threading.Thread(target=terminate).start()
+        with mock.patch("sys.argv", ["tap-zuora-multi-tenant", "--tenants", self.tenants_path]), self.assertRaises(
+            SystemExit
+        ) as raised:
+            multi_tenant.main()
+
+        self.assertEqual(raised.exception.code, 128 + signal.SIGTERM)
+        self.assertEqual(
+            singer.utils.load_json(self.tenant["state"])["bookmarks"], {"Account": {"job": {"id": "job-1"}}}
+        )
+        mock_cancel.assert_not_called()
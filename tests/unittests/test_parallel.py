@@ -0,0 +1,55 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+from tap_zuora.parallel import map_ordered, split_chunks
+
+
+class TestSplitChunks(unittest.TestCase):
+    def test_chunk_sizes(self):
+        lines = [f"{i},row".encode() for i in range(10)]
+        self.assertEqual([len(chunk) for chunk in split_chunks(lines, 4)], [4, 4, 2])
+
+    def test_quoted_newline_not_split(self):
+        """Test that a chunk is not cut inside a quoted value spanning
+        lines."""
+        lines = [b"1,a", b'2,"multi', b'line",b', b"3,c", b"4,d"]
+        self.assertEqual(
+            list(split_chunks(lines, 2)),
+            [[b"1,a", b'2,"multi', b'line",b'], [b"3,c", b"4,d"]],
+        )
+
+    def test_escaped_quotes(self):
+        """Test that escaped quotes inside a value keep the quotes
+        balanced."""
+        lines = [b'1,"say ""hi"""', b"2,b", b"3,c"]
+        self.assertEqual(list(split_chunks(lines, 1)), [[line] for line in lines])
+
+
+class TestMapOrdered(unittest.TestCase):
+    def test_results_in_chunk_order(self):
+        with ThreadPoolExecutor(2) as executor:
+            results = map_ordered(
+                executor, lambda chunk, factor: [i * factor for i in chunk], [[1, 2], [3], [4]], 2, 10
+            )
+            self.assertEqual(list(results), [10, 20, 30, 40])
+
+    def test_pending_chunks_cancelled_on_close(self):
+        """Test that the chunks not started yet are cancelled when the
+        consumer stops early."""
+        release = Event()
+        started = []
+
+        def work(chunk):
+            started.append(chunk)
+            if chunk == [2]:
+                release.wait(5)
+            return chunk
+
+        with ThreadPoolExecutor(1) as executor:
+            results = map_ordered(executor, work, [[1], [2], [3], [4]], 3)
+            self.assertEqual(next(results), 1)
+            results.close()
+            release.set()
+        self.assertNotIn([3], started)
+        self.assertNotIn([4], started)
@@ -0,0 +1,232 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import singer
+
+from tap_zuora import apis, history, jobs, sync
+from tap_zuora.apis import Rest
+from tap_zuora.partition import MAX_PARTITIONS, id_ranges, sample
+from tap_zuora.plan import StreamPlan
+
+STREAM = {
+    "tap_stream_id": "Product",
+    "schema": {"type": "object", "properties": {"Id": {"type": ["string", "null"]}}},
+    "metadata": [{"breadcrumb": ["properties", "Id"], "metadata": {"inclusion": "automatic"}}],
+}
+
+
+class TestIdRanges(unittest.TestCase):
+    def test_sample_bounded(self):
+        values = [f"{i:08x}" for i in range(50000)]
+        sampled = sample(iter(values), size=100)
+        self.assertEqual(len(sampled), 100)
+        self.assertTrue(set(sampled) <= set(values))
+
+    def test_ranges_balanced(self):
+        """Test that the ranges split the sampled Ids evenly and cover every Id."""
+        ids = [f"{i:08x}" for i in range(1000)]
+        ranges = id_ranges(ids, 4)
+        self.assertEqual(ranges[0][0], None)
+        self.assertEqual(ranges[-1][1], None)
+        self.assertEqual([upper for _, upper in ranges[:-1]], [lower for lower, _ in ranges[1:]])
+        counts = [
+            sum(1 for i in ids if (lower is None or i >= lower) and (upper is None or i < upper))
+            for lower, upper in ranges
+        ]
+        self.assertEqual(counts, [250, 250, 250, 250])
+
+    def test_few_ids(self):
+        self.assertEqual(id_ranges([], 4), [(None, None)])
+        self.assertEqual(id_ranges(["a", "a", "b"], 4), [(None, "b"), ("b", None)])
+
+    def test_range_query(self):
+        plan = StreamPlan(STREAM)
+        self.assertEqual(
+            Rest.get_query(plan, None, None, ("a", "b")), "select Id from Product where Id >= 'a' and Id < 'b'"
+        )
+        self.assertEqual(Rest.get_query(plan, None, None, (None, "b")), "select Id from Product where Id < 'b'")
+
+
+IDS = [f"{i:04x}" for i in range(100)]
+
+
+def fake_sample_ids(client, state, plan, id_range=(None, None)):
+    lower, upper = id_range
+    return [i for i in IDS if (lower is None or i >= lower) and (upper is None or i < upper)]
+
+
+def fake_create_job(client, plan, id_range):
+    return f"job-{id_range[0]}-{id_range[1]}"
+
+
+@mock.patch("singer.write_state")
+@mock.patch("tap_zuora.sync.sync_file_ids", side_effect=lambda file_ids, *args: args[-1])
+@mock.patch("tap_zuora.sync.sample_ids", side_effect=fake_sample_ids)
+@mock.patch("tap_zuora.apis.Rest.create_job", side_effect=fake_create_job)
+@mock.patch("tap_zuora.jobs.cancel")
+class TestPartitionedSync(unittest.TestCase):
+    plan = StreamPlan(STREAM)
+
+    @mock.patch("tap_zuora.sync.poll_job_until_done", side_effect=lambda job_id, *args: [f"file-{job_id}"])
+    def test_ranges_kept(self, mock_poll, mock_cancel, mock_create, mock_sample, mock_sync_file_ids, mock_write_state):
+        """Test that the sampled Id ranges are reused by the next sync."""
+        state = {"bookmarks": {"Product": {}}}
+        sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 4)
+        ranges = state["bookmarks"]["Product"]["id_ranges"]
+        self.assertEqual(ranges, [{"lower": None, "upper": "0019"}, *ranges[1:3], {"lower": "004b", "upper": None}])
+        self.assertEqual(
+            mock_sync_file_ids.call_args[0][0],
+            [f'file-job-{id_range["lower"]}-{id_range["upper"]}' for id_range in ranges],
+        )
+
+        sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 4)
+        self.assertEqual(mock_sample.call_count, 1)
+        self.assertEqual(mock_create.call_count, 8)
+        self.assertEqual(len(state["bookmarks"]["Product"]["id_ranges"]), 4)
+
+    @mock.patch("tap_zuora.sync.poll_job_until_done")
+    def test_timeout_splits_range(
+        self, mock_poll, mock_cancel, mock_create, mock_sample, mock_sync_file_ids, mock_write_state
+    ):
+        """Test that a timed out range is split, the running ones cancelled and the finished ones kept."""
+
+        def poll(job_id, client, api, recorded, stopped):
+            if job_id == "job-0019-0032":
+                raise apis.ExportTimedOut(720, "minutes")
+            if job_id in ["job-0032-004b", "job-004b-None"] and mock_create.call_count == 4:
+                stopped.wait(5)
+                raise apis.ExportFailed("Stopped")
+            return [f"file-{job_id}"]
+
+        mock_poll.side_effect = poll
+        state = {"bookmarks": {"Product": {}}}
+        sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 4)
+
+        self.assertEqual(sorted(call[0][1] for call in mock_cancel.call_args_list), ["job-0032-004b", "job-004b-None"])
+        self.assertEqual(mock_sample.call_args[0][3], ("0019", "0032"))
+        created = [fake_create_job(None, None, call[1]["id_range"]) for call in mock_create.call_args_list]
+        self.assertEqual(created.count("job-None-0019"), 1)
+        self.assertEqual(
+            mock_sync_file_ids.call_args[0][0],
+            [
+                "file-job-None-0019",
+                "file-job-0019-0025",
+                "file-job-0025-0032",
+                "file-job-0032-004b",
+                "file-job-004b-None",
+            ],
+        )
+        self.assertEqual(state["bookmarks"]["Product"]["partitions"], 5)
+
+    @mock.patch("tap_zuora.apis.Rest.job_ready", return_value=False)
+    @mock.patch("tap_zuora.sync.poll_job_until_done", side_effect=lambda job_id, *args: [f"file-{job_id}"])
+    def test_job_reattached(
+        self, mock_poll, mock_job_ready, mock_cancel, mock_create, mock_sample, mock_sync_file_ids, mock_write_state
+    ):
+        """Test that a restarted sync re-attaches to the range jobs of the interrupted one."""
+        job = {
+            "id": "job-1",
+            "fingerprint": sync.job_fingerprint(self.plan, None, None),
+            "submitted_at": singer.utils.strftime(singer.utils.now()),
+        }
+        state = {"bookmarks": {"Product": {"partitions": 1, "id_ranges": [{"lower": None, "upper": None, "job": job}]}}}
+        sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 1)
+        mock_create.assert_not_called()
+        self.assertEqual(mock_sync_file_ids.call_args[0][0], ["file-job-1"])
+
+    @mock.patch("tap_zuora.sync.poll_job_until_done")
+    def test_drifted_ranges_sampled_again(
+        self, mock_poll, mock_cancel, mock_create, mock_sample, mock_sync_file_ids, mock_write_state
+    ):
+        """Test that the finished ranges of an interrupted sync are kept, and unbalanced ranges dropped."""
+        ranges = [
+            {"lower": None, "upper": "0032", "file_ids": ["f1"], "seconds": 60},
+            {"lower": "0032", "upper": None, "file_ids": ["f2"], "seconds": 600},
+        ]
+        state = {"bookmarks": {"Product": {"partitions": 2, "id_ranges": ranges}}}
+        sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 2)
+        mock_poll.assert_not_called()
+        self.assertEqual(mock_sync_file_ids.call_args[0][0], ["f1", "f2"])
+        self.assertNotIn("id_ranges", state["bookmarks"]["Product"])
+
+    @mock.patch("tap_zuora.sync.poll_job_until_done")
+    def test_stopped_jobs_kept(
+        self, mock_poll, mock_cancel, mock_create, mock_sample, mock_sync_file_ids, mock_write_state
+    ):
+        """Test that on shutdown the jobs of the ranges are kept in the state to be re-attached to."""
+
+        def poll(job_id, client, api, recorded, stopped):
+            raise apis.ExportFailed(f"Stopped waiting for export job {job_id}")
+
+        mock_poll.side_effect = poll
+        state = {"bookmarks": {"Product": {}}}
+        jobs.STOP.set()
+        self.addCleanup(jobs.STOP.clear)
+        with self.assertRaises(apis.ExportFailed):
+            sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 2)
+        mock_cancel.assert_not_called()
+        self.assertTrue(all("job" in id_range for id_range in state["bookmarks"]["Product"]["id_ranges"]))
+
+    @mock.patch("tap_zuora.apis.Rest.get_file_ids", side_effect=lambda client, job_id: [f"file-{job_id}"])
+    @mock.patch("tap_zuora.apis.Rest.job_ready")
+    def test_jobs_recorded(
+        self,
+        mock_job_ready,
+        mock_get_file_ids,
+        mock_cancel,
+        mock_create,
+        mock_sample,
+        mock_sync_file_ids,
+        mock_write_state,
+    ):
+        """Test that each range's job is written to the history with its range and retries."""
+
+        def job_ready(client, job_id):
+            if job_id == "job-None-0032":
+                history.current().retried()
+            return True
+
+        mock_job_ready.side_effect = job_ready
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = history.HistoryStore.from_config({"history_dir": tmp_dir})
+            with history.recording(store, store.start_run(), "Product"):
+                history.current().job_submitted("job-sample")
+                sync.sync_partitioned_full_table(None, {"bookmarks": {"Product": {}}}, self.plan, mock.Mock(), 2)
+            jobs = {row["job_id"]: row for row in store.query("jobs")}
+            store.close()
+
+        self.assertEqual(sorted(jobs), ["job-0032-None", "job-None-0032", "job-sample"])
+        for job_id, lower, upper, retries in [("job-None-0032", None, "0032", 1), ("job-0032-None", "0032", None, 0)]:
+            self.assertEqual(
+                (jobs[job_id]["window_start"], jobs[job_id]["window_end"], jobs[job_id]["retries"]),
+                (lower, upper, retries),
+            )
+            self.assertIsNotNone(jobs[job_id]["ready_at"])
+        self.assertEqual((jobs["job-sample"]["ready_at"], jobs["job-sample"]["retries"]), (None, 0))
+
+    @mock.patch("tap_zuora.sync.poll_job_until_done", side_effect=apis.ExportTimedOut(720, "minutes"))
+    def test_too_many_partitions(
+        self, mock_poll, mock_cancel, mock_create, mock_sample, mock_sync_file_ids, mock_write_state
+    ):
+        state = {"bookmarks": {"Product": {"partitions": MAX_PARTITIONS}}}
+        with self.assertRaises(apis.ExportFailed):
+            sync.sync_partitioned_full_table(None, state, self.plan, mock.Mock(), 2)
+        self.assertEqual(mock_sample.call_count, 1)
+
+
+@mock.patch("singer.write_state")
+class TestSampleIds(unittest.TestCase):
+    @mock.patch("tap_zuora.apis.Rest.stream_file", return_value=iter([b"Id", b"b", b"a"]))
+    @mock.patch("tap_zuora.sync.poll_job_until_done", return_value=["f1"])
+    @mock.patch("tap_zuora.apis.Rest.submit_query", return_value="job-1")
+    def test_sample_range(self, mock_submit_query, mock_poll, mock_stream_file, mock_write_state):
+        """Test that the Ids of a range are sampled by a job recorded in the state."""
+        state = {"bookmarks": {"Product": {}}}
+        written = []
+        mock_write_state.side_effect = lambda state: written.append(state["bookmarks"]["Product"].get("job"))
+        self.assertEqual(sync.sample_ids(None, state, StreamPlan(STREAM), ("a", "c")), ["b", "a"])
+        mock_submit_query.assert_called_once_with(None, "select Id from Product where Id >= 'a' and Id < 'c'")
+        self.assertEqual(mock_poll.call_args, mock.call("job-1", None, apis.Rest, recorded=True))
+        self.assertEqual(written[0]["id"], "job-1")
+        self.assertNotIn("job", state["bookmarks"]["Product"])
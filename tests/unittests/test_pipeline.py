@@ -0,0 +1,57 @@
+import time
+import unittest
+
+from tap_zuora.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def test_order_preserved(self):
+        """Test that the output of the stages keeps the source order."""
+        output = list(
+            Pipeline(buffer_rows=10, batch_size=3).run(
+                range(1000), [lambda batch: [i * 2 for i in batch], lambda batch: [i + 1 for i in batch]]
+            )
+        )
+        self.assertEqual(output, [i * 2 + 1 for i in range(1000)])
+
+    def test_backpressure(self):
+        """Test that the reader stops pulling from the source when the
+        consumer doesn't keep up."""
+        pulled = []
+
+        def source():
+            for i in range(10000):
+                pulled.append(i)
+                yield i
+
+        items = Pipeline(buffer_rows=20, batch_size=10).run(source(), [lambda batch: batch])
+        next(items)
+        time.sleep(0.2)
+        # Two queues of 2 batches, plus a batch held by each thread and the consumer
+        self.assertLessEqual(len(pulled), 100)
+        items.close()
+
+    def test_stage_error_raised(self):
+        """Test that an error in a stage is raised to the consumer after the
+        items preceding it."""
+
+        def fail_on_five(batch):
+            if 5 in batch:
+                raise ValueError("bad row")
+            return batch
+
+        output = []
+        with self.assertRaises(ValueError):
+            for item in Pipeline(buffer_rows=5, batch_size=5).run(range(20), [fail_on_five]):
+                output.append(item)
+        self.assertEqual(output, [0, 1, 2, 3, 4])
+
+    def test_threads_stop_when_consumer_stops(self):
+        """Test that the stage threads exit when the consumer stops early."""
+        pipeline = Pipeline(buffer_rows=4, batch_size=2)
+        items = pipeline.run(iter(range(10000)), [lambda batch: batch])
+        next(items)
+        items.close()
+        for thread in pipeline._threads:
+            thread.join(timeout=5)
+        self.assertFalse(any(thread.is_alive() for thread in pipeline._threads))
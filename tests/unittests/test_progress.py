@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+
+from tap_zuora import progress
+from tap_zuora.progress import Progress, eta
+
+
+class TestProgress(unittest.TestCase):
+    def test_eta(self):
+        self.assertEqual(eta(30, 0.25), 90)
+        self.assertIsNone(eta(30, 0))
+        self.assertIsNone(eta(30, None))
+
+    def test_file_progress(self):
+        """Test that file progress is measured from the raw bytes read against Content-Length."""
+        resp = mock.Mock(headers={"Content-Length": "1000"})
+        resp.raw.tell.side_effect = [250, 250]
+        tracker = Progress("Account")
+        chunks = tracker.track_file("file-1", resp, iter([b"a", b"b"]))
+        next(chunks)
+        self.assertEqual(tracker.file_fraction(), 0.25)
+        self.assertIsNotNone(tracker.file_eta())
+        self.assertEqual(list(chunks), [b"b"])
+        self.assertIsNone(tracker.file_fraction())
+
+    def test_downloaded_bytes(self):
+        """Test that the bytes read off the socket are kept in the file's totals."""
+        resp = mock.Mock(headers={})
+        resp.raw.tell.side_effect = [100, 180]
+        totals = {"bytes": 0, "rows": 0}
+        list(Progress("Account").track_file("file-1", resp, iter([b"a" * 300, b"b" * 200]), totals))
+        self.assertEqual(totals["bytes"], 180)
+
+    def test_unknown_length(self):
+        resp = mock.Mock(headers={})
+        tracker = Progress("Account")
+        list(tracker.track_file("file-1", resp, iter([b"a"])))
+        self.assertIsNone(tracker.file_fraction())
+
+    def test_coverage(self):
+        """Test that coverage follows the bookmark across the replication key range."""
+        bookmarks = {"UpdatedDate": "2022-10-01T00:00:00Z"}
+        tracker = Progress("Account")
+        tracker.track_coverage("2022-10-01T00:00:00Z", "2022-10-11T00:00:00Z", bookmarks, "UpdatedDate")
+        self.assertEqual(tracker.coverage_fraction(), 0.0)
+        bookmarks["UpdatedDate"] = "2022-10-03 12:00:00"
+        self.assertEqual(tracker.coverage_fraction(), 0.25)
+
+    @mock.patch.object(progress.LOGGER, "info")
+    def test_periodic_report(self, mock_info):
+        """Test that progress is logged at most once per interval while a file is read."""
+        resp = mock.Mock(headers={"Content-Length": "10"})
+        resp.raw.tell.return_value = 5
+        tracker = Progress("Account", interval=60)
+        with mock.patch("time.monotonic", side_effect=[0, 0, 30, 61, 62, 62, 62]):
+            tracker.started = tracker.last_report = 0
+            list(tracker.track_file("file-1", resp, iter([b"a", b"b", b"c"])))
+        self.assertEqual(mock_info.call_count, 1)
+        self.assertIn("file file-1 50.0% of 10 bytes", mock_info.call_args[0][0])
@@ -0,0 +1,113 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from tap_zuora import sync
+from tap_zuora.plan import StreamPlan
+from tap_zuora.replay import ReplayCache
+
+from utils import USAGE_STREAM, MockApi, make_state
+
+FILES = {
+    "f1": [b"Usage.Id,Usage.UpdatedDate", b"1,2022-10-01T00:00:00Z", b"", b"2,2022-10-02T00:00:00Z"],
+    "f2": [b"Usage.Id,Usage.UpdatedDate", b"3,2022-10-03T00:00:00Z"],
+}
+
+
+@mock.patch("singer.write_state")
+@mock.patch("singer.write_record")
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ReplayCache(self.directory.name)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def download(self, state, file_ids, window_end=None, config=None):
+        """Syncs the files of a REST window, keeping them in the cache."""
+        plan = StreamPlan(USAGE_STREAM, config)
+        plan.replay_cache = self.cache
+        sync.save_file_ids(state, plan, file_ids, window_end)
+        sync.sync_file_ids(list(file_ids), None, state, plan, MockApi(FILES), mock.Mock())
+        if window_end:
+            state["bookmarks"]["Usage"]["UpdatedDate"] = window_end
+
+    def test_replay_emits_same_records(self, mock_write_record, mock_write_state):
+        """Test that replaying from a state re-emits the records synced from it and ends in the same state."""
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.download(state, ["f1"], "2022-10-02 12:00:00")
+        self.download(state, ["f2"], "2022-10-04 00:00:00")
+        records = [call[0][1] for call in mock_write_record.call_args_list]
+        mock_write_record.reset_mock()
+
+        replayed = make_state("2022-09-01T00:00:00.000000Z")
+        sync.replay_stream(self.cache, replayed, StreamPlan(USAGE_STREAM), mock.Mock())
+        self.assertEqual([call[0][1] for call in mock_write_record.call_args_list], records)
+        self.assertEqual(replayed["bookmarks"]["Usage"]["UpdatedDate"], "2022-10-04 00:00:00")
+
+    def test_recorded_from_pipeline(self, mock_write_record, mock_write_state):
+        """Test that files are cached when they are read on the thread of the
+        pipeline."""
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.download(state, ["f1"], "2022-10-02 12:00:00", {"pipeline_buffer_rows": "1"})
+        self.download(state, ["f2"], "2022-10-04 00:00:00", {"pipeline_buffer_rows": "1"})
+        records = [call[0][1] for call in mock_write_record.call_args_list]
+        mock_write_record.reset_mock()
+
+        replayed = make_state("2022-09-01T00:00:00.000000Z")
+        plan = StreamPlan(USAGE_STREAM, {"pipeline_buffer_rows": "1"})
+        sync.replay_stream(self.cache, replayed, plan, mock.Mock())
+        self.assertEqual([call[0][1] for call in mock_write_record.call_args_list], records)
+
+    def test_replay_from_later_window(self, mock_write_record, mock_write_state):
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.download(state, ["f1"], "2022-10-02 12:00:00")
+        self.download(state, ["f2"], "2022-10-04 00:00:00")
+        mock_write_record.reset_mock()
+
+        sync.replay_stream(self.cache, make_state("2022-10-02 12:00:00"), StreamPlan(USAGE_STREAM), mock.Mock())
+        self.assertEqual([call[0][1]["Id"] for call in mock_write_record.call_args_list], ["3"])
+
+    def test_replay_from_mid_file(self, mock_write_record, mock_write_state):
+        """Test that a state committed partway through an export's file replays the rest of it."""
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.download(state, ["f1"], "2022-10-02 12:00:00")
+        self.download(state, ["f2"], "2022-10-04 00:00:00")
+        mock_write_record.reset_mock()
+
+        committed = make_state(
+            "2022-10-01T00:00:00.000000Z", boundary={"value": "2022-10-01T00:00:00.000000Z", "ids": ["1"]}
+        )
+        sync.replay_stream(self.cache, committed, StreamPlan(USAGE_STREAM), mock.Mock())
+        self.assertEqual([call[0][1]["Id"] for call in mock_write_record.call_args_list], ["2", "3"])
+        self.assertEqual(committed["bookmarks"]["Usage"]["UpdatedDate"], "2022-10-04 00:00:00")
+
+    def test_nothing_cached(self, mock_write_record, mock_write_state):
+        with self.assertRaises(Exception):
+            sync.replay_stream(
+                self.cache, make_state("2022-09-01T00:00:00.000000Z"), StreamPlan(USAGE_STREAM), mock.Mock()
+            )
+
+    def test_partially_downloaded_export_not_replayed(self, mock_write_record, mock_write_state):
+        """Test that an export is only replayed once all of its files are cached."""
+        plan = StreamPlan(USAGE_STREAM)
+        plan.replay_cache = self.cache
+        sync.save_file_ids(make_state("2022-09-01T00:00:00.000000Z"), plan, ["f1", "f2"])
+        list(self.cache.record_file("f1", FILES["f1"]))
+        self.assertIsNone(self.cache.find("Usage", plan.select_query, "2022-09-01T00:00:00.000000Z"))
+
+    def test_least_recently_used_evicted(self, mock_write_record, mock_write_state):
+        self.cache.max_bytes = 1
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.download(state, ["f1"], "2022-10-02 12:00:00")
+        self.download(state, ["f2"], "2022-10-04 00:00:00")
+        query = StreamPlan(USAGE_STREAM).select_query
+        self.assertIsNone(self.cache.find("Usage", query, "2022-09-01T00:00:00.000000Z"))
+        self.assertIsNone(self.cache.find("Usage", query, "2022-10-02 12:00:00"))
+
+        self.cache.max_bytes = 10**6
+        self.download(state, ["f1"], "2022-10-05 00:00:00")
+        self.download(state, ["f2"], "2022-10-06 00:00:00")
+        self.assertIsNotNone(self.cache.find("Usage", query, "2022-10-04 00:00:00"))
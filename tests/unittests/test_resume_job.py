@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+
+import pendulum
+
+from tap_zuora import apis, jobs, sync
+from tap_zuora.plan import StreamPlan
+
+from utils import USAGE_STREAM, LocalExportApi
+
+
+def make_state(job=None):
+    bookmarks = {"UpdatedDate": "2022-10-01T00:00:00Z"}
+    if job:
+        bookmarks["job"] = job
+    return {"bookmarks": {"Usage": bookmarks}}
+
+
+@mock.patch("singer.write_state")
+class TestResumeJob(unittest.TestCase):
+    plan = StreamPlan(USAGE_STREAM)
+
+    def submit(self, state, api):
+        create = mock.Mock(return_value="new-job")
+        job_id = sync.submit_job(None, state, self.plan, api, sync.job_fingerprint(self.plan, "a", "b"), create)
+        return job_id, create
+
+    def recorded_job(self, job_id, fingerprint=None):
+        return {
+            "id": job_id,
+            "fingerprint": fingerprint or sync.job_fingerprint(self.plan, "a", "b"),
+            "submitted_at": sync.singer.utils.strftime(sync.singer.utils.now()),
+        }
+
+    def test_submitted_job_recorded(self, mock_write_state):
+        """Test that a new job is written to the state before waiting for it."""
+        state = make_state()
+        job_id, create = self.submit(state, mock.Mock())
+        self.assertEqual(job_id, "new-job")
+        create.assert_called_once()
+        self.assertEqual(state["bookmarks"]["Usage"]["job"]["id"], "new-job")
+        mock_write_state.assert_called_with(state)
+
+    def test_reattach_running_job(self, mock_write_state):
+        """Test that a still running job of the same export is re-attached to."""
+        api = mock.Mock(**{"job_ready.return_value": False})
+        state = make_state(self.recorded_job("old-job"))
+        job_id, create = self.submit(state, api)
+        self.assertEqual(job_id, "old-job")
+        create.assert_not_called()
+        self.assertEqual(state["bookmarks"]["Usage"]["job"]["id"], "old-job")
+
+    def test_different_export_resubmitted(self, mock_write_state):
+        """Test that a job submitted for another query window is not reused."""
+        api = mock.Mock()
+        state = make_state(self.recorded_job("old-job", fingerprint="other"))
+        job_id, _ = self.submit(state, api)
+        self.assertEqual(job_id, "new-job")
+        api.job_ready.assert_not_called()
+
+    def test_failed_job_resubmitted(self, mock_write_state):
+        """Test that a failed job is replaced by a new one."""
+        api = mock.Mock(**{"job_ready.side_effect": apis.ExportFailed("Cancelled")})
+        state = make_state(self.recorded_job("old-job"))
+        job_id, _ = self.submit(state, api)
+        self.assertEqual(job_id, "new-job")
+        self.assertEqual(state["bookmarks"]["Usage"]["job"]["id"], "new-job")
+
+    def test_file_ids_replace_job(self, mock_write_state):
+        state = make_state(self.recorded_job("old-job"))
+        sync.save_file_ids(state, self.plan, ["f1"])
+        self.assertEqual(state["bookmarks"]["Usage"], {"UpdatedDate": "2022-10-01T00:00:00Z", "file_ids": ["f1"]})
+
+
+@mock.patch("tap_zuora.sync.DEFAULT_POLL_INTERVAL", 0)
+@mock.patch("singer.write_record")
+@mock.patch("singer.write_state")
+class TestResumeLastWindow(unittest.TestCase):
+    header = b"Usage.Id,Usage.UpdatedDate"
+
+    def test_restart_reattaches_to_last_window(self, mock_write_state, mock_write_record):
+        """Test that a sync restarted later re-attaches to the job of the window ending when it first started."""
+        api = LocalExportApi(lambda query: [[self.header, b"1,2022-10-05T00:00:00Z"]], polls=2)
+        state = make_state()
+        with mock.patch("pendulum.utcnow", return_value=pendulum.datetime(2022, 10, 10)), mock.patch.object(
+            jobs.STOP, "wait", side_effect=KeyboardInterrupt
+        ), self.assertRaises(KeyboardInterrupt):
+            sync.sync_rest_stream(None, state, StreamPlan(USAGE_STREAM), mock.Mock(), api)
+        self.assertEqual(state["bookmarks"]["Usage"]["job"]["window_end"], "2022-10-10 00:00:00")
+        self.assertEqual(api.cancelled, [])
+
+        with mock.patch("pendulum.utcnow", return_value=pendulum.datetime(2022, 10, 10, 6)):
+            sync.sync_rest_stream(None, state, StreamPlan(USAGE_STREAM), mock.Mock(), api)
+        self.assertEqual(
+            api.queries,
+            [
+                ("Usage", "2022-10-01 00:00:00", "2022-10-10 00:00:00"),
+                ("Usage", "2022-10-10 00:00:00", "2022-10-10 06:00:00"),
+            ],
+        )
+        self.assertEqual(state["bookmarks"]["Usage"]["UpdatedDate"], "2022-10-10 06:00:00")
@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from tap_zuora import sync
+from tap_zuora.plan import StreamPlan
+from tap_zuora.row_index import RowHashIndex
+
+from utils import MockApi
+
+STREAM = {
+    "tap_stream_id": "Product",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "Id": {"type": ["string", "null"]},
+            "Name": {"type": ["string", "null"]},
+        },
+    },
+    "metadata": [
+        {"breadcrumb": ["properties", "Id"], "metadata": {"inclusion": "automatic"}},
+        {"breadcrumb": ["properties", "Name"], "metadata": {"selected": True}},
+    ],
+}
+
+
+@mock.patch("singer.write_state")
+@mock.patch("singer.write_record")
+class TestRowHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.index_dir = tempfile.TemporaryDirectory()
+        self.config = {"row_index_dir": self.index_dir.name, "emit_deletions": "true"}
+        self.state = {"bookmarks": {"Product": {}}}
+
+    def tearDown(self):
+        self.index_dir.cleanup()
+
+    def sync(self, lines, time):
+        plan = StreamPlan(STREAM, self.config)
+        plan.row_index = RowHashIndex.from_config(self.config, "Product")
+        with mock.patch("time.time", return_value=time):
+            counter = sync.sync_file_ids(["f1"], None, self.state, plan, MockApi({"f1": lines}), mock.Mock())
+        sync.finish_row_index(self.state, plan, counter, full_export=True)
+        plan.row_index.close()
+
+    def test_only_changes_emitted(self, mock_write_record, mock_write_state):
+        """Test that a second full export only emits new, changed and deleted rows."""
+        self.sync([b"Product.Id,Product.Name", b"1,a", b"2,b", b"3,c"], 1)
+        mock_write_record.reset_mock()
+
+        self.sync([b"Product.Id,Product.Name", b"1,a", b"2,changed", b"4,d"], 2)
+        records = [call[0][1] for call in mock_write_record.call_args_list]
+        self.assertEqual(
+            records,
+            [{"Id": "2", "Name": "changed"}, {"Id": "4", "Name": "d"}, {"Id": "3", "Deleted": True}],
+        )
+        self.assertNotIn("row_index_run", self.state["bookmarks"]["Product"])
+
+    def test_deletions_emitted_once(self, mock_write_record, mock_write_state):
+        """Test that deleted Ids are removed from the index."""
+        self.sync([b"Product.Id,Product.Name", b"1,a", b"2,b"], 1)
+        self.sync([b"Product.Id,Product.Name", b"1,a"], 2)
+        mock_write_record.reset_mock()
+
+        self.sync([b"Product.Id,Product.Name", b"1,a"], 3)
+        mock_write_record.assert_not_called()
+
+    def test_rows_looked_up_in_batches(self, mock_write_record, mock_write_state):
+        """Test that batching the lookups keeps the order of the emitted rows."""
+        self.sync([b"Product.Id,Product.Name", b"1,a", b"2,b", b"3,c", b"4,d"], 1)
+        mock_write_record.reset_mock()
+
+        with mock.patch("tap_zuora.sync.ROW_INDEX_BATCH", 2):
+            self.sync([b"Product.Id,Product.Name", b"1,a", b"2,changed", b"3,c", b"5,e", b"4,d"], 2)
+        self.assertEqual([call[0][1]["Id"] for call in mock_write_record.call_args_list], ["2", "5"])
+
+    def test_changed_ids(self, mock_write_record, mock_write_state):
+        index = RowHashIndex.from_config(self.config, "Product")
+        self.assertEqual(index.changed_ids([("1", 10), ("2", 20)], 1), {"1", "2"})
+        with mock.patch("tap_zuora.row_index.QUERY_IDS", 1):
+            self.assertEqual(index.changed_ids([("1", 10), ("2", 21), ("3", 30)], 2), {"2", "3"})
+        self.assertEqual(list(index.missing_ids(2)), [])
+        index.close()
@@ -0,0 +1,55 @@
+import unittest
+
+from tap_zuora import schedule
+
+from utils import LAST_SYNC_STATE, make_catalog_entry, names
+
+
+STREAMS = [
+    make_catalog_entry("InvoiceItem", priority=1),
+    make_catalog_entry("Account", priority=5),
+    make_catalog_entry("Product"),
+    make_catalog_entry("Usage"),
+]
+
+
+class TestOrderStreams(unittest.TestCase):
+    def test_catalog_order(self):
+        self.assertEqual(names(schedule.order_streams(STREAMS, LAST_SYNC_STATE, "catalog")), names(STREAMS))
+
+    def test_shortest_first(self):
+        """Test that streams never synced run after the known ones, and runs
+        without a duration are estimated from their row count."""
+        self.assertEqual(
+            names(schedule.order_streams(STREAMS, LAST_SYNC_STATE, "shortest_first")),
+            ["Product", "Account", "InvoiceItem", "Usage"],
+        )
+
+    def test_longest_first(self):
+        self.assertEqual(
+            names(schedule.order_streams(STREAMS, LAST_SYNC_STATE, "longest_first")),
+            ["Usage", "InvoiceItem", "Account", "Product"],
+        )
+
+    def test_priority(self):
+        self.assertEqual(
+            names(schedule.order_streams(STREAMS, LAST_SYNC_STATE, "priority")),
+            ["Account", "InvoiceItem", "Product", "Usage"],
+        )
+
+    def test_unknown_policy(self):
+        with self.assertRaises(Exception):
+            schedule.order_streams(STREAMS, LAST_SYNC_STATE, "random")
+
+    def test_resume_uses_saved_order(self):
+        """Test that an interrupted sync resumes with the order it started
+        with even though recorded costs have changed since."""
+        state = {
+            **LAST_SYNC_STATE,
+            "current_stream": "InvoiceItem",
+            "stream_order": ["Product", "InvoiceItem", "Account"],
+        }
+        self.assertEqual(
+            names(schedule.resume_order(STREAMS, state, "shortest_first")),
+            ["Product", "InvoiceItem", "Account", "Usage"],
+        )
@@ -0,0 +1,135 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from singer.catalog import Catalog
+
+from tap_zuora import do_sync, shard
+
+from utils import LAST_SYNC_STATE, make_catalog_entry, names
+
+
+STREAMS = [
+    make_catalog_entry("InvoiceItem"),
+    make_catalog_entry("Account"),
+    make_catalog_entry("Product"),
+    make_catalog_entry("Usage"),
+]
+
+
+class TestAssignShards(unittest.TestCase):
+    def test_balanced_by_cost(self):
+        """Test that the most expensive streams are spread across shards first."""
+        costs = {"A": 100, "B": 60, "C": 50, "D": 10}
+        self.assertEqual(shard.assign_shards(["D", "C", "B", "A"], costs, 2), [["A", "D"], ["B", "C"]])
+
+    def test_unknown_cost_counts_as_most_expensive(self):
+        self.assertEqual(shard.assign_shards(["A", "B", "New"], {"A": 10, "B": 5}, 2), [["A", "B"], ["New"]])
+
+    def test_every_stream_assigned_once(self):
+        stream_names = [f"Stream{i}" for i in range(10)]
+        shards = shard.assign_shards(stream_names, {}, 3)
+        self.assertEqual(sorted(name for names_ in shards for name in names_), stream_names)
+
+    def test_shard_streams(self):
+        """Test that each node takes a disjoint subset of the selected streams in their order."""
+        streams = STREAMS + [make_catalog_entry("Unselected", selected=False)]
+        taken = []
+        for index in range(2):
+            state = dict(LAST_SYNC_STATE)
+            taken.append(names(shard.shard_streams(streams, state, index, 2)))
+            self.assertEqual(state["shard"]["streams"], taken[-1])
+        self.assertEqual(taken, [["InvoiceItem", "Account"], ["Product", "Usage"]])
+
+    def test_recorded_shard_reused(self):
+        """Test that a state written by the same shard keeps its streams, while a merged one is reassigned."""
+        state = {**LAST_SYNC_STATE, "shard": {"index": 1, "count": 2, "streams": ["Account", "Usage"]}}
+        self.assertEqual(names(shard.shard_streams(STREAMS, state, 1, 2)), ["Account", "Usage"])
+
+        state = shard.merge_states([{**state, "shard": {"index": 0, "count": 1, "streams": []}}])
+        self.assertEqual(names(shard.shard_streams(STREAMS, state, 1, 2)), ["Product", "Usage"])
+
+    def test_invalid_index(self):
+        with self.assertRaises(Exception):
+            shard.shard_streams(STREAMS, {}, 2, 2)
+
+
+class TestMergeStates(unittest.TestCase):
+    def test_bookmarks_from_owning_shard(self):
+        """Test that each stream's bookmark comes from the shard that synced it."""
+        states = [
+            {
+                "current_stream": None,
+                "shard": {"index": 1, "count": 2, "streams": ["Invoice"]},
+                "bookmarks": {"Account": {"version": 1}, "Invoice": {"version": 3, "file_ids": ["f1"]}},
+            },
+            {
+                "current_stream": None,
+                "shard": {"index": 0, "count": 2, "streams": ["Account"]},
+                "bookmarks": {"Account": {"version": 2}, "Invoice": {"version": 1}, "Unselected": {"version": 1}},
+            },
+        ]
+        self.assertEqual(
+            shard.merge_states(states),
+            {
+                "current_stream": None,
+                "bookmarks": {
+                    "Account": {"version": 2},
+                    "Invoice": {"version": 3, "file_ids": ["f1"]},
+                    "Unselected": {"version": 1},
+                },
+            },
+        )
+
+    def test_interrupted_shard(self):
+        states = [
+            {"current_stream": None, "shard": {"index": 0, "count": 2, "streams": []}, "bookmarks": {}},
+            {
+                "current_stream": "Invoice",
+                "stream_order": ["Invoice"],
+                "shard": {"index": 1, "count": 2, "streams": ["Invoice"]},
+                "bookmarks": {},
+            },
+        ]
+        merged = shard.merge_states(states)
+        self.assertIsNone(merged["current_stream"])
+        self.assertNotIn("stream_order", merged)
+
+    @mock.patch("singer.write_schema")
+    @mock.patch("singer.write_state")
+    @mock.patch("tap_zuora.sync_stream")
+    def test_reshard_after_interrupted_shard(self, mock_sync_stream, mock_write_state, mock_write_schema):
+        """Test that resharding the merged state of interrupted shards syncs every selected stream."""
+        states = [
+            {"current_stream": "Usage", "shard": {"index": 0, "count": 2, "streams": ["Product", "Usage"]}},
+            {"current_stream": "InvoiceItem", "shard": {"index": 1, "count": 2, "streams": ["InvoiceItem", "Account"]}},
+        ]
+        merged = shard.merge_states([{**state, "bookmarks": {}} for state in states])
+
+        for index in range(2):
+            config = {"shard_count": 2, "shard_index": index}
+            do_sync(mock.Mock(), Catalog(STREAMS), json.loads(json.dumps(merged)), config)
+        synced = [call.args[2]["tap_stream_id"] for call in mock_sync_stream.call_args_list]
+        self.assertEqual(sorted(synced), sorted(names(STREAMS)))
+
+    def test_missing_shard(self):
+        """Test that states of an incomplete set of shards aren't merged."""
+        states = [{"shard": {"index": 0, "count": 2, "streams": []}, "bookmarks": {}}]
+        with self.assertRaises(Exception):
+            shard.merge_states(states)
+        with self.assertRaises(Exception):
+            shard.merge_states([{"bookmarks": {}}])
+
+    def test_main_writes_merged_state(self):
+        state = {"current_stream": None, "shard": {"index": 0, "count": 1, "streams": []}, "bookmarks": {}}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "shard-0.json")
+            with open(path, "w") as state_file:
+                json.dump(state, state_file)
+            argv = ["tap-zuora-merge-state", path]
+            with mock.patch("sys.argv", argv), mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                shard.main()
+        self.assertEqual(json.loads(stdout.getvalue()), {"current_stream": None, "bookmarks": {}})
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tap_zuora import sink, sync
+from tap_zuora.plan import StreamPlan
+
+from utils import USAGE_STREAM, MockApi, make_state
+
+FILES = {
+    "f1": [b"Usage.Id,Usage.UpdatedDate", b"1,2022-10-01T00:00:00Z", b"2,2022-10-02T00:00:00Z"],
+    "f2": [b"Usage.Id,Usage.UpdatedDate", b"3,2022-10-03T00:00:00Z"],
+}
+
+
+@unittest.skipUnless(sink.pa is not None, "pyarrow is not installed")
+@mock.patch("singer.write_record")
+class TestParquetSink(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sink = sink.ParquetSink(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def sync(self, state, files):
+        plan = StreamPlan(USAGE_STREAM)
+        plan.sink = self.sink.open_stream(plan.tap_stream_id, plan.schema)
+        try:
+            sync.sync_file_ids(list(files), None, state, plan, MockApi(files), mock.Mock())
+        finally:
+            plan.sink.abort()
+
+    def test_files_written(self, mock_write_record):
+        """Test that each export file becomes a Parquet file listed in the manifest."""
+        with mock.patch("singer.write_state"):
+            self.sync(make_state("2022-09-01T00:00:00.000000Z"), FILES)
+        self.sink.close()
+        mock_write_record.assert_not_called()
+
+        with open(self.sink.manifest_path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertIsNotNone(manifest["finished"])
+        self.assertEqual(
+            [(entry["stream"], entry["rows"]) for entry in manifest["files"]], [("Usage", 2), ("Usage", 1)]
+        )
+
+        table = sink.pq.read_table(os.path.join(self.directory.name, manifest["files"][0]["path"]))
+        self.assertEqual(table.schema.field("UpdatedDate").type, sink.pa.timestamp("us", tz="UTC"))
+        self.assertEqual(table.column("Id").to_pylist(), ["1", "2"])
+
+    def test_bookmarks_written_after_files(self, mock_write_record):
+        """Test that state is only written once the file of its rows is complete."""
+        written = []
+
+        def write_state(state):
+            written.append((state["bookmarks"]["Usage"]["UpdatedDate"], len(self.sink.manifest["files"])))
+
+        with mock.patch("singer.write_state", side_effect=write_state):
+            self.sync(make_state("2022-09-01T00:00:00.000000Z"), FILES)
+        self.assertEqual(written[0], ("2022-10-02T00:00:00.000000Z", 1))
+        self.assertEqual(written[-1], ("2022-10-03T00:00:00.000000Z", 2))
+
+    def test_failed_file_discarded(self, mock_write_record):
+        """Test that the rows of a file the sync fails on are neither written nor bookmarked."""
+        files = {
+            **FILES,
+            "f2": [b"Usage.Id,Usage.UpdatedDate", b"3,2022-10-03T00:00:00Z", b"4,2022-10-04T00:00:00Z,extra"],
+        }
+        written = []
+
+        def write_state(state):
+            written.append(state["bookmarks"]["Usage"]["UpdatedDate"])
+
+        with mock.patch("singer.write_state", side_effect=write_state), self.assertRaises(Exception):
+            self.sync(make_state("2022-09-01T00:00:00.000000Z"), files)
+        self.assertEqual(written[-1], "2022-10-02T00:00:00.000000Z")
+        self.assertEqual(len(self.sink.manifest["files"]), 1)
+        run_dir = os.path.join(self.directory.name, "Usage", f"run={self.sink.run_id}")
+        self.assertEqual(os.listdir(run_dir), ["part-00001.parquet"])
+
+    def test_row_groups_sized(self, mock_write_record):
+        """Test that rows are written in row groups once their data reaches the limit."""
+        self.sink.row_group_bytes = 1
+        with mock.patch("tap_zuora.sink.BATCH_ROWS", 1), mock.patch("singer.write_state"):
+            self.sync(make_state("2022-09-01T00:00:00.000000Z"), {"f1": FILES["f1"]})
+        path = os.path.join(self.directory.name, self.sink.manifest["files"][0]["path"])
+        self.assertEqual(sink.pq.ParquetFile(path).num_row_groups, 2)
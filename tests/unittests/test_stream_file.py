@@ -0,0 +1,83 @@
+import gzip
+import unittest
+
+from tap_zuora.utils import ReadStats, decompress_chunks, iter_lines, read_lines
+
+CSV_CONTENT = b'Id,Name\n1,"Foo"\n2,"Bar, Baz"\n\n3,Qux'
+
+
+def split_chunks(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestStreamFileLines(unittest.TestCase):
+    def test_plain_lines(self):
+        """Test that uncompressed files are split into the same lines as
+        `requests.Response.iter_lines`."""
+        lines = list(iter_lines(decompress_chunks(split_chunks(CSV_CONTENT, 3))))
+        self.assertEqual(lines, CSV_CONTENT.splitlines())
+
+    def test_gzip_lines(self):
+        """Test that gzipped files are inflated incrementally regardless of how
+        the compressed bytes are chunked."""
+        compressed = gzip.compress(CSV_CONTENT)
+        for size in [1, 2, 7, len(compressed)]:
+            lines = list(iter_lines(decompress_chunks(split_chunks(compressed, size))))
+            self.assertEqual(lines, CSV_CONTENT.splitlines())
+
+    def test_concatenated_gzip_members(self):
+        """Test that multi-member gzip files are fully inflated."""
+        compressed = gzip.compress(b"Id,Name\n1,Foo\n") + gzip.compress(b"2,Bar\n")
+        lines = list(iter_lines(decompress_chunks(split_chunks(compressed, 5))))
+        self.assertEqual(lines, [b"Id,Name", b"1,Foo", b"2,Bar"])
+
+    def test_empty_file(self):
+        """Test that an empty download yields no lines."""
+        self.assertEqual(list(iter_lines(decompress_chunks([]))), [])
+
+
+class FakeRaw:
+    """Undecoded response body returning at most `read_size` bytes per read."""
+
+    def __init__(self, data: bytes, read_size: int):
+        self.data = data
+        self.read_size = read_size
+        self.position = 0
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.read_size, len(self.data) - self.position)
+        buffer[:size] = self.data[self.position : self.position + size]
+        self.position += size
+        return size
+
+
+class TestReadLines(unittest.TestCase):
+    def test_plain_lines(self):
+        """Test that lines are split the same whatever the buffer and read sizes."""
+        for buffer_size in [1, 4, 16, 1024]:
+            for read_size in [1, 3, 1024]:
+                lines = list(read_lines(FakeRaw(CSV_CONTENT, read_size), buffer_size))
+                self.assertEqual(lines, CSV_CONTENT.splitlines())
+
+    def test_gzip_lines(self):
+        compressed = gzip.compress(CSV_CONTENT)
+        for buffer_size in [1, 16, 1024]:
+            lines = list(read_lines(FakeRaw(compressed, 5), buffer_size))
+            self.assertEqual(lines, CSV_CONTENT.splitlines())
+
+    def test_crlf_split_across_reads(self):
+        """Test that a \\r\\n split between two reads is a single line break."""
+        content = b"Id\r\n1\r\n\r\n2\r"
+        for read_size in [1, 2, 3]:
+            self.assertEqual(list(read_lines(FakeRaw(content, read_size), 3)), [b"Id", b"1", b"", b"2"])
+            compressed = gzip.compress(content)
+            self.assertEqual(list(read_lines(FakeRaw(compressed, read_size), 3)), [b"Id", b"1", b"", b"2"])
+
+    def test_read_stats(self):
+        stats = ReadStats()
+        list(read_lines(FakeRaw(CSV_CONTENT, 8), 64, stats))
+        self.assertEqual(stats.bytes, len(CSV_CONTENT))
+        self.assertEqual(stats.reads, -(-len(CSV_CONTENT) // 8))
+
+    def test_empty_file(self):
+        self.assertEqual(list(read_lines(FakeRaw(b"", 8), 64)), [])
@@ -0,0 +1,130 @@
+import unittest
+from unittest import mock
+
+from tap_zuora import sync
+from tap_zuora.plan import StreamPlan
+
+from utils import USAGE_STREAM, MockApi, make_state
+
+
+@mock.patch("singer.write_state")
+@mock.patch("singer.write_record")
+class TestBoundaryDeduplication(unittest.TestCase):
+    lines = [
+        b"Usage.Id,Usage.UpdatedDate",
+        b"1,2022-10-01T00:00:00Z",
+        b"2,2022-10-02T00:00:00Z",
+        b"3,2022-10-02T00:00:00Z",
+    ]
+
+    def sync(self, state):
+        return sync.sync_file_ids(
+            ["f1"], None, state, StreamPlan(USAGE_STREAM), MockApi({"f1": self.lines}), mock.Mock()
+        )
+
+    def emitted_ids(self, mock_write_record):
+        return [call[0][1]["Id"] for call in mock_write_record.call_args_list]
+
+    def test_boundary_saved(self, mock_write_record, mock_write_state):
+        """Test that the Ids sharing the final bookmark are saved in state."""
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.sync(state)
+        self.assertEqual(self.emitted_ids(mock_write_record), ["1", "2", "3"])
+        self.assertEqual(
+            state["bookmarks"]["Usage"]["boundary"],
+            {"value": "2022-10-02T00:00:00.000000Z", "ids": ["2", "3"]},
+        )
+
+    def test_boundary_repeats_dropped(self, mock_write_record, mock_write_state):
+        """Test that records already emitted at the bookmark are not emitted
+        again, while new records at the bookmark are."""
+        state = make_state(
+            "2022-10-02T00:00:00.000000Z",
+            boundary={"value": "2022-10-02T00:00:00.000000Z", "ids": ["2"]},
+        )
+        self.sync(state)
+        self.assertEqual(self.emitted_ids(mock_write_record), ["3"])
+        self.assertEqual(state["bookmarks"]["Usage"]["boundary"]["ids"], ["2", "3"])
+
+    def test_records_without_id_not_in_boundary(self, mock_write_record, mock_write_state):
+        """Test that records without an Id are emitted but not saved in the boundary."""
+        self.lines = [b"Usage.UpdatedDate", b"2022-10-02T00:00:00Z", b"2022-10-02T00:00:00Z"]
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        self.sync(state)
+        self.assertEqual(mock_write_record.call_count, 2)
+        self.assertEqual(state["bookmarks"]["Usage"]["boundary"], {"value": "2022-10-02T00:00:00.000000Z", "ids": []})
+
+    def test_stale_boundary_ignored(self, mock_write_record, mock_write_state):
+        """Test that a boundary saved for another bookmark value is
+        ignored."""
+        state = make_state(
+            "2022-10-01T00:00:00.000000Z",
+            boundary={"value": "2022-10-02T00:00:00.000000Z", "ids": ["2"]},
+        )
+        self.sync(state)
+        self.assertEqual(self.emitted_ids(mock_write_record), ["1", "2", "3"])
+
+
+@mock.patch("singer.write_state")
+@mock.patch("singer.write_record")
+class TestPipelinedSync(unittest.TestCase):
+    lines = [b"Usage.Id,Usage.UpdatedDate"] + [f"{i},2022-10-{i % 28 + 1:02d}T00:00:00Z".encode() for i in range(3000)]
+
+    def sync(self, config, lines=None, file_count=1):
+        state = make_state("2022-09-01T00:00:00.000000Z")
+        files = {f"f{index}": lines or self.lines for index in range(file_count)}
+        plan = StreamPlan(USAGE_STREAM, config)
+        try:
+            sync.sync_file_ids(list(files), None, state, plan, MockApi(files), mock.Mock())
+        finally:
+            if plan.parse_pool:
+                plan.parse_pool.shutdown()
+        return state
+
+    def test_same_output_as_sequential(self, mock_write_record, mock_write_state):
+        """Test that the staged pipeline emits the same records and states in
+        the same order as the sequential path."""
+        sequential_state = self.sync({})
+        sequential = [call[0][1]["Id"] for call in mock_write_record.call_args_list]
+        state_writes = mock_write_state.call_count
+        mock_write_record.reset_mock()
+        mock_write_state.reset_mock()
+
+        pipelined_state = self.sync({"pipeline_buffer_rows": "100"})
+        self.assertEqual([call[0][1]["Id"] for call in mock_write_record.call_args_list], sequential)
+        self.assertEqual(mock_write_state.call_count, state_writes)
+        self.assertEqual(pipelined_state, sequential_state)
+
+    def test_parse_processes_same_output(self, mock_write_record, mock_write_state):
+        """Test that parsing on worker processes emits the same records in the
+        same order and leaves the same bookmark."""
+        sequential_state = self.sync({})
+        sequential = [call[0][1] for call in mock_write_record.call_args_list]
+        mock_write_record.reset_mock()
+
+        parallel_state = self.sync({"parse_processes": "2"})
+        self.assertEqual([call[0][1] for call in mock_write_record.call_args_list], sequential)
+        self.assertEqual(parallel_state, sequential_state)
+
+    def test_parse_processes_quoted_line_breaks(self, mock_write_record, mock_write_state):
+        """Test that a quoted value spanning lines is parsed as one value on worker processes."""
+        lines = [self.lines[0], b'"multi', b'line",2022-10-01T00:00:00Z', b"2,2022-10-02T00:00:00Z"]
+        self.sync({"parse_processes": "2"}, lines)
+        self.assertEqual([call[0][1]["Id"] for call in mock_write_record.call_args_list], ["multi\nline", "2"])
+
+    def test_parse_pool_started_once_per_stream(self, mock_write_record, mock_write_state):
+        with mock.patch(
+            "tap_zuora.sync.ProcessPoolExecutor", wraps=sync.ProcessPoolExecutor
+        ) as mock_pool, mock.patch.object(sync.LOGGER, "warning") as mock_warning:
+            self.sync({"parse_processes": "2", "pipeline_buffer_rows": "100"}, file_count=3)
+        mock_pool.assert_called_once_with(2)
+        mock_warning.assert_called_once()
+        self.assertEqual(mock_write_record.call_count, 3 * 3000)
+
+    def test_non_rectangular_file(self, mock_write_record, mock_write_state):
+        """Test that a row not matching the header still fails the file after
+        the preceding rows were emitted."""
+        lines = self.lines[:5] + [b"1,2,3"] + self.lines[5:]
+        with self.assertRaisesRegex(Exception, "non-rectangular"):
+            self.sync({"pipeline_buffer_rows": "2"}, lines)
+        self.assertEqual(mock_write_record.call_count, 4)
@@ -0,0 +1,45 @@
+import threading
+import unittest
+from unittest import mock
+
+from utils import get_response
+
+from tap_zuora.client import Client
+from tap_zuora.transport import Transport
+
+
+class TestTransport(unittest.TestCase):
+    def test_session_per_thread(self):
+        """Test that each thread gets its own session, all sharing one
+        connection pool."""
+        transport = Transport(pool_size=4)
+        sessions = []
+
+        def grab_session():
+            sessions.append(transport.session)
+
+        threads = [threading.Thread(target=grab_session) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(session) for session in sessions}), 3)
+        adapters = {id(session.get_adapter("https://rest.zuora.com/")) for session in sessions}
+        self.assertEqual(len(adapters), 1)
+        self.assertIs(transport.session, transport.session)
+
+    @mock.patch("requests.Session.send")
+    def test_rest_headers_are_reused(self, mock_send):
+        """Test that the REST auth headers are built once and merged with
+        per-request headers."""
+        mock_send.return_value = get_response(200)
+        client = Client.from_config({"username": "user", "password": "pass", "api_type": "REST", "pool_size": "4"})
+        self.assertIs(client.rest_headers, client.rest_headers)
+        self.assertEqual(client._transport.pool_size, 4)
+
+        client.rest_request("GET", "v1/files/1234", headers={"Accept-Encoding": "gzip"})
+        sent = mock_send.call_args[0][0]
+        self.assertEqual(sent.headers["apiAccessKeyId"], "user")
+        self.assertEqual(sent.headers["Accept-Encoding"], "gzip")
+        self.assertNotIn("Accept-Encoding", client.rest_headers)
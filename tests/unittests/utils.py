@@ -1,4 +1,30 @@
 import requests
+from singer.catalog import CatalogEntry
+from singer.schema import Schema
+
+USAGE_STREAM = {
+    "tap_stream_id": "Usage",
+    "replication_key": "UpdatedDate",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "Id": {"type": ["string", "null"]},
+            "UpdatedDate": {"type": ["string", "null"], "format": "date-time"},
+        },
+    },
+    "metadata": [
+        {"breadcrumb": ["properties", "Id"], "metadata": {"inclusion": "automatic"}},
+        {"breadcrumb": ["properties", "UpdatedDate"], "metadata": {"inclusion": "automatic"}},
+    ],
+}
+
+LAST_SYNC_STATE = {
+    "bookmarks": {
+        "InvoiceItem": {"last_sync": {"duration": 10800, "rows": 20000000}},
+        "Account": {"last_sync": {"duration": 30, "rows": 1000}},
+        "Product": {"last_sync": {"rows": 50}},
+    }
+}
 
 
 class MockResponse:
@@ -9,6 +35,7 @@ class MockResponse:
         self.raise_error = raise_error
         self.text = json
         self.content = content
+        self.headers = {}
 
     def raise_for_status(self):
         if not self.raise_error:
@@ -24,3 +51,73 @@ def get_response(status_code, json=None, raise_error=False, content=None):
     if json is None:
         json = {}
     return MockResponse(status_code, json, raise_error, content)
+
+
+class LocalExportApi:
+    """Stand-in export backend serving the files of each query from memory.
+
+    `files_for(query)` returns the lines of the files of a job, and each
+    job is ready after `polls` calls to `job_ready`.
+    """
+
+    def __init__(self, files_for, polls=1):
+        self.files_for = files_for
+        self.polls = polls
+        self.queries = []
+        self.cancelled = []
+        self._jobs = {}
+        self._files = {}
+
+    def create_job(self, client, plan, start_date=None, end_date=None, id_range=None):
+        job_id = f"job-{len(self.queries) + 1}"
+        query = (plan.tap_stream_id, start_date, end_date)
+        self.queries.append(query)
+        self._jobs[job_id] = {"polls": 0, "files": self.files_for(query)}
+        return job_id
+
+    def job_ready(self, client, job_id):
+        job = self._jobs[job_id]
+        job["polls"] += 1
+        return job["polls"] >= self.polls
+
+    def cancel_job(self, client, job_id):
+        self.cancelled.append(job_id)
+
+    def get_file_ids(self, client, job_id):
+        file_ids = [f"{job_id}-{index}" for index in range(len(self._jobs[job_id]["files"]))]
+        self._files.update(zip(file_ids, self._jobs[job_id]["files"]))
+        return file_ids
+
+    def stream_file(self, client, file_id, progress=None):
+        return iter(self._files[file_id])
+
+
+class MockApi:
+    """Serves export files from memory."""
+
+    def __init__(self, files):
+        self.files = files
+
+    def stream_file(self, client, file_id, progress=None):
+        return iter(self.files[file_id])
+
+
+def make_state(bookmark, **extra):
+    """Returns the state of the Usage stream at `bookmark`."""
+    return {"bookmarks": {"Usage": {"UpdatedDate": bookmark, **extra}}}
+
+
+def make_catalog_entry(name, replication_key=None, selected=True, priority=None):
+    mdata = {"selected": selected}
+    if priority is not None:
+        mdata["tap-zuora.priority"] = priority
+    return CatalogEntry(
+        tap_stream_id=name,
+        schema=Schema(),
+        replication_key=replication_key,
+        metadata=[{"breadcrumb": (), "metadata": mdata}],
+    )
+
+
+def names(streams):
+    return [stream.tap_stream_id for stream in streams]